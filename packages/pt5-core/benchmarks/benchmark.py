@@ -0,0 +1,312 @@
+"""
+Benchmarks of the stages of the conversion on synthetic NCP programs (see ncp_generator) of growing sizes.
+Each stage is measured on its own, its input is prepared beforehand. The throughput is given in the NCP lines
+per second regardless of the stage, so the stages and the sizes can be compared to each other. The peak memory is
+how much the peak resident memory of the process grew during the first run. Only Linux allows resetting the peak,
+elsewhere the memory allocated by the stage is traced in an extra run instead, which is many times slower.
+
+The results are compared against the stored baseline and any regression beyond the tolerance fails the run.
+The baseline is specific to the machine it was recorded on, record a new one with --update-baseline after moving
+to another machine or after a change which is expected to change the performance.
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from ncp_generator import write_ncp
+from pt5_core.geometry import DEFAULT_TOLERANCE, trace_toolpath
+from pt5_core.ncp_scanner import scan_ncp_file
+from pt5_core.ncp_to_pt5 import ncp_to_pt5, stream_ncp_to_pt5
+from pt5_core.spatial_index import ToolpathIndex
+
+BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_SIZES = "1k,10k,100k,1M"
+# allowed drop of the throughput and growth of the peak memory before it counts as a regression
+DEFAULT_TOLERANCE_RATIO = 0.25
+DEFAULT_MEMORY_TOLERANCE_RATIO = 0.1
+# the resident memory grows by whole arenas of the allocator, the smallest programs hardly allocate any more than that
+_MEMORY_SLACK = 2 * 1024 * 1024
+
+# each benchmark is run for at least this long and at least the given number of times unless its runs already took
+# longer than the latter time, the best run counts
+_MIN_SECONDS = 0.2
+_LONG_SECONDS = 2.0
+
+_SIZE_SUFFIXES = {"k": 1_000, "M": 1_000_000}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # prepares the input of the stage from the path of the NCP program, it is not measured
+    setup: Callable[[Path], Any]
+    run: Callable[[Any], object]
+
+
+@dataclass
+class Result:
+    lines_per_second: float
+    seconds: float
+    peak_memory_bytes: int
+
+
+def _convert(columns: Any) -> object:
+    # the geometry is memoized, so it is resolved again on every run
+    columns._geometry = None
+    return ncp_to_pt5(columns)
+
+
+def _serialize(pt5: Any) -> object:
+    with open(os.devnull, "w") as f:
+        return pt5.write_to(f)
+
+
+def _preview(geometry: Any) -> object:
+    index = ToolpathIndex(trace_toolpath(geometry, DEFAULT_TOLERANCE), DEFAULT_TOLERANCE)
+    index.build()
+    return index
+
+
+def _stream(path: Path) -> object:
+    with open(path) as f, open(os.devnull, "w") as target:
+        return target.writelines(stream_ncp_to_pt5(f))
+
+
+BENCHMARKS = (
+    Benchmark("parse", lambda path: path, scan_ncp_file),
+    Benchmark("convert", scan_ncp_file, _convert),
+    Benchmark("serialize", lambda path: ncp_to_pt5(scan_ncp_file(path)), _serialize),
+    Benchmark("preview", lambda path: scan_ncp_file(path).geometry, _preview),
+    # the whole conversion line by line, the way the large programs are converted without loading them
+    Benchmark("stream", lambda path: path, _stream),
+)
+
+
+def measure(benchmark: Benchmark, path: Path, lines: int, repeat: int) -> Result:
+    """
+    Measure the benchmark on the NCP program.
+
+    :param benchmark: the benchmark to run
+    :param path: path of the NCP program
+    :param lines: number of the lines of the program
+    :param repeat: minimum number of the timed runs, unless they take long
+    :return: the best of the timed runs and the peak memory of the first one
+    """
+    state = benchmark.setup(path)
+
+    best = math.inf
+    total = 0.0
+    runs = 0
+    peak = None
+    gc.collect()
+    while total < _MIN_SECONDS or (runs < repeat and total < _LONG_SECONDS):
+        resident = _reset_peak_memory() if runs == 0 else None
+        start = time.perf_counter()
+        benchmark.run(state)
+        elapsed = time.perf_counter() - start
+        if resident is not None:
+            peak = _memory_status("VmHWM") - resident
+
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+
+    if peak is None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            benchmark.run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return Result(lines_per_second=lines / max(best, 1e-9), seconds=best, peak_memory_bytes=peak)
+
+
+def compare(
+    results: dict[str, Result], baseline: dict[str, Result], tolerance: float, memory_tolerance: float
+) -> list[str]:
+    """
+    Compare the results with the baseline.
+
+    :param results: the measured results by the benchmark and the size
+    :param baseline: the expected results, the benchmarks missing in it are not compared
+    :param tolerance: allowed relative drop of the throughput
+    :param memory_tolerance: allowed relative growth of the peak memory
+    :return: descriptions of the regressions
+    """
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+
+        if result.lines_per_second < expected.lines_per_second * (1 - tolerance):
+            regressions.append(
+                f"{key}: {result.lines_per_second:,.0f} lines/s is "
+                f"{1 - result.lines_per_second / expected.lines_per_second:.0%} slower "
+                f"than the baseline of {expected.lines_per_second:,.0f} lines/s"
+            )
+        if result.peak_memory_bytes > expected.peak_memory_bytes * (1 + memory_tolerance) + _MEMORY_SLACK:
+            regressions.append(
+                f"{key}: peak memory of {_mebibytes(result.peak_memory_bytes)} is "
+                f"{result.peak_memory_bytes / max(expected.peak_memory_bytes, 1) - 1:.0%} more "
+                f"than the baseline of {_mebibytes(expected.peak_memory_bytes)}"
+            )
+    return regressions
+
+
+def load_results(path: Path) -> dict[str, Result]:
+    with open(path) as f:
+        return {key: Result(**result) for key, result in json.load(f)["results"].items()}
+
+
+def save_results(results: dict[str, Result], path: Path) -> None:
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {key: asdict(result) for key, result in results.items()},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def parse_sizes(sizes: str) -> list[int]:
+    """Parse the comma-separated sizes, e.g. "1k,10k,1M"."""
+    parsed = []
+    for size in sizes.split(","):
+        size = size.strip()
+        multiplier = _SIZE_SUFFIXES.get(size[-1:], 1)
+        parsed.append(int(size[:-1] if multiplier > 1 else size) * multiplier)
+    return parsed
+
+
+def _reset_peak_memory() -> int | None:
+    """Reset the peak resident memory of the process, return the current resident memory or None if not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return _memory_status("VmRSS")
+    except OSError:
+        return None
+
+
+def _memory_status(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                # always in kilobytes
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} is missing in the status of the process")
+
+
+def _mebibytes(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MiB"
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the conversion on synthetic NCP programs.")
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="comma-separated numbers of the lines of the programs, up to 10M (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        default=",".join(benchmark.name for benchmark in BENCHMARKS),
+        help="comma-separated benchmarks to run (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="minimum number of the timed runs of each benchmark (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated programs (default: %(default)s)")
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        help="directory to keep the generated programs in and reuse them from (default: a temporary directory)",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline to compare against")
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="store the results into the baseline instead of comparing"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE_RATIO,
+        help="allowed relative drop of the throughput (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=DEFAULT_MEMORY_TOLERANCE_RATIO,
+        help="allowed relative growth of the peak memory (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks.split(",")
+    unknown = set(names) - {benchmark.name for benchmark in BENCHMARKS}
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark.name in names]
+
+    results: dict[str, Result] = {}
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        data_dir = args.data_dir or Path(temporary_dir)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        for lines in parse_sizes(args.sizes):
+            path = data_dir / f"synthetic-{lines}-{args.seed}.ncp"
+            if not path.exists():
+                write_ncp(str(path), lines, args.seed)
+
+            for benchmark in benchmarks:
+                key = f"{benchmark.name}/{lines}"
+                result = results[key] = measure(benchmark, path, lines, args.repeat)
+                print(
+                    f"{key:<20} {result.lines_per_second:>14,.0f} lines/s {result.seconds:>10.4f} s "
+                    f"{_mebibytes(result.peak_memory_bytes):>12}",
+                    flush=True,
+                )
+
+    if args.output is not None:
+        save_results(results, args.output)
+
+    if args.update_baseline:
+        baseline = load_results(args.baseline) if args.baseline.exists() else {}
+        save_results(baseline | results, args.baseline)
+        print(f"baseline {args.baseline} updated")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"no baseline {args.baseline} to compare against, record it with --update-baseline")
+        return 0
+
+    regressions = compare(results, load_results(args.baseline), args.tolerance, args.memory_tolerance)
+    if regressions:
+        print("PERFORMANCE REGRESSIONS:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        return 1
+
+    print("no regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Seeded generator of synthetic NCP programs for the benchmarks.
+The programs resemble the exports of the CAM tools: long runs of short moves approximating curves, true arcs,
+switching between the absolute and the incremental mode, modal continuation lines without any command, stops
+and the odd comment, so that all the stages of the pipeline get a realistic mix of the commands to process.
+The same seed and number of the lines always give the very same program.
+"""
+
+import argparse
+import math
+import random
+import sys
+from collections.abc import Generator, Sequence
+
+# the toolpath stays within a square of this size (in micrometers), the same as the working area of a plotter
+_AREA = 400_000
+# maximum distance between the curves and the moves approximating them, in micrometers
+_CHORD_TOLERANCE = 5.0
+
+# relative frequencies of the features of the program, most of the lines come from the curves as they are the longest,
+# then come the polylines and the arcs, the mode switches and the stops happen every few hundred lines
+_FEATURES = ("polyline", "curve", "arcs", "mode", "stop", "comment")
+_WEIGHTS = (19, 9, 24, 5, 5, 2)
+
+
+def generate_ncp(lines: int, seed: int = 0) -> Generator[str]:
+    """
+    Generate a synthetic NCP program.
+
+    :param lines: exact number of the lines of the program, including the header and the footer
+    :param seed: seed of the random number generator
+    :return: generator of the lines of the program, including the newlines
+    """
+    if lines < 4:
+        raise ValueError("the program needs at least 4 lines")
+    return _Generator(random.Random(seed)).generate(lines)
+
+
+def write_ncp(path: str, lines: int, seed: int = 0) -> None:
+    with open(path, "w") as f:
+        # the lines are joined in batches, writing them one by one would make the largest programs slow to generate
+        batch: list[str] = []
+        for line in generate_ncp(lines, seed):
+            batch.append(line)
+            if len(batch) == 65536:
+                f.write("".join(batch))
+                batch.clear()
+        f.write("".join(batch))
+
+
+class _Generator:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.number = 0
+        self.x = 0
+        self.y = 0
+        self.is_absolute = True
+        # the command continued by the lines without any command
+        self.command: str | None = None
+        # the mode switch to be emitted along with the next movement
+        self.mode: str | None = None
+
+    def generate(self, lines: int) -> Generator[str]:
+        yield "%1\n"
+        yield self._line(f"G90 G01 X0 Y0 F{self.rng.choice((500, 1000, 2000))}")
+        self.command = "G01"
+        # apart from the header, the first move and the footer
+        remaining = lines - 4
+
+        choices = self.rng.choices
+        while remaining > 0:
+            (feature,) = choices(_FEATURES, _WEIGHTS)
+            if feature == "polyline":
+                produced = self._polyline(remaining)
+            elif feature == "curve":
+                produced = self._curve(remaining)
+            elif feature == "arcs":
+                produced = self._arcs(remaining)
+            elif feature == "mode":
+                # emitted along with the following movement, it does not produce a line of its own
+                self.is_absolute = not self.is_absolute
+                self.mode = "G90" if self.is_absolute else "G91"
+                continue
+            elif feature == "stop":
+                produced = [self._line("M00")]
+                # the stop becomes the command continued by the following lines, so the movement is given again
+                self.command = "M00"
+            else:
+                produced = [f"% part {self.number}\n"]
+
+            remaining -= len(produced)
+            yield from produced
+
+        yield self._line("M30")
+        yield "*\n"
+
+    def _polyline(self, budget: int) -> list[str]:
+        produced = []
+        for _ in range(min(self.rng.randint(1, 20), budget)):
+            angle = self.rng.uniform(0, math.tau)
+            length = self.rng.uniform(500, 20_000)
+            produced.append(
+                self._move(
+                    "G01",
+                    _clamp(self.x + round(length * math.cos(angle))),
+                    _clamp(self.y + round(length * math.sin(angle))),
+                )
+            )
+        return produced
+
+    def _curve(self, budget: int) -> list[str]:
+        """Approximate an arc by short moves, the way the CAM tools export the splines."""
+        center_x, center_y, radius, start_angle, sweep = self._circle()
+        max_step = 2 * math.acos(1 - _CHORD_TOLERANCE / radius)
+        segments = min(max(math.ceil(abs(sweep) / max_step), 2), budget)
+        produced = []
+        for n in range(1, segments + 1):
+            angle = start_angle + sweep * n / segments
+            produced.append(
+                self._move(
+                    "G01", round(center_x + radius * math.cos(angle)), round(center_y + radius * math.sin(angle))
+                )
+            )
+        return produced
+
+    def _arcs(self, budget: int) -> list[str]:
+        produced = []
+        for _ in range(min(self.rng.randint(1, 4), budget)):
+            center_x, center_y, radius, start_angle, sweep = self._circle()
+            end_angle = start_angle + sweep
+            end_x = round(center_x + radius * math.cos(end_angle))
+            end_y = round(center_y + radius * math.sin(end_angle))
+            # the center is given relative to the start, in both modes
+            i = round(center_x) - self.x
+            j = round(center_y) - self.y
+            produced.append(self._move("G02" if sweep < 0 else "G03", end_x, end_y, i, j))
+        return produced
+
+    def _circle(self) -> tuple[float, float, float, float, float]:
+        """Return a random circle passing through the current position, curving towards the middle of the area."""
+        rng = self.rng
+        radius = rng.uniform(1000, 50_000)
+        towards_middle = math.atan2(_AREA / 2 - self.y, _AREA / 2 - self.x)
+        direction = towards_middle + rng.uniform(-1, 1)
+        center_x = self.x + radius * math.cos(direction)
+        center_y = self.y + radius * math.sin(direction)
+        sweep = rng.choice((-1, 1)) * rng.uniform(0.2, 0.95 * math.tau)
+        return center_x, center_y, radius, direction + math.pi, sweep
+
+    def _move(self, command: str, x: int, y: int, i: int = 0, j: int = 0) -> str:
+        if (x, y) == (self.x, self.y) and not (i or j):
+            # the programs hardly ever contain the null moves
+            x += 1
+
+        words = []
+        if self.mode is not None:
+            words.append(self.mode)
+            self.mode = None
+        if command != self.command or words:
+            words.append(command)
+            self.command = command
+
+        if self.is_absolute:
+            if x != self.x:
+                words.append(f"X{_millimeters(x)}")
+            if y != self.y:
+                words.append(f"Y{_millimeters(y)}")
+        else:
+            if x != self.x:
+                words.append(f"X{_millimeters(x - self.x)}")
+            if y != self.y:
+                words.append(f"Y{_millimeters(y - self.y)}")
+        if i:
+            words.append(f"I{_millimeters(i)}")
+        if j:
+            words.append(f"J{_millimeters(j)}")
+
+        self.x = x
+        self.y = y
+        return self._line(" ".join(words))
+
+    def _line(self, words: str) -> str:
+        self.number += 1
+        return f"N{self.number:03d} {words}\n"
+
+
+def _clamp(value: int) -> int:
+    # bounce off the edges of the area
+    if value < 0:
+        return -value
+    if value > _AREA:
+        return 2 * _AREA - value
+    return value
+
+
+def _millimeters(micrometers: int) -> str:
+    sign = "-" if micrometers < 0 else ""
+    whole, fraction = divmod(abs(micrometers), 1000)
+    if fraction:
+        return f"{sign}{whole}.{fraction:03d}".rstrip("0")
+    return f"{sign}{whole}"
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic NCP program.")
+    parser.add_argument("lines", type=int, help="number of the lines of the program")
+    parser.add_argument("output", help="path of the NCP file to (over)write")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the random number generator (default: %(default)s)"
+    )
+    args = parser.parse_args(argv)
+
+    write_ncp(args.output, args.lines, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
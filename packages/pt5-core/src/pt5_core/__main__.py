@@ -0,0 +1,5 @@
+import sys
+
+from pt5_core.cli import main
+
+sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Compact binary form of the parsed NCP and converted PT5 programs, so that reopening a program does not need
+to tokenize its text again.
+The file is a fixed header (with the version, the number of the commands and the bounding box of the toolpath)
+followed by one fixed-width record per command and a small JSON trailer with the command types and the (rare)
+arguments other than X, Y, I and J.
+The loaded programs are memory-mapped, so loading costs about the same regardless of the size of the program
+and the commands are only decoded once they are accessed.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+from collections.abc import Generator, Iterable, Iterator, Sequence
+from typing import IO, Any, Self, overload
+
+from pt5_core.columnar import NcpColumns, Pt5Columns
+from pt5_core.geometry import ResolvedGeometry, resolve_geometry, resolve_pt5_geometry
+from pt5_core.ncp_model import NcpCommand, NcpFile, NcpRecord, _fits_micrometers
+from pt5_core.pt5_model import Pt5Command, Pt5CommandType, Pt5File, Pt5Record, _pt5_records, _serialize_pt5, _write_pt5
+
+MAGIC = b"PT5B"
+VERSION = 1
+
+_NCP = 0
+_PT5 = 1
+
+# magic, version, kind of the program, number of the commands, bounding box and offset of the trailer
+_HEADER = struct.Struct("<4sHBxQ4qQ")
+# opcode, presence mask of the X, Y, I and J arguments, and the arguments in micrometers
+_RECORD = struct.Struct("<HB5x4q")
+# records packed at once when writing
+_BATCH_RECORDS = 8192
+
+_ARGUMENT_NAMES = ("X", "Y", "I", "J")
+
+type Bounds = tuple[int, int, int, int]
+
+
+def write_binary(model: NcpFile | NcpColumns | Pt5File | Pt5Columns, target: str | os.PathLike[str] | IO[bytes]) -> int:
+    """
+    Write the program in the binary form.
+
+    :param model: the NCP or PT5 program to write
+    :param target: path of the file to (over)write, or an open seekable binary file object
+    :return: number of bytes written
+    :raises ValueError: if the PT5 program contains an arc, its bounds are not known (see resolve_pt5_geometry)
+    """
+    extra: dict[int, dict[str, float]] = {}
+    if isinstance(model, NcpFile | NcpColumns):
+        kind = _NCP
+        bounds = _round_bounds(model.geometry.bounds)
+        records: Iterable[tuple[str | None, int, int, int, int, int]] = _ncp_rows(model.records())
+        if isinstance(model, NcpColumns):
+            extra = model.extra
+        else:
+            extra = {
+                index: arguments
+                for index, command in enumerate(model.commands)
+                if (
+                    arguments := {
+                        k: v
+                        for k, v in command.arguments.items()
+                        if k not in _ARGUMENT_NAMES or not _fits_micrometers(v)
+                    }
+                )
+            }
+    else:
+        kind = _PT5
+        bounds = _round_bounds(
+            resolve_pt5_geometry(
+                model.records() if isinstance(model, Pt5Columns) else _pt5_records(model.commands)
+            ).bounds
+        )
+        records = _pt5_rows(model.records() if isinstance(model, Pt5Columns) else _pt5_records(model.commands))
+
+    # the file is only opened once the bounds are known, so that a refused program leaves it as it was
+    if isinstance(target, str | os.PathLike):
+        with open(target, "wb") as f:
+            return _write_rows(f, kind, bounds, records, extra)
+    return _write_rows(target, kind, bounds, records, extra)
+
+
+def _write_rows(
+    target: IO[bytes],
+    kind: int,
+    bounds: Bounds,
+    records: Iterable[tuple[str | None, int, int, int, int, int]],
+    extra: dict[int, dict[str, float]],
+) -> int:
+    types: list[str | None] = []
+    type_codes: dict[str | None, int] = {}
+    start = target.tell()
+    # the header is written again once the number of the commands is known
+    target.write(bytes(_HEADER.size))
+
+    count = 0
+    batch = bytearray(_BATCH_RECORDS * _RECORD.size)
+    offset = 0
+    pack_into = _RECORD.pack_into
+    for command_type, mask, x, y, i, j in records:
+        code = type_codes.get(command_type)
+        if code is None:
+            code = type_codes[command_type] = len(types)
+            types.append(command_type)
+
+        pack_into(batch, offset, code, mask, x, y, i, j)
+        offset += _RECORD.size
+        count += 1
+        if offset == len(batch):
+            target.write(batch)
+            offset = 0
+    target.write(memoryview(batch)[:offset])
+
+    trailer = json.dumps({"types": types, "extra": extra}).encode()
+    trailer_offset = _HEADER.size + count * _RECORD.size
+    target.write(trailer)
+    end = target.tell()
+
+    target.seek(start)
+    target.write(_HEADER.pack(MAGIC, VERSION, kind, count, *bounds, trailer_offset))
+    target.seek(end)
+    return end - start
+
+
+class _MappedProgram:
+    """
+    Program of the given kind memory-mapped from a binary file.
+    The mapping is kept until the program is closed, it can be used as a context manager to do so.
+    """
+
+    __slots__ = ("bounds", "_mmap", "_count", "_types", "_extra")
+
+    def __init__(self, source: str | os.PathLike[str], kind: int):
+        # the mapping stays valid after the file is closed
+        with open(source, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._mmap) < _HEADER.size:
+                raise ValueError(f"{source} is not a binary PT5 program")
+
+            magic, version, file_kind, count, *bounds, trailer_offset = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError(f"{source} is not a binary PT5 program")
+            if version != VERSION:
+                raise ValueError(f"{source} has unsupported version {version} of the binary format")
+            if file_kind != kind:
+                raise ValueError(f"{source} holds {'an NCP' if file_kind == _NCP else 'a PT5'} program")
+
+            trailer = json.loads(self._mmap[trailer_offset:])
+        except BaseException:
+            self._mmap.close()
+            raise
+
+        self._count: int = count
+        # min_x, min_y, max_x, max_y of the toolpath in micrometers
+        self.bounds: Bounds = tuple(bounds)
+        self._types: list[Any] = trailer["types"]
+        # json turns the keys into strings
+        self._extra: dict[int, dict[str, float]] = {int(index): value for index, value in trailer["extra"].items()}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _row(self, index: int) -> tuple[int, int, int, int, int, int]:
+        return _RECORD.unpack_from(self._mmap, _HEADER.size + index * _RECORD.size)
+
+    def _rows(self) -> Generator[tuple[int, int, int, int, int, int]]:
+        with memoryview(self._mmap) as view:
+            yield from _RECORD.iter_unpack(view[_HEADER.size : _HEADER.size + self._count * _RECORD.size])
+
+
+class _Commands[TCommand](Sequence[TCommand]):
+    """Commands of a mapped program, decoded on access."""
+
+    __slots__ = ("_program",)
+
+    def __init__(self, program: "MappedNcpFile | MappedPt5File"):
+        self._program = program
+
+    def __len__(self) -> int:
+        return len(self._program)
+
+    @overload
+    def __getitem__(self, index: int) -> TCommand: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[TCommand]: ...
+
+    def __getitem__(self, index: int | slice) -> TCommand | list[TCommand]:
+        if isinstance(index, slice):
+            return [self._program._command(i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("command index out of range")
+        return self._program._command(index)
+
+    def __iter__(self) -> Iterator[TCommand]:
+        for index in range(len(self)):
+            yield self._program._command(index)
+
+
+class MappedNcpFile(_MappedProgram):
+    """NCP program memory-mapped from a binary file, interchangeable with NcpFile."""
+
+    __slots__ = ("_geometry",)
+
+    def __init__(self, source: str | os.PathLike[str]):
+        super().__init__(source, _NCP)
+        self._geometry: ResolvedGeometry | None = None
+
+    @property
+    def commands(self) -> Sequence[NcpCommand]:
+        return _Commands(self)
+
+    @property
+    def geometry(self) -> ResolvedGeometry:
+        """The program with all the positions resolved, computed on the first access and kept for the later ones."""
+        if self._geometry is None:
+            self._geometry = resolve_geometry(self.records())
+        return self._geometry
+
+    def records(self) -> Generator[NcpRecord]:
+        types = self._types
+        for code, mask, x, y, i, j in self._rows():
+            yield (
+                types[code],
+                x if mask & 1 else None,
+                y if mask & 2 else None,
+                i if mask & 4 else None,
+                j if mask & 8 else None,
+            )
+
+    def to_ncp_file(self) -> NcpFile:
+        return NcpFile(commands=list(self.commands))
+
+    def _command(self, index: int) -> NcpCommand:
+        code, mask, *values = self._row(index)
+        arguments = {
+            name: value / 1000
+            for bit, (name, value) in enumerate(zip(_ARGUMENT_NAMES, values, strict=True))
+            if mask >> bit & 1
+        }
+        arguments.update(self._extra.get(index, {}))
+        return NcpCommand(type=self._types[code], arguments=arguments)
+
+
+class MappedPt5File(_MappedProgram):
+    """PT5 program memory-mapped from a binary file, interchangeable with Pt5File."""
+
+    __slots__ = ()
+
+    def __init__(self, source: str | os.PathLike[str]):
+        super().__init__(source, _PT5)
+        self._types = [Pt5CommandType(command_type) for command_type in self._types]
+
+    @property
+    def commands(self) -> Sequence[Pt5Command]:
+        return _Commands(self)
+
+    def records(self) -> Generator[Pt5Record]:
+        types = self._types
+        for code, _, x, y, i, j in self._rows():
+            yield types[code], x, y, i, j
+
+    def serialize(self) -> Generator[str]:
+        return _serialize_pt5(self.records())
+
+    def write_to(self, target: str | os.PathLike[str] | IO[str] | IO[bytes]) -> int:
+        return _write_pt5(self.records(), target)
+
+    def to_pt5_file(self) -> Pt5File:
+        return Pt5File(commands=list(self.commands))
+
+    def _command(self, index: int) -> Pt5Command:
+        code, mask, *values = self._row(index)
+        arguments = {
+            name: value
+            for bit, (name, value) in enumerate(zip(_ARGUMENT_NAMES, values, strict=True))
+            if mask >> bit & 1
+        }
+        return Pt5Command(type=self._types[code], arguments=arguments)
+
+
+def _ncp_rows(records: Iterable[NcpRecord]) -> Generator[tuple[str | None, int, int, int, int, int]]:
+    for command_type, x, y, i, j in records:
+        mask = (x is not None) | (y is not None) << 1 | (i is not None) << 2 | (j is not None) << 3
+        yield command_type, mask, x or 0, y or 0, i or 0, j or 0
+
+
+def _pt5_rows(records: Iterable[Pt5Record]) -> Generator[tuple[str | None, int, int, int, int, int]]:
+    for command_type, x, y, i, j in records:
+        # zero arguments are not emitted at all, so only the non-zero ones are considered present
+        yield command_type.value, bool(x) | bool(y) << 1 | bool(i) << 2 | bool(j) << 3, x, y, i, j
+
+
+def _round_bounds(bounds: tuple[float, float, float, float]) -> Bounds:
+    # rounded outwards, so that the whole toolpath stays within
+    min_x, min_y, max_x, max_y = bounds
+    return math.floor(min_x), math.floor(min_y), math.ceil(max_x), math.ceil(max_y)
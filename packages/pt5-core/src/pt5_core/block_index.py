@@ -0,0 +1,311 @@
+"""
+Index of the blocks (numbered lines) of an NCP program by their N numbers, for restarting a job from a given block.
+For every block the index keeps its number and its byte offset in the file, and every few blocks a checkpoint of
+the modal state (the open command type, the G90/G91 mode and the position) at the start of the block.
+The state at the start of any block is found from the nearest checkpoint before it, so the program can be converted
+from that block onward without converting the whole prefix again.
+The index can be saved and loaded, it is only valid for the exact contents of the program it was built from.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Generator, Iterable
+from dataclasses import astuple, dataclass
+from typing import IO
+
+from pt5_core.incremental import DEFAULT_CHECKPOINT_INTERVAL
+from pt5_core.ncp_model import ConversionState, NcpRecord
+from pt5_core.ncp_scanner import scan_ncp
+from pt5_core.ncp_to_pt5 import _convert_records, _optimized
+from pt5_core.pt5_model import Pt5CommandType, Pt5Record, _serialize_pt5, _write_pt5
+
+MAGIC = b"PT5I"
+VERSION = 1
+
+# magic, version, checkpoint interval, number of the blocks, size of the indexed program
+_HEADER = struct.Struct("<4sHxxQQQ")
+
+_BLOCK_NUMBER = re.compile(rb"^N(\d+)", re.MULTILINE)
+
+_MOVEMENTS = (Pt5CommandType.MOVE, Pt5CommandType.CLOCKWISE_CIRCLE, Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE)
+
+# the part of the program after the restarted block is scanned in chunks of about this many bytes
+_TAIL_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class BlockState:
+    """Modal state of the program at the start of a block."""
+
+    # type of the command "open" before the block
+    current_command_type: str | None = None
+    is_absolute: bool = True
+    last_x: int = 0
+    last_y: int = 0
+
+
+class BlockIndex:
+    """Byte offsets of the blocks of an NCP program and the modal state at every few of them."""
+
+    def __init__(self, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL, source_size: int = 0):
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint interval must be positive")
+
+        self.checkpoint_interval = checkpoint_interval
+        # size of the indexed program in bytes, a cheap check that the offsets still fit the program
+        self.source_size = source_size
+        # N numbers of the blocks in the order of the program
+        self.numbers = array("q")
+        self.offsets = array("q")
+        # the state at the start of every checkpoint_interval-th block
+        self.checkpoints: list[BlockState] = []
+        # position of the first block with each number, built on the first lookup unless the numbers are in order
+        # (the usual case, then they are bisected instead)
+        self._positions: dict[int, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __contains__(self, number: object) -> bool:
+        if not isinstance(number, int):
+            return False
+        try:
+            self.position(number)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def build(source: str | os.PathLike[str], checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> "BlockIndex":
+        """
+        Index the blocks of the NCP program.
+        The modal state is tracked by parsing the program chunk by chunk between the checkpoints,
+        without converting or keeping any of the commands.
+
+        :param source: path to the NCP file
+        :param checkpoint_interval: number of the blocks between the checkpoints of the modal state
+        :return: the index
+        """
+        with open(source, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            index = BlockIndex(checkpoint_interval, size)
+            if size == 0:
+                # empty files cannot be memory-mapped
+                return index
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                numbers = index.numbers
+                offsets = index.offsets
+                for match in _BLOCK_NUMBER.finditer(buffer):
+                    numbers.append(int(match[1]))
+                    offsets.append(match.start())
+
+                state = BlockState()
+                start = 0
+                for position in range(0, len(offsets), checkpoint_interval):
+                    end = offsets[position]
+                    state = _advance(state, buffer[start:end])
+                    index.checkpoints.append(state)
+                    start = end
+
+        return index
+
+    def position(self, number: int) -> int:
+        """
+        Return the position of the first block with the given number.
+
+        :raises ValueError: if there is no such block
+        """
+        numbers = self.numbers
+        if self._positions is None:
+            self._positions = {}
+            if any(a > b for a, b in zip(numbers, numbers[1:])):
+                for position, block_number in enumerate(numbers):
+                    self._positions.setdefault(block_number, position)
+
+        if self._positions:
+            position = self._positions.get(number, -1)
+        else:
+            position = bisect_left(numbers, number)
+            if position == len(numbers) or numbers[position] != number:
+                position = -1
+        if position < 0:
+            raise ValueError(f"there is no block N{number}")
+        return position
+
+    def state_at(self, source: str | os.PathLike[str], number: int) -> tuple[int, BlockState]:
+        """
+        Find where the block starts and the modal state at its start.
+        Only the blocks since the nearest checkpoint are parsed.
+
+        :param source: path to the indexed NCP file
+        :param number: N number of the block
+        :return: the byte offset of the block and the modal state at its start
+        """
+        position = self.position(number)
+        checkpoint = position // self.checkpoint_interval
+        start = self.offsets[checkpoint * self.checkpoint_interval]
+        end = self.offsets[position]
+
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size != self.source_size:
+                raise ValueError(f"{source} has changed since it was indexed")
+            f.seek(start)
+            chunk = f.read(end - start)
+
+        return end, _advance(self.checkpoints[checkpoint], chunk)
+
+    def save(self, target: str | os.PathLike[str] | IO[bytes]) -> None:
+        """
+        Save the index to a file.
+
+        :param target: path of the file to (over)write, or an open binary file object
+        """
+        if isinstance(target, str | os.PathLike):
+            with open(target, "wb") as f:
+                self.save(f)
+                return
+
+        target.write(_HEADER.pack(MAGIC, VERSION, self.checkpoint_interval, len(self), self.source_size))
+        target.write(self.numbers.tobytes())
+        target.write(self.offsets.tobytes())
+        target.write(json.dumps([astuple(checkpoint) for checkpoint in self.checkpoints]).encode())
+
+    @staticmethod
+    def load(source: str | os.PathLike[str]) -> "BlockIndex":
+        """Load the index saved by BlockIndex.save."""
+        with open(source, "rb") as f:
+            data = f.read()
+
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{source} is not a block index")
+        magic, version, checkpoint_interval, count, source_size = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{source} is not a block index")
+        if version != VERSION:
+            raise ValueError(f"{source} has unsupported version {version} of the block index")
+
+        index = BlockIndex(checkpoint_interval, source_size)
+        offset = _HEADER.size
+        size = count * index.numbers.itemsize
+        index.numbers.frombytes(data[offset : offset + size])
+        index.offsets.frombytes(data[offset + size : offset + 2 * size])
+        index.checkpoints = [BlockState(*checkpoint) for checkpoint in json.loads(data[offset + 2 * size :])]
+        return index
+
+
+def stream_from_block(
+    source: str | os.PathLike[str],
+    number: int,
+    index: BlockIndex | None = None,
+    optimize: float | None = None,
+    fit_arcs: float | None = None,
+) -> Generator[str]:
+    """
+    Convert the NCP program from the given block onward, e.g. to restart a job stopped partway through.
+    The output is a complete PT5 program, numbered from N1 and starting at the position the block starts from.
+
+    :param source: path to the NCP file
+    :param number: N number of the block to start from
+    :param index: index of the program, it is built when not given
+    :param optimize: tolerance of merging the collinear moves (see optimize_records), no optimization when None
+    :param fit_arcs: tolerance of replacing the moves with arcs (see fit_arc_records), no arcs are fitted when None
+    :return: generator of the serialized PT5 lines
+    """
+    with open(source, "rb") as f:
+        yield from _serialize_pt5(_block_records(f, source, number, index, optimize, fit_arcs))
+
+
+def convert_from_block(
+    source: str | os.PathLike[str],
+    number: int,
+    target: str | os.PathLike[str] | IO[str] | IO[bytes],
+    index: BlockIndex | None = None,
+    optimize: float | None = None,
+    fit_arcs: float | None = None,
+) -> int:
+    """
+    Convert the NCP program from the given block onward and write the PT5 output to a file, see stream_from_block.
+
+    :param source: path to the NCP file
+    :param number: N number of the block to start from
+    :param target: path of the file to (over)write, or an open text or binary file object
+    :param index: index of the program, it is built when not given
+    :param optimize: tolerance of merging the collinear moves (see optimize_records), no optimization when None
+    :param fit_arcs: tolerance of replacing the moves with arcs (see fit_arc_records), no arcs are fitted when None
+    :return: number of characters written
+    """
+    with open(source, "rb") as f:
+        return _write_pt5(_block_records(f, source, number, index, optimize, fit_arcs), target)
+
+
+def _block_records(
+    f: IO[bytes],
+    source: str | os.PathLike[str],
+    number: int,
+    index: BlockIndex | None,
+    optimize: float | None,
+    fit_arcs: float | None,
+) -> Iterable[Pt5Record]:
+    if index is None:
+        index = BlockIndex.build(source)
+    offset, state = index.state_at(source, number)
+
+    f.seek(offset)
+    conversion = ConversionState(is_absolute=state.is_absolute, last_x=state.last_x, last_y=state.last_y)
+    records = _convert_records(_scan_records(f, state.current_command_type), conversion)
+    return _optimized(_with_leading_movement(records), optimize, fit_arcs, state=conversion)
+
+
+def _with_leading_movement(records: Iterable[Pt5Record]) -> Generator[Pt5Record]:
+    """Start with a null move when the program starts with a stop, the stops are appended to the movements."""
+    iterator = iter(records)
+    for record in iterator:
+        if record[0] not in _MOVEMENTS:
+            yield Pt5CommandType.MOVE, 0, 0, 0, 0
+        yield record
+        break
+    yield from iterator
+
+
+def _scan_records(f: IO[bytes], current_command_type: str | None) -> Generator[NcpRecord]:
+    """
+    Parse the rest of the file with the same scanner as the part before it (see _advance).
+    It is scanned chunk by chunk, so the memory usage stays flat the same as in stream_ncp_to_pt5.
+    """
+    rest = b""
+    while data := f.read(_TAIL_CHUNK_SIZE):
+        data = rest + data
+        # only whole lines are scanned, the last partial one is left for the next chunk
+        end = data.rfind(b"\n") + 1
+        rest = data[end:]
+        columns = scan_ncp(data[:end], current_command_type)
+        if len(columns):
+            current_command_type = columns.commands[-1].type
+        yield from columns.records()
+
+    if rest:
+        yield from scan_ncp(rest, current_command_type).records()
+
+
+def _advance(state: BlockState, chunk: bytes) -> BlockState:
+    """Return the modal state after the given part of the program."""
+    columns = scan_ncp(chunk, state.current_command_type)
+    if not len(columns):
+        return state
+
+    conversion = ConversionState(is_absolute=state.is_absolute, last_x=state.last_x, last_y=state.last_y)
+    # only the state at the end matters, the records are dropped right away
+    deque(_convert_records(columns.records(), conversion), maxlen=0)
+    return BlockState(
+        current_command_type=columns.commands[-1].type,
+        is_absolute=conversion.is_absolute,
+        last_x=conversion.last_x,
+        last_y=conversion.last_y,
+    )
@@ -0,0 +1,228 @@
+"""
+Content-addressed on-disk cache of the conversion results.
+The serialized PT5 output is stored under the hash of the NCP input (and the converter version),
+so converting an unchanged program again costs just the hashing of the input and a file copy.
+The least recently used entries are evicted once the cache grows over its size limit.
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import sys
+from collections.abc import Callable
+from pathlib import Path
+from typing import IO
+
+from pt5_core.block_index import BlockIndex
+from pt5_core.ncp_to_pt5 import CONVERTER_VERSION
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_SUFFIX = ".pt5"
+_INDEX_SUFFIX = ".idx"
+
+
+def default_cache_dir() -> Path:
+    """
+    Return the directory used for the cache when none is given explicitly.
+    It can be overridden by the PT5_CACHE_DIR environment variable.
+    """
+    if override := os.environ.get("PT5_CACHE_DIR"):
+        return Path(override)
+
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+
+    return Path(base) / "pt5"
+
+
+class ConversionCache:
+    def __init__(self, directory: str | os.PathLike[str] | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key_for(self, source: str | os.PathLike[str], options: str = "") -> str:
+        """
+        Compute the cache key of the given NCP file.
+
+        :param source: the NCP file
+        :param options: any conversion options affecting the output
+        :return: the key
+        """
+        digest = hashlib.sha256(_key_prefix(options))
+        with open(source, "rb") as f:
+            hashlib.file_digest(f, lambda: digest)
+        return digest.hexdigest()
+
+    def fetch(self, key: str, target: str | os.PathLike[str]) -> bool:
+        """
+        Copy the cached output to the target, if there is any.
+        The target is replaced at once, so it is never left partially written.
+
+        :param key: the cache key
+        :param target: where to copy the cached output to
+        :return: whether the entry was in the cache
+        """
+        entry = self._entry_path(key)
+        # the temporary file must be on the same filesystem as the target for the rename to be atomic
+        target = Path(target)
+        temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(entry, temporary)
+            os.replace(temporary, target)
+        except FileNotFoundError:
+            temporary.unlink(missing_ok=True)
+            return False
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        # mark the entry as recently used
+        os.utime(entry)
+        return True
+
+    def store(self, key: str, output: str | os.PathLike[str]) -> None:
+        """
+        Store a copy of the conversion output in the cache, evicting the least recently used entries if needed.
+
+        :param key: the cache key
+        :param output: the file with the output to store
+        """
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        # copy under a temporary name first, so that concurrent readers never see partial entries
+        temporary = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+        try:
+            shutil.copyfile(output, temporary)
+            os.replace(temporary, entry)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def fetch_index(self, key: str) -> BlockIndex | None:
+        """
+        Load the cached block index of the NCP file, if there is any.
+
+        :param key: the cache key
+        :return: the index or None if it was not in the cache
+        """
+        entry = self._entry_path(key, _INDEX_SUFFIX)
+        try:
+            index = BlockIndex.load(entry)
+        except FileNotFoundError:
+            return None
+
+        os.utime(entry)
+        return index
+
+    def store_index(self, key: str, index: BlockIndex) -> None:
+        """
+        Store the block index of the NCP file in the cache, evicting the least recently used entries if needed.
+
+        :param key: the cache key
+        :param index: the index to store
+        """
+        entry = self._entry_path(key, _INDEX_SUFFIX)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        temporary = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+        try:
+            index.save(temporary)
+            os.replace(temporary, entry)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits into its size limit."""
+        entries: list[tuple[float, int, Path]] = []
+        total = 0
+        for entry in (*self.directory.glob(f"*/*{_SUFFIX}"), *self.directory.glob(f"*/*{_INDEX_SUFFIX}")):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # removed by someone else in the meantime
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _entry_path(self, key: str, suffix: str = _SUFFIX) -> Path:
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+
+class KeyingReader(io.RawIOBase):
+    """
+    Binary file wrapper computing the cache key of everything read through it, e.g. while the file is being parsed.
+    Once the whole file is read, the key is the same as the one of ConversionCache.key_for, but it matches what was
+    read even if the file was changed in the meantime.
+    """
+
+    def __init__(self, raw: IO[bytes], options: str = ""):
+        """
+        :param raw: the NCP file opened in the binary mode
+        :param options: any conversion options affecting the output
+        """
+        super().__init__()
+        self._raw = raw
+        self._digest = hashlib.sha256(_key_prefix(options))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        read = self._raw.readinto(buffer)
+        self._digest.update(memoryview(buffer)[:read])
+        return read
+
+    def key(self) -> str:
+        return self._digest.hexdigest()
+
+
+def _key_prefix(options: str) -> bytes:
+    return f"{CONVERTER_VERSION}\0{options}\0".encode()
+
+
+def convert_cached(
+    cache: ConversionCache,
+    source: str | os.PathLike[str],
+    target: str | os.PathLike[str],
+    convert: Callable[[str | os.PathLike[str]], object],
+    options: str = "",
+) -> bool:
+    """
+    Produce the PT5 output of the given NCP file, either from the cache or by running the conversion.
+
+    :param cache: the cache to use
+    :param source: the NCP file
+    :param target: the PT5 file to (over)write
+    :param convert: function writing the converted output of the source to the path it is given
+    :param options: any conversion options affecting the output
+    :return: whether the output came from the cache
+    """
+    key = cache.key_for(source, options)
+    if cache.fetch(key, target):
+        return True
+
+    convert(target)
+    cache.store(key, target)
+    return False
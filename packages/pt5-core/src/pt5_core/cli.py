@@ -0,0 +1,382 @@
+"""
+Headless command line interface converting whole directory trees of NCP files to PT5.
+Only the core modules are imported here, so the startup stays fast even on machines without a display.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+
+from pt5_core.block_index import BlockIndex, convert_from_block
+from pt5_core.cache import ConversionCache, convert_cached, default_cache_dir
+from pt5_core.columnar import NcpColumns
+from pt5_core.ncp_scanner import scan_ncp_file
+from pt5_core.ncp_to_pt5 import write_ncp_as_pt5
+from pt5_core.optimizer import DEFAULT_ARC_TOLERANCE, DEFAULT_TOLERANCE
+from pt5_core.splitter import part_path, split_pt5
+from pt5_core.stats import PipelineStats
+
+
+@dataclass
+class ConversionResult:
+    source: Path
+    target: Path
+    commands: int | None
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+    cached: bool = False
+    stats: PipelineStats | None = None
+    # number of the parts the output was split into, None when it was not split
+    parts: int | None = None
+
+    def describe(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        split = f", split into {self.parts} parts" if self.parts is not None else ""
+        if self.cached:
+            return (
+                f"{self.source} -> {self.target}: cached in {self.seconds:.3f} s "
+                f"({self.input_bytes / seconds / 1024 / 1024:.1f} MiB/s){split}"
+            )
+        return (
+            f"{self.source} -> {self.target}: {self.commands} commands in {self.seconds:.3f} s "
+            f"({self.commands / seconds:,.0f} commands/s, {self.input_bytes / seconds / 1024 / 1024:.1f} MiB/s)"
+            f"{split}"
+        )
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="pt5", description="Convert NCP files to PT5.")
+    parser.add_argument("inputs", nargs="+", help="NCP files, directories (searched recursively) or glob patterns")
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=Path,
+        help="directory for the PT5 files, mirroring the input directories (default: next to the NCP files)",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        type=Path,
+        const=default_cache_dir(),
+        metavar="DIR",
+        help="reuse the outputs of the previous conversions stored in the cache directory (default: %(const)s)",
+    )
+    parser.add_argument(
+        "--optimize",
+        nargs="?",
+        type=float,
+        const=DEFAULT_TOLERANCE,
+        metavar="TOLERANCE",
+        help="merge the collinear moves deviating at most by the tolerance (in micrometers, default: %(const)s) "
+        "and drop the moves of zero length",
+    )
+    parser.add_argument(
+        "--fit-arcs",
+        nargs="?",
+        type=float,
+        const=DEFAULT_ARC_TOLERANCE,
+        metavar="TOLERANCE",
+        help="replace the runs of moves lying on a circle with arcs deviating at most by the tolerance "
+        "(in micrometers, default: %(const)s)",
+    )
+    parser.add_argument(
+        "--from-block",
+        type=int,
+        metavar="N",
+        help="convert only the blocks from the one numbered N onward, e.g. to restart a stopped job, "
+        "the output is written to <name>.N<N>.pt5 (with --cache the index of the blocks is cached as well)",
+    )
+    parser.add_argument(
+        "--split-lines",
+        type=int,
+        metavar="N",
+        help="also split the output into parts of at most N lines for the controllers with little program memory, "
+        "written to <name>.1.pt5, <name>.2.pt5, ... (the parts are cut after the M00 stops where possible)",
+    )
+    parser.add_argument(
+        "--split-bytes",
+        type=int,
+        metavar="N",
+        help="also split the output into parts of at most N bytes, the same as --split-lines (both may be given)",
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        metavar="SIZE",
+        help="also render the toolpath into a square PNG image of SIZE pixels next to the output, <name>.png",
+    )
+    parser.add_argument(
+        "--stats",
+        type=Path,
+        metavar="FILE",
+        help="write the timing of the stages of the conversions and other statistics to the file as JSON",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not report the individual files")
+    args = parser.parse_args(argv)
+
+    jobs = list(_collect_jobs(args.inputs, args.output_dir))
+    if not jobs:
+        print("no NCP files found", file=sys.stderr)
+        return 1
+    if args.from_block is not None:
+        jobs = [(source, target.with_suffix(f".N{args.from_block}.pt5")) for source, target in jobs]
+
+    started = time.perf_counter()
+    failed = 0
+    total_commands = 0
+    total_bytes = 0
+
+    cache = ConversionCache(args.cache) if args.cache is not None else None
+    collect_stats = args.stats is not None
+    file_stats: list[dict[str, object]] = []
+    total_stats = PipelineStats()
+
+    results = _run(
+        jobs,
+        args.workers,
+        cache,
+        args.optimize,
+        args.fit_arcs,
+        collect_stats,
+        args.from_block,
+        args.split_lines,
+        args.split_bytes,
+        args.preview,
+    )
+    for source, result in results:
+        if isinstance(result, BaseException):
+            failed += 1
+            print(f"{source}: {result}", file=sys.stderr)
+            continue
+
+        total_commands += result.commands or 0
+        total_bytes += result.input_bytes
+        if not args.quiet:
+            print(result.describe())
+        if result.stats is not None:
+            file_stats.append({"source": str(result.source), "target": str(result.target), **result.stats.to_dict()})
+            total_stats.merge(result.stats)
+
+    seconds = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"converted {len(jobs) - failed} of {len(jobs)} files in {seconds:.3f} s "
+        f"({total_commands / seconds:,.0f} commands/s, {total_bytes / seconds / 1024 / 1024:.1f} MiB/s)"
+    )
+
+    if collect_stats:
+        with open(args.stats, "w") as f:
+            json.dump({"files": file_stats, "total": total_stats.to_dict()}, f, indent=2)
+
+    return 1 if failed else 0
+
+
+def convert_file(
+    source: Path,
+    target: Path,
+    cache: ConversionCache | None = None,
+    optimize: float | None = None,
+    fit_arcs: float | None = None,
+    collect_stats: bool = False,
+    from_block: int | None = None,
+    split_lines: int | None = None,
+    split_bytes: int | None = None,
+    preview: int | None = None,
+) -> ConversionResult:
+    """
+    Convert a single NCP file to PT5.
+    The output is written to a temporary file first and then renamed, so the target is never left half-written.
+
+    :param source: the NCP file
+    :param target: the PT5 file to (over)write
+    :param cache: cache of the previous conversions to use, if any
+    :param optimize: tolerance of merging the collinear moves, no optimization when None
+    :param fit_arcs: tolerance of replacing the moves with arcs, no arcs are fitted when None
+    :param collect_stats: whether to collect the statistics of the conversion
+    :param from_block: N number of the block to start the conversion from, the whole program is converted when None
+    :param split_lines: maximum number of the lines of the parts to split the output into as well, see split_pt5
+    :param split_bytes: maximum size of the parts in bytes, the output is not split when neither is given
+    :param preview: size of the preview image of the toolpath to render next to the target, none is rendered when None
+    :return: summary of the conversion
+    """
+    started = time.perf_counter()
+    commands: int | None = None
+    parsed: NcpColumns | None = None
+    stats = PipelineStats() if collect_stats else None
+
+    def _stage(name: str) -> AbstractContextManager[object]:
+        return nullcontext() if stats is None else stats.stage(name)
+
+    def _convert(path: str | os.PathLike[str]) -> None:
+        nonlocal commands, parsed
+        if from_block is not None:
+            with _stage("index"):
+                index = _block_index(source, cache)
+            commands = len(index) - index.position(from_block)
+            with _stage("convert"):
+                written = convert_from_block(source, from_block, path, index, optimize=optimize, fit_arcs=fit_arcs)
+            if stats is not None:
+                stats.bytes_written += written
+            return
+
+        if stats is None:
+            parsed = scan_ncp_file(source)
+        else:
+            with stats.stage("parse") as stage:
+                parsed = scan_ncp_file(source, stats)
+            stage.items += len(parsed)
+        commands = len(parsed)
+        write_ncp_as_pt5(parsed, path, optimize=optimize, fit_arcs=fit_arcs, stats=stats)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # the temporary file must be on the same filesystem as the target for the rename to be atomic
+    temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        if cache is None:
+            _convert(temporary)
+            cached = False
+        else:
+            options = ",".join(
+                f"{name}={value}"
+                for name, value in (("optimize", optimize), ("fit_arcs", fit_arcs), ("from_block", from_block))
+                if value is not None
+            )
+            if stats is None:
+                cached = convert_cached(cache, source, temporary, _convert, options)
+            else:
+                # the hashing of the source and the copying of the cached output
+                with stats.stage("cache"):
+                    cached = convert_cached(cache, source, temporary, _convert, options)
+        os.replace(temporary, target)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+    parts = None
+    if split_lines is not None or split_bytes is not None:
+        with _stage("split"), open(target) as f:
+            parts = len(split_pt5(f, target, split_lines, split_bytes))
+        # the parts left over from splitting a longer version of the program would continue it
+        stale = parts + 1
+        while part_path(target, stale).exists():
+            part_path(target, stale).unlink()
+            stale += 1
+
+    if preview is not None:
+        # imported only here, the rendering pulls in NumPy which would slow down the start of every run
+        from pt5_core.raster import render_preview
+
+        with _stage("preview"):
+            # the whole program, even when only its tail was converted or the output came from the cache
+            if parsed is None:
+                parsed = scan_ncp_file(source)
+            render_preview(parsed, preview).save(target.with_suffix(".png"))
+
+    if stats is not None:
+        stats.finish()
+
+    return ConversionResult(
+        source=source,
+        target=target,
+        commands=commands,
+        input_bytes=source.stat().st_size,
+        output_bytes=target.stat().st_size,
+        seconds=time.perf_counter() - started,
+        cached=cached,
+        stats=stats,
+        parts=parts,
+    )
+
+
+def _block_index(source: Path, cache: ConversionCache | None) -> BlockIndex:
+    """Return the index of the blocks of the NCP file, from the cache if possible."""
+    if cache is None:
+        return BlockIndex.build(source)
+
+    key = cache.key_for(source, "block_index")
+    index = cache.fetch_index(key)
+    if index is None:
+        index = BlockIndex.build(source)
+        cache.store_index(key, index)
+    return index
+
+
+def _collect_jobs(inputs: Iterable[str], output_dir: Path | None) -> Iterable[tuple[Path, Path]]:
+    seen: set[Path] = set()
+
+    for raw_input in inputs:
+        path = Path(raw_input)
+        if path.is_dir():
+            root = path
+            sources = sorted(p for p in path.rglob("*") if p.suffix.lower() == ".ncp" and p.is_file())
+        elif path.is_file():
+            root = path.parent
+            sources = [path]
+        else:
+            # the shell does not expand the patterns everywhere (Windows), so do it here
+            root = _glob_root(raw_input)
+            sources = sorted(Path(p) for p in glob.glob(raw_input, recursive=True) if Path(p).is_file())
+
+        for source in sources:
+            if source in seen:
+                continue
+            seen.add(source)
+
+            if output_dir is None:
+                target = source.with_suffix(".pt5")
+            else:
+                target = (output_dir / source.relative_to(root)).with_suffix(".pt5")
+            yield source, target
+
+
+def _glob_root(pattern: str) -> Path:
+    """Return the directory part of the pattern before the first wildcard."""
+    root = Path()
+    for part in Path(pattern).parent.parts:
+        if any(c in part for c in "*?["):
+            break
+        root /= part
+    return root
+
+
+def _run(
+    jobs: list[tuple[Path, Path]],
+    workers: int,
+    cache: ConversionCache | None,
+    optimize: float | None,
+    fit_arcs: float | None,
+    collect_stats: bool,
+    from_block: int | None,
+    split_lines: int | None,
+    split_bytes: int | None,
+    preview: int | None,
+) -> Iterable[tuple[Path, ConversionResult | BaseException]]:
+    options = (cache, optimize, fit_arcs, collect_stats, from_block, split_lines, split_bytes, preview)
+    if workers <= 1 or len(jobs) == 1:
+        for source, target in jobs:
+            try:
+                yield source, convert_file(source, target, *options)
+            except Exception as e:
+                yield source, e
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_file, source, target, *options): source for source, target in jobs}
+        for future in as_completed(futures):
+            exception = future.exception()
+            yield futures[future], exception if exception is not None else future.result()
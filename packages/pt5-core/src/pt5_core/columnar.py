@@ -0,0 +1,323 @@
+"""
+Compact struct-of-arrays representation of the NCP and PT5 programs.
+Instead of one dataclass and one dict per command, the commands are stored in a handful of typed arrays:
+the opcode, the X, Y, I and J arguments and a bitmask telling which of the arguments are present.
+"""
+
+import os
+from array import array
+from collections.abc import Generator, Iterable, Iterator, Sequence
+from typing import IO, overload
+
+from pt5_core.geometry import ResolvedGeometry, resolve_geometry
+from pt5_core.ncp_model import NcpCommand, NcpFile, NcpRecord, _fits_micrometers, _millimeters_to_micrometers
+from pt5_core.pt5_model import Pt5Command, Pt5CommandType, Pt5File, Pt5Record, _serialize_pt5, _write_pt5
+
+# bits of the presence mask, in the order of the argument columns
+_ARGUMENT_NAMES = ("X", "Y", "I", "J")
+_ARGUMENT_BITS = {name: 1 << index for index, name in enumerate(_ARGUMENT_NAMES)}
+
+_PT5_COMMAND_TYPES = tuple(Pt5CommandType)
+_PT5_COMMAND_TYPE_CODES = {command_type: code for code, command_type in enumerate(_PT5_COMMAND_TYPES)}
+
+
+class NcpRow:
+    """Lightweight view of a single command of NcpColumns, compatible with NcpCommand."""
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns: "NcpColumns", index: int):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def type(self) -> str | None:
+        return self._columns._types[self._columns.opcodes[self._index]]
+
+    @property
+    def arguments(self) -> dict[str, float]:
+        return self._columns._arguments(self._index)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, NcpRow | NcpCommand):
+            return self.type == other.type and self.arguments == other.arguments
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"NcpRow(type={self.type!r}, arguments={self.arguments!r})"
+
+
+class Pt5Row:
+    """Lightweight view of a single command of Pt5Columns, compatible with Pt5Command."""
+
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns: "Pt5Columns", index: int):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def type(self) -> Pt5CommandType:
+        return _PT5_COMMAND_TYPES[self._columns.opcodes[self._index]]
+
+    @property
+    def arguments(self) -> dict[str, int]:
+        return self._columns._arguments(self._index)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Pt5Row | Pt5Command):
+            return self.type == other.type and self.arguments == other.arguments
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Pt5Row(type={self.type!r}, arguments={self.arguments!r})"
+
+
+class _Rows[TRow](Sequence[TRow]):
+    __slots__ = ("_columns", "_row_type")
+
+    def __init__(self, columns: "NcpColumns | Pt5Columns", row_type: type[TRow]):
+        self._columns = columns
+        self._row_type = row_type
+
+    def __len__(self) -> int:
+        return len(self._columns.opcodes)
+
+    @overload
+    def __getitem__(self, index: int) -> TRow: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[TRow]: ...
+
+    def __getitem__(self, index: int | slice) -> TRow | list[TRow]:
+        if isinstance(index, slice):
+            return [self._row_type(self._columns, i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self._row_type(self._columns, index)
+
+    def __iter__(self) -> Iterator[TRow]:
+        for index in range(len(self)):
+            yield self._row_type(self._columns, index)
+
+
+class NcpColumns:
+    """
+    Columnar NCP program, interchangeable with NcpFile.
+    The X, Y, I and J arguments are stored in the columns in integer micrometers, converted once when parsing,
+    any other (rare) arguments like F are kept aside per row as they are.
+    The (rare) X, Y, I and J with more decimals than micrometers are kept aside as they are too, so the rows give
+    back exactly the parsed arguments. The conversion works on the micrometers, the same as for NcpFile.
+    """
+
+    __slots__ = ("opcodes", "x", "y", "i", "j", "mask", "extra", "_types", "_type_codes", "_geometry")
+
+    def __init__(self):
+        self.opcodes = array("H")
+        self.x = array("q")
+        self.y = array("q")
+        self.i = array("q")
+        self.j = array("q")
+        self.mask = array("B")
+        self.extra: dict[int, dict[str, float]] = {}
+        # the command types are interned, the opcode is the index into this list
+        self._types: list[str | None] = []
+        self._type_codes: dict[str | None, int] = {}
+        self._geometry: ResolvedGeometry | None = None
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, NcpColumns | NcpFile):
+            return list(self.commands) == list(other.commands)
+        return NotImplemented
+
+    @property
+    def commands(self) -> Sequence[NcpRow]:
+        return _Rows(self, NcpRow)
+
+    @property
+    def command_types(self) -> Sequence[str | None]:
+        """The interned command types, the opcodes are indexes into this sequence."""
+        return tuple(self._types)
+
+    @property
+    def geometry(self) -> ResolvedGeometry:
+        """The program with all the positions resolved, computed on the first access and kept until it changes."""
+        if self._geometry is None:
+            self._geometry = resolve_geometry(self.records())
+        return self._geometry
+
+    @staticmethod
+    def parse(raw_lines: Iterable[str]) -> "NcpColumns":
+        return NcpColumns.from_commands(NcpFile.iter_parse(raw_lines))
+
+    @staticmethod
+    def from_commands(commands: Iterable[NcpCommand]) -> "NcpColumns":
+        columns = NcpColumns()
+        for command in commands:
+            columns.append(command.type, command.arguments)
+        return columns
+
+    def to_ncp_file(self) -> NcpFile:
+        return NcpFile(commands=[NcpCommand(type=row.type, arguments=row.arguments) for row in self.commands])
+
+    def append(self, command_type: str | None, arguments: dict[str, float]) -> None:
+        self._geometry = None
+        code = self.type_code(command_type)
+
+        mask = 0
+        extra: dict[str, float] = {}
+        for name, value in arguments.items():
+            bit = _ARGUMENT_BITS.get(name)
+            if bit is None:
+                extra[name] = value
+            else:
+                mask |= bit
+                if not _fits_micrometers(value):
+                    extra[name] = value
+
+        if extra:
+            self.extra[len(self.opcodes)] = extra
+
+        self.opcodes.append(code)
+        self.x.append(_millimeters_to_micrometers(arguments.get("X", 0)))
+        self.y.append(_millimeters_to_micrometers(arguments.get("Y", 0)))
+        self.i.append(_millimeters_to_micrometers(arguments.get("I", 0)))
+        self.j.append(_millimeters_to_micrometers(arguments.get("J", 0)))
+        self.mask.append(mask)
+
+    def extend(self, other: "NcpColumns", current_command_type: str | None = None) -> None:
+        """
+        Append all the commands of another program to this one.
+        The commands of the other program without a type (continuation lines at its very start) get the given type.
+
+        :param other: the program to append
+        :param current_command_type: type of the command "open" at the end of this program
+        """
+        self._geometry = None
+        remap = [
+            self.type_code(current_command_type if command_type is None else command_type)
+            for command_type in other._types
+        ]
+
+        offset = len(self.opcodes)
+        self.opcodes.extend(map(remap.__getitem__, other.opcodes))
+        self.x.extend(other.x)
+        self.y.extend(other.y)
+        self.i.extend(other.i)
+        self.j.extend(other.j)
+        self.mask.extend(other.mask)
+        self.extra.update((row + offset, arguments) for row, arguments in other.extra.items())
+
+    def type_code(self, command_type: str | None) -> int:
+        """Return the opcode of the given command type, registering it if it was not seen yet."""
+        code = self._type_codes.get(command_type)
+        if code is None:
+            code = self._type_codes[command_type] = len(self._types)
+            self._types.append(command_type)
+        return code
+
+    def records(self) -> Generator[NcpRecord]:
+        types = self._types
+        for code, x, y, i, j, mask in zip(self.opcodes, self.x, self.y, self.i, self.j, self.mask, strict=True):
+            yield (
+                types[code],
+                x if mask & 1 else None,
+                y if mask & 2 else None,
+                i if mask & 4 else None,
+                j if mask & 8 else None,
+            )
+
+    def _arguments(self, index: int) -> dict[str, float]:
+        mask = self.mask[index]
+        values = (self.x[index] / 1000, self.y[index] / 1000, self.i[index] / 1000, self.j[index] / 1000)
+        arguments = {
+            name: value for name, value in zip(_ARGUMENT_NAMES, values, strict=True) if mask & _ARGUMENT_BITS[name]
+        }
+        arguments.update(self.extra.get(index, {}))
+        return arguments
+
+
+class Pt5Columns:
+    """Columnar PT5 program, interchangeable with Pt5File."""
+
+    __slots__ = ("opcodes", "x", "y", "i", "j", "mask")
+
+    def __init__(self):
+        self.opcodes = array("B")
+        self.x = array("q")
+        self.y = array("q")
+        self.i = array("q")
+        self.j = array("q")
+        self.mask = array("B")
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Pt5Columns | Pt5File):
+            return list(self.commands) == list(other.commands)
+        return NotImplemented
+
+    @property
+    def commands(self) -> Sequence[Pt5Row]:
+        return _Rows(self, Pt5Row)
+
+    @staticmethod
+    def from_commands(commands: Iterable[Pt5Command]) -> "Pt5Columns":
+        columns = Pt5Columns()
+        for command in commands:
+            arguments = command.arguments
+            mask = 0
+            for name in arguments:
+                mask |= _ARGUMENT_BITS[name]
+            record = (
+                command.type,
+                arguments.get("X", 0),
+                arguments.get("Y", 0),
+                arguments.get("I", 0),
+                arguments.get("J", 0),
+            )
+            columns._append(record, mask)
+        return columns
+
+    @staticmethod
+    def from_records(records: Iterable[Pt5Record]) -> "Pt5Columns":
+        columns = Pt5Columns()
+        for record in records:
+            # zero arguments are not emitted at all, so only the non-zero ones are considered present
+            _, x, y, i, j = record
+            columns._append(record, (1 if x else 0) | (2 if y else 0) | (4 if i else 0) | (8 if j else 0))
+        return columns
+
+    def to_pt5_file(self) -> Pt5File:
+        return Pt5File(commands=[Pt5Command(type=row.type, arguments=row.arguments) for row in self.commands])
+
+    def records(self) -> Generator[Pt5Record]:
+        for code, x, y, i, j in zip(self.opcodes, self.x, self.y, self.i, self.j, strict=True):
+            yield _PT5_COMMAND_TYPES[code], x, y, i, j
+
+    def serialize(self) -> Generator[str]:
+        return _serialize_pt5(self.records())
+
+    def write_to(self, target: str | os.PathLike[str] | IO[str] | IO[bytes]) -> int:
+        return _write_pt5(self.records(), target)
+
+    def _append(self, record: Pt5Record, mask: int) -> None:
+        command_type, x, y, i, j = record
+        self.opcodes.append(_PT5_COMMAND_TYPE_CODES[command_type])
+        self.x.append(x)
+        self.y.append(y)
+        self.i.append(i)
+        self.j.append(j)
+        self.mask.append(mask)
+
+    def _arguments(self, index: int) -> dict[str, int]:
+        mask = self.mask[index]
+        values = (self.x[index], self.y[index], self.i[index], self.j[index])
+        return {name: value for name, value in zip(_ARGUMENT_NAMES, values, strict=True) if mask & _ARGUMENT_BITS[name]}
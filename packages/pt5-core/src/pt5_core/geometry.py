@@ -0,0 +1,321 @@
+"""
+Geometry of the toolpath, independent of any GUI toolkit.
+The positions are resolved to world coordinates (in micrometers) and the arcs are tessellated into short chords,
+so that the whole path can be drawn as plain polylines.
+"""
+
+import math
+from array import array
+from collections.abc import Generator, Iterable, Iterator
+from dataclasses import dataclass, field
+
+from pt5_core.ncp_model import ConversionState, NcpCommandType, NcpRecord
+from pt5_core.pt5_model import Pt5CommandType, Pt5Record
+
+# default maximum distance between an arc and its chords, in micrometers
+DEFAULT_TOLERANCE = 10.0
+
+
+# kinds of the resolved commands, the kind code is the index into this tuple
+GEOMETRY_KINDS = (
+    NcpCommandType.MOVE,
+    NcpCommandType.CLOCKWISE_CIRCLE,
+    NcpCommandType.COUNTER_CLOCKWISE_CIRCLE,
+    NcpCommandType.STOP,
+    NcpCommandType.END,
+    NcpCommandType.STOP_AND_REWIND,
+)
+_KIND_CODES = {kind: code for code, kind in enumerate(GEOMETRY_KINDS)}
+_MOVE = _KIND_CODES[NcpCommandType.MOVE]
+_CLOCKWISE_CIRCLE = _KIND_CODES[NcpCommandType.CLOCKWISE_CIRCLE]
+_COUNTER_CLOCKWISE_CIRCLE = _KIND_CODES[NcpCommandType.COUNTER_CLOCKWISE_CIRCLE]
+
+# the quadrant points of a circle, the extremes of the arcs passing through them
+_QUADRANT_ANGLES = (0.0, math.pi / 2, math.pi, 3 * math.pi / 2)
+
+
+class ResolvedGeometry:
+    """
+    The movements and stops of an NCP program with all the positions resolved to absolute world coordinates
+    (in integer micrometers), computed once per program.
+    Each row has the end point of the command (the current position for the stops), the start is the end
+    of the previous row (or the origin), the arcs have their centers resolved as well.
+    """
+
+    __slots__ = ("kinds", "absolute", "x", "y", "center_x", "center_y", "bounds")
+
+    def __init__(self):
+        self.kinds = array("B")
+        # whether the command was given in the absolute mode
+        self.absolute = array("B")
+        self.x = array("q")
+        self.y = array("q")
+        self.center_x = array("q")
+        self.center_y = array("q")
+        # min_x, min_y, max_x, max_y of the whole toolpath including the origin and the extremes of the arcs
+        self.bounds: tuple[float, float, float, float] = (0, 0, 0, 0)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def extend(self, other: "ResolvedGeometry") -> None:
+        """Append the geometry resolved for the following part of the program."""
+        self.kinds.extend(other.kinds)
+        self.absolute.extend(other.absolute)
+        self.x.extend(other.x)
+        self.y.extend(other.y)
+        self.center_x.extend(other.center_x)
+        self.center_y.extend(other.center_y)
+        self.bounds = (
+            min(self.bounds[0], other.bounds[0]),
+            min(self.bounds[1], other.bounds[1]),
+            max(self.bounds[2], other.bounds[2]),
+            max(self.bounds[3], other.bounds[3]),
+        )
+
+
+def resolve_geometry(records: Iterable[NcpRecord], state: ConversionState | None = None) -> ResolvedGeometry:
+    """
+    Resolve the positions of the NCP program.
+    When a state is given, the resolution continues from it (the bounds then include its position instead of
+    the origin) and it is updated once all the records are resolved, so that the rest of the program can follow.
+
+    :param records: the NCP program in the flat form
+    :param state: the modal state to start from
+    :return: the resolved geometry
+    """
+    if state is None:
+        state = ConversionState()
+
+    geometry = ResolvedGeometry()
+    append_kind = geometry.kinds.append
+    append_absolute = geometry.absolute.append
+    append_x = geometry.x.append
+    append_y = geometry.y.append
+    append_center_x = geometry.center_x.append
+    append_center_y = geometry.center_y.append
+    kind_codes = _KIND_CODES
+    hypot = math.hypot
+
+    is_absolute = state.is_absolute
+    last_x = state.last_x
+    last_y = state.last_y
+    min_x = max_x = last_x
+    min_y = max_y = last_y
+
+    for command_type, x, y, i, j in records:
+        kind = kind_codes.get(command_type)
+        if kind is None:
+            if command_type == NcpCommandType.SET_INCREMENTAL_MODE:
+                is_absolute = False
+            elif command_type == NcpCommandType.SET_ABSOLUTE_MODE:
+                is_absolute = True
+            continue
+
+        center_x = center_y = 0
+        if kind <= _COUNTER_CLOCKWISE_CIRCLE:
+            if is_absolute:
+                new_x = last_x if x is None else x
+                new_y = last_y if y is None else y
+            else:
+                new_x = last_x + (x or 0)
+                new_y = last_y + (y or 0)
+
+            if kind != _MOVE:
+                # the center is relative to the start of the arc
+                center_x = last_x + (i or 0)
+                center_y = last_y + (j or 0)
+                radius = hypot(i or 0, j or 0)
+                # most arcs lie within the bounds found so far, the exact extremes are only needed for the others
+                if (
+                    center_x - radius < min_x
+                    or center_y - radius < min_y
+                    or center_x + radius > max_x
+                    or center_y + radius > max_y
+                ):
+                    arc_min_x, arc_min_y, arc_max_x, arc_max_y = arc_bounds(
+                        (last_x, last_y), (new_x, new_y), (center_x, center_y), kind == _CLOCKWISE_CIRCLE
+                    )
+                    min_x = min(min_x, arc_min_x)
+                    min_y = min(min_y, arc_min_y)
+                    max_x = max(max_x, arc_max_x)
+                    max_y = max(max_y, arc_max_y)
+
+            # the end of an arc does not need to lie on its circle exactly
+            if new_x < min_x:
+                min_x = new_x
+            elif new_x > max_x:
+                max_x = new_x
+            if new_y < min_y:
+                min_y = new_y
+            elif new_y > max_y:
+                max_y = new_y
+
+            last_x = new_x
+            last_y = new_y
+
+        append_kind(kind)
+        append_absolute(is_absolute)
+        append_x(last_x)
+        append_y(last_y)
+        append_center_x(center_x)
+        append_center_y(center_y)
+
+    geometry.bounds = (min_x, min_y, max_x, max_y)
+    state.is_absolute = is_absolute
+    state.last_x = last_x
+    state.last_y = last_y
+    return geometry
+
+
+@dataclass
+class Toolpath:
+    # the tool never lifts, so the whole path is a single polyline of flat x, y coordinates
+    points: array = field(default_factory=lambda: array("d", [0.0, 0.0]))
+    centers: list[tuple[int, int]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        """Return the number of the points of the polyline."""
+        return len(self.points) // 2
+
+
+def resolve_pt5_geometry(records: Iterable[Pt5Record]) -> ResolvedGeometry:
+    """
+    Resolve the positions of the PT5 program.
+    The converter passes the centers of the arcs of the absolute mode of NCP on relative to their start, but turns the
+    ones of the incremental mode into the absolute centers, and PT5 does not record the mode, so the programs with
+    arcs are refused rather than drawn wrong.
+
+    :param records: the PT5 program
+    :return: the resolved geometry
+    :raises ValueError: if the program contains an arc
+    """
+    return resolve_geometry(_pt5_movements(records), ConversionState(is_absolute=False))
+
+
+def _pt5_movements(records: Iterable[Pt5Record]) -> Generator[NcpRecord]:
+    # the PT5 movements are relative, the same as the incremental NCP ones
+    move = Pt5CommandType.MOVE
+    for command_type, x, y, _, _ in records:
+        if command_type == move:
+            yield NcpCommandType.MOVE, x, y, None, None
+        elif command_type == Pt5CommandType.CLOCKWISE_CIRCLE or command_type == Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE:
+            raise ValueError(
+                "the centers of the PT5 arcs depend on the mode of the NCP program they were converted from, "
+                "use the NCP program instead"
+            )
+        else:
+            yield NcpCommandType(command_type.value), None, None, None, None
+
+
+def trace_toolpath(
+    geometry: ResolvedGeometry, tolerance: float = DEFAULT_TOLERANCE, start: tuple[int, int] = (0, 0)
+) -> Toolpath:
+    """
+    Turn the resolved geometry into a polyline, tessellating the arcs.
+
+    :param geometry: the resolved NCP program
+    :param tolerance: maximum distance between an arc and its chords, in micrometers
+    :param start: where the program starts, the origin unless only a part of the program was resolved
+    :return: the toolpath
+    """
+    last_x, last_y = start
+    toolpath = Toolpath(points=array("d", start))
+    points = toolpath.points
+    centers = toolpath.centers
+
+    for kind, x, y, center_x, center_y in zip(
+        geometry.kinds, geometry.x, geometry.y, geometry.center_x, geometry.center_y, strict=True
+    ):
+        if kind == _MOVE:
+            points.append(x)
+            points.append(y)
+        elif kind <= _COUNTER_CLOCKWISE_CIRCLE:
+            centers.append((center_x, center_y))
+            points.extend(
+                tessellate_arc((last_x, last_y), (x, y), (center_x, center_y), kind == _CLOCKWISE_CIRCLE, tolerance)
+            )
+
+        last_x = x
+        last_y = y
+
+    return toolpath
+
+
+def arc_bounds(
+    start: tuple[float, float], end: tuple[float, float], center: tuple[float, float], clockwise: bool
+) -> tuple[float, float, float, float]:
+    """
+    Return the bounding box of the arc, including its extremes and not just the end points.
+
+    :return: min_x, min_y, max_x, max_y
+    """
+    min_x = min(start[0], end[0])
+    min_y = min(start[1], end[1])
+    max_x = max(start[0], end[0])
+    max_y = max(start[1], end[1])
+
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    if radius == 0:
+        return min_x, min_y, max_x, max_y
+
+    sweep = arc_sweep(start, end, center, clockwise)
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    for angle in _QUADRANT_ANGLES:
+        # the quadrant point is a part of the arc if it is reached from the start before the sweep ends
+        if ((start_angle - angle if clockwise else angle - start_angle) % math.tau) <= sweep:
+            x = center[0] + radius * math.cos(angle)
+            y = center[1] + radius * math.sin(angle)
+            min_x = min(min_x, x)
+            min_y = min(min_y, y)
+            max_x = max(max_x, x)
+            max_y = max(max_y, y)
+
+    return min_x, min_y, max_x, max_y
+
+
+def arc_sweep(
+    start: tuple[float, float], end: tuple[float, float], center: tuple[float, float], clockwise: bool
+) -> float:
+    """
+    Return the angle (in radians, always positive) swept by the arc.
+    An arc ending where it starts is a full circle.
+    """
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    end_angle = math.atan2(end[1] - center[1], end[0] - center[0])
+    sweep = (start_angle - end_angle if clockwise else end_angle - start_angle) % math.tau
+    return sweep or math.tau
+
+
+def tessellate_arc(
+    start: tuple[float, float],
+    end: tuple[float, float],
+    center: tuple[float, float],
+    clockwise: bool,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> Iterator[float]:
+    """
+    Approximate the arc by chords no further than the tolerance from it.
+
+    :return: flat x, y coordinates of the points following the start, the last one is exactly the end
+    """
+    radius = math.hypot(start[0] - center[0], start[1] - center[1])
+    if radius == 0:
+        yield end[0]
+        yield end[1]
+        return
+
+    sweep = arc_sweep(start, end, center, clockwise)
+    # the largest angle of a chord whose sagitta still fits the tolerance, at least four chords per full circle
+    max_step = 2 * math.acos(max(1 - tolerance / radius, 0))
+    steps = math.ceil(sweep / min(max_step, math.pi / 2))
+
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    step = -sweep / steps if clockwise else sweep / steps
+    for n in range(1, steps):
+        angle = start_angle + n * step
+        yield center[0] + radius * math.cos(angle)
+        yield center[1] + radius * math.sin(angle)
+
+    yield end[0]
+    yield end[1]
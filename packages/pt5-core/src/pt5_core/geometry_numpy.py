@@ -0,0 +1,202 @@
+"""
+Vectorized arc geometry using NumPy, processing all the arcs of a program at once.
+NumPy is an optional dependency, install pt5-core with the "numpy" extra to use this module.
+
+The results are the same as of the per-arc functions in pt5_core.geometry (up to the rounding of the last digit).
+The degenerate arcs are handled by the same array operations as the others, without any per-arc branching:
+an arc ending where it starts is a full circle and an arc of zero radius is a single point (its end).
+"""
+
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+from pt5_core.geometry import (
+    _CLOCKWISE_CIRCLE,
+    _COUNTER_CLOCKWISE_CIRCLE,
+    _MOVE,
+    DEFAULT_TOLERANCE,
+    ResolvedGeometry,
+    Toolpath,
+)
+
+# angles of the quadrant points of a circle, the extremes of the arcs passing through them
+_QUADRANT_ANGLES = np.array([0.0, np.pi / 2, np.pi, 3 * np.pi / 2])
+_QUADRANT_COS = np.array([1.0, 0.0, -1.0, 0.0])
+_QUADRANT_SIN = np.array([0.0, 1.0, 0.0, -1.0])
+
+
+@dataclass
+class Arcs:
+    """Arcs given by their start, end and center points (in micrometers) and their direction, one element each."""
+
+    start_x: np.ndarray
+    start_y: np.ndarray
+    end_x: np.ndarray
+    end_y: np.ndarray
+    center_x: np.ndarray
+    center_y: np.ndarray
+    clockwise: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.clockwise)
+
+    @staticmethod
+    def from_geometry(geometry: ResolvedGeometry, start: tuple[int, int] = (0, 0)) -> "Arcs":
+        """
+        Collect the arcs of the resolved program.
+
+        :param geometry: the resolved program
+        :param start: where the program starts, the origin unless only a part of the program was resolved
+        """
+        kinds = np.frombuffer(geometry.kinds, dtype=np.uint8)
+        x = np.frombuffer(geometry.x, dtype=np.int64)
+        y = np.frombuffer(geometry.y, dtype=np.int64)
+        is_arc = (kinds == _CLOCKWISE_CIRCLE) | (kinds == _COUNTER_CLOCKWISE_CIRCLE)
+        return Arcs(
+            start_x=_previous(x, start[0])[is_arc].astype(np.float64),
+            start_y=_previous(y, start[1])[is_arc].astype(np.float64),
+            end_x=x[is_arc].astype(np.float64),
+            end_y=y[is_arc].astype(np.float64),
+            center_x=np.frombuffer(geometry.center_x, dtype=np.int64)[is_arc].astype(np.float64),
+            center_y=np.frombuffer(geometry.center_y, dtype=np.int64)[is_arc].astype(np.float64),
+            clockwise=kinds[is_arc] == _CLOCKWISE_CIRCLE,
+        )
+
+
+@dataclass
+class ArcMetrics:
+    radius: np.ndarray
+    # heading of the start point as seen from the center, in radians
+    start_angle: np.ndarray
+    # angle swept by the arc, always positive (a full circle for the arcs ending where they start)
+    sweep: np.ndarray
+    # the sweep signed by the direction, negative for the clockwise arcs
+    extent: np.ndarray
+    length: np.ndarray
+
+
+def arc_metrics(arcs: Arcs) -> ArcMetrics:
+    """Compute the radius, the angles and the length of each of the arcs, see pt5_core.geometry.arc_sweep."""
+    radius = np.hypot(arcs.start_x - arcs.center_x, arcs.start_y - arcs.center_y)
+    start_angle = np.arctan2(arcs.start_y - arcs.center_y, arcs.start_x - arcs.center_x)
+    end_angle = np.arctan2(arcs.end_y - arcs.center_y, arcs.end_x - arcs.center_x)
+
+    sweep = np.mod(np.where(arcs.clockwise, start_angle - end_angle, end_angle - start_angle), 2 * np.pi)
+    sweep[sweep == 0] = 2 * np.pi
+    return ArcMetrics(
+        radius=radius,
+        start_angle=start_angle,
+        sweep=sweep,
+        extent=np.where(arcs.clockwise, -sweep, sweep),
+        length=radius * sweep,
+    )
+
+
+def arc_bounds_numpy(arcs: Arcs, metrics: ArcMetrics | None = None) -> tuple[np.ndarray, ...]:
+    """
+    Return the bounding boxes of the arcs, including their extremes and not just the end points.
+
+    :param arcs: the arcs
+    :param metrics: the metrics of the arcs, if already computed
+    :return: min_x, min_y, max_x and max_y of each of the arcs
+    """
+    if metrics is None:
+        metrics = arc_metrics(arcs)
+
+    # a quadrant point is a part of the arc if it is reached from the start before the sweep ends
+    offsets = _QUADRANT_ANGLES - metrics.start_angle[:, np.newaxis]
+    offsets = np.mod(np.where(arcs.clockwise[:, np.newaxis], -offsets, offsets), 2 * np.pi)
+    # the zero-radius arcs do not reach anywhere
+    reached = (offsets <= metrics.sweep[:, np.newaxis]) & (metrics.radius[:, np.newaxis] > 0)
+
+    extremes_x = np.where(reached, arcs.center_x[:, np.newaxis] + metrics.radius[:, np.newaxis] * _QUADRANT_COS, np.nan)
+    extremes_y = np.where(reached, arcs.center_y[:, np.newaxis] + metrics.radius[:, np.newaxis] * _QUADRANT_SIN, np.nan)
+    x = np.column_stack((arcs.start_x, arcs.end_x, extremes_x))
+    y = np.column_stack((arcs.start_y, arcs.end_y, extremes_y))
+    return np.nanmin(x, axis=1), np.nanmin(y, axis=1), np.nanmax(x, axis=1), np.nanmax(y, axis=1)
+
+
+def tessellate_arcs(
+    arcs: Arcs, tolerance: float = DEFAULT_TOLERANCE, metrics: ArcMetrics | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Approximate the arcs by chords no further than the tolerance from them, see pt5_core.geometry.tessellate_arc.
+
+    :param arcs: the arcs
+    :param tolerance: maximum distance between an arc and its chords, in micrometers
+    :param metrics: the metrics of the arcs, if already computed
+    :return: the x and y coordinates of the points following the start of each arc (the last one is exactly its end)
+        one arc after another, and the number of the points of each arc
+    """
+    if metrics is None:
+        metrics = arc_metrics(arcs)
+
+    radius = metrics.radius
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # the largest angle of a chord whose sagitta still fits the tolerance, at least four chords per full circle
+        max_step = 2 * np.arccos(np.clip(1 - tolerance / radius, 0, None))
+        steps = np.ceil(metrics.sweep / np.minimum(max_step, np.pi / 2)).astype(np.int64)
+    # an arc of zero radius is just its end
+    steps[radius == 0] = 1
+
+    arc = np.repeat(np.arange(len(steps)), steps)
+    last = np.cumsum(steps)
+    # number of the point within its arc, from one
+    n = _positions_within(steps) + 1
+
+    angle = metrics.start_angle[arc] + n * (metrics.extent / steps)[arc]
+    x = arcs.center_x[arc] + radius[arc] * np.cos(angle)
+    y = arcs.center_y[arc] + radius[arc] * np.sin(angle)
+    x[last - 1] = arcs.end_x
+    y[last - 1] = arcs.end_y
+    return np.column_stack((x, y)), steps
+
+
+def trace_toolpath_numpy(
+    geometry: ResolvedGeometry, tolerance: float = DEFAULT_TOLERANCE, start: tuple[int, int] = (0, 0)
+) -> Toolpath:
+    """
+    Turn the resolved geometry into a polyline, the same as pt5_core.geometry.trace_toolpath, tessellating
+    all the arcs at once.
+
+    :param geometry: the resolved NCP program
+    :param tolerance: maximum distance between an arc and its chords, in micrometers
+    :param start: where the program starts, the origin unless only a part of the program was resolved
+    :return: the toolpath
+    """
+    kinds = np.frombuffer(geometry.kinds, dtype=np.uint8)
+    is_move = kinds == _MOVE
+    is_arc = (kinds == _CLOCKWISE_CIRCLE) | (kinds == _COUNTER_CLOCKWISE_CIRCLE)
+
+    arcs = Arcs.from_geometry(geometry, start)
+    arc_points, steps = tessellate_arcs(arcs, tolerance)
+
+    # every move adds its end point, every arc its tessellation and the stops add nothing
+    counts = np.zeros(len(kinds), dtype=np.int64)
+    counts[is_move] = 1
+    counts[is_arc] = steps
+    first = np.cumsum(counts) - counts
+
+    points = np.empty((int(counts.sum()) + 1, 2))
+    points[0] = start
+    points[1:][first[is_move], 0] = np.frombuffer(geometry.x, dtype=np.int64)[is_move]
+    points[1:][first[is_move], 1] = np.frombuffer(geometry.y, dtype=np.int64)[is_move]
+    points[1:][np.repeat(first[is_arc], steps) + _positions_within(steps)] = arc_points
+
+    center_x = np.frombuffer(geometry.center_x, dtype=np.int64)[is_arc]
+    center_y = np.frombuffer(geometry.center_y, dtype=np.int64)[is_arc]
+    return Toolpath(points=array("d", points.tobytes()), centers=list(zip(center_x.tolist(), center_y.tolist())))
+
+
+def _positions_within(counts: np.ndarray) -> np.ndarray:
+    """Number the items of consecutive groups of the given sizes, from zero within each group."""
+    return np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _previous(values: np.ndarray, first: int) -> np.ndarray:
+    """Shift the values by one, the value before the first one is given."""
+    previous = np.empty_like(values)
+    previous[:1] = first
+    previous[1:] = values[:-1]
+    return previous
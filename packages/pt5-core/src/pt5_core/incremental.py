@@ -0,0 +1,125 @@
+"""
+Incremental re-conversion of edited NCP programs.
+While converting, a checkpoint of the whole modal state (the open command type, the G90/G91 mode, the position
+and the state of the serializer) is recorded every few lines. When the program is edited, the conversion resumes
+from the last checkpoint before the first changed line and the new PT5 tail is spliced onto the unchanged prefix.
+"""
+
+from bisect import bisect_right
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+from pt5_core.ncp_model import ConversionState, _iter_ncp, _ncp_records
+from pt5_core.ncp_to_pt5 import _convert_records
+from pt5_core.pt5_model import SerializerState, _serialize_pt5
+
+DEFAULT_CHECKPOINT_INTERVAL = 1024
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """Complete state of the conversion after a given number of NCP lines."""
+
+    # number of the NCP lines converted so far
+    line_offset: int
+    # type of the command "open" at the end of the converted lines
+    current_command_type: str | None
+    is_absolute: bool
+    last_x: int
+    last_y: int
+    # number of the finished PT5 lines so far
+    output_offset: int
+    # number of the next PT5 line
+    line_number: int
+    # the last PT5 line, still waiting for the stops that may follow it
+    pending_line: str
+
+
+_START = Checkpoint(
+    line_offset=0,
+    current_command_type=None,
+    is_absolute=True,
+    last_x=0,
+    last_y=0,
+    output_offset=0,
+    line_number=1,
+    pending_line="",
+)
+
+
+class IncrementalConversion:
+    """
+    NCP to PT5 conversion that can be cheaply updated after the NCP program is edited.
+    The output is always identical to converting the whole program from scratch.
+    """
+
+    def __init__(self, checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL):
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint interval must be positive")
+
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints: list[Checkpoint] = [_START]
+        self._raw_lines: list[str] = []
+        # the finished PT5 lines, the pending one is kept in the last checkpoint
+        self._output: list[str] = []
+
+    @property
+    def output(self) -> list[str]:
+        """The serialized PT5 lines of the current program."""
+        pending_line = self.checkpoints[-1].pending_line
+        return self._output + [pending_line + "\n"] if pending_line else list(self._output)
+
+    def update(self, raw_lines: Iterable[str], first_changed_line: int | None = None) -> Checkpoint:
+        """
+        Convert the new version of the program, reusing as much of the previous conversion as possible.
+
+        :param raw_lines: all the lines of the new version of the NCP program
+        :param first_changed_line: index of the first line that differs from the previous version,
+            found by comparing the lines when not given
+        :return: the checkpoint the conversion was resumed from
+        """
+        raw_lines = list(raw_lines)
+        if first_changed_line is None:
+            first_changed_line = _common_prefix_length(self._raw_lines, raw_lines)
+
+        # the last checkpoint before the first change, it only depends on the unchanged lines
+        index = bisect_right(self.checkpoints, first_changed_line, key=lambda checkpoint: checkpoint.line_offset) - 1
+        checkpoint = self.checkpoints[index]
+
+        del self.checkpoints[index + 1 :]
+        del self._output[checkpoint.output_offset :]
+        self._raw_lines = raw_lines
+
+        for start in range(checkpoint.line_offset, len(raw_lines), self.checkpoint_interval):
+            block = raw_lines[start : start + self.checkpoint_interval]
+            self.checkpoints.append(_convert_block(block, self.checkpoints[-1], self._output))
+
+        return checkpoint
+
+
+def _convert_block(raw_lines: Sequence[str], checkpoint: Checkpoint, output: list[str]) -> Checkpoint:
+    """Convert the lines following the checkpoint, append the finished PT5 lines and return the next checkpoint."""
+    commands = list(_iter_ncp(raw_lines, checkpoint.current_command_type))
+    current_command_type = commands[-1].type if commands else checkpoint.current_command_type
+
+    conversion = ConversionState(is_absolute=checkpoint.is_absolute, last_x=checkpoint.last_x, last_y=checkpoint.last_y)
+    serializer = SerializerState(line_number=checkpoint.line_number, last_line=checkpoint.pending_line)
+    output.extend(_serialize_pt5(_convert_records(_ncp_records(commands), conversion), serializer))
+
+    return Checkpoint(
+        line_offset=checkpoint.line_offset + len(raw_lines),
+        current_command_type=current_command_type,
+        is_absolute=conversion.is_absolute,
+        last_x=conversion.last_x,
+        last_y=conversion.last_y,
+        output_offset=len(output),
+        line_number=serializer.line_number,
+        pending_line=serializer.last_line,
+    )
+
+
+def _common_prefix_length(old: Sequence[str], new: Sequence[str]) -> int:
+    for index, (old_line, new_line) in enumerate(zip(old, new)):
+        if old_line != new_line:
+            return index
+    return min(len(old), len(new))
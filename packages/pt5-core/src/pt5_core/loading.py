@@ -0,0 +1,90 @@
+"""
+Loading of NCP programs block by block, so that a long-running load can report its progress, be cancelled between
+the blocks and show the part of the program loaded so far.
+The geometry is resolved along the way, so it is readily available once the whole program is loaded.
+"""
+
+import itertools
+from collections.abc import Generator, Iterable
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass
+
+from pt5_core.geometry import ResolvedGeometry, resolve_geometry
+from pt5_core.ncp_model import ConversionState, NcpCommand, NcpFile, _iter_ncp, _ncp_records
+from pt5_core.stats import PipelineStats
+
+DEFAULT_BLOCK_LINES = 16384
+
+
+@dataclass
+class LoadedBlock:
+    # number of the lines and characters of the input consumed so far
+    lines: int
+    characters: int
+    # the geometry of just the commands of this block
+    geometry: ResolvedGeometry
+    # where the block starts, i.e. the end of the previous one
+    start: tuple[int, int]
+
+
+class NcpLoader:
+    def __init__(
+        self, raw_lines: Iterable[str], block_lines: int = DEFAULT_BLOCK_LINES, stats: PipelineStats | None = None
+    ):
+        """
+        :param raw_lines: the NCP lines to load, typically an open file
+        :param block_lines: number of the lines of a single block
+        :param stats: collects the timing of the parsing and of the resolution of the geometry, if given
+        """
+        self._raw_lines = iter(raw_lines if stats is None else stats.read_lines(raw_lines))
+        self.stats = stats
+        self.block_lines = block_lines
+        self.lines = 0
+        self.characters = 0
+        self._commands: list[NcpCommand] = []
+        self._geometry = ResolvedGeometry()
+        # the state spanning the blocks
+        self._current_command_type: str | None = None
+        self._state = ConversionState()
+
+    def blocks(self) -> Generator[LoadedBlock]:
+        """Parse the rest of the program, yielding after every block of lines."""
+        state = self._state
+
+        while block := list(itertools.islice(self._raw_lines, self.block_lines)):
+            self.lines += len(block)
+            self.characters += sum(map(len, block))
+
+            with self._stage("parse"):
+                commands = list(_iter_ncp(block, self._current_command_type))
+            if commands:
+                self._current_command_type = commands[-1].type
+            self._commands.extend(commands)
+            if self.stats is not None:
+                self.stats.stages["parse"].items += len(commands)
+                self.stats.commands.update(command.type for command in commands)
+
+            start = (state.last_x, state.last_y)
+            with self._stage("resolve"):
+                geometry = resolve_geometry(_ncp_records(commands), state)
+            self._geometry.extend(geometry)
+
+            yield LoadedBlock(lines=self.lines, characters=self.characters, geometry=geometry, start=start)
+
+    def result(self) -> NcpFile:
+        """
+        Return the loaded program, its geometry is then in the geometry attribute.
+        Any blocks not loaded yet are loaded first.
+        """
+        for _ in self.blocks():
+            pass
+
+        return NcpFile(commands=self._commands)
+
+    @property
+    def geometry(self) -> ResolvedGeometry:
+        """The geometry of the blocks loaded so far, the same as NcpFile.geometry of the whole program once loaded."""
+        return self._geometry
+
+    def _stage(self, name: str) -> AbstractContextManager[object]:
+        return nullcontext() if self.stats is None else self.stats.stage(name)
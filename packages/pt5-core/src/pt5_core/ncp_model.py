@@ -1,6 +1,12 @@
+import os
 from collections.abc import Generator, Iterable
 from dataclasses import dataclass, field
 from enum import StrEnum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pt5_core.binary import MappedNcpFile
+    from pt5_core.geometry import ResolvedGeometry
 
 
 class NcpCommandType(StrEnum):
@@ -14,6 +20,28 @@ class NcpCommandType(StrEnum):
     STOP_AND_REWIND = "M30"
 
 
+# flat form of a command used by the converters: type, X, Y, I and J in micrometers, with None for the missing arguments
+type NcpRecord = tuple[str | None, int | None, int | None, int | None, int | None]
+
+
+@dataclass
+class ConversionState:
+    """Modal state of a program being converted (or resolved), the positions are in integer micrometers."""
+
+    is_absolute: bool = True
+    last_x: int = 0
+    last_y: int = 0
+
+
+def _millimeters_to_micrometers(x: float) -> int:
+    return round(x * 1000)
+
+
+def _fits_micrometers(x: float) -> bool:
+    """Return whether the value is given back exactly from integer micrometers."""
+    return round(x * 1000) / 1000 == x
+
+
 @dataclass
 class NcpCommand:
     type: str  # NcpCommandType
@@ -28,6 +56,44 @@ class NcpFile:
     def parse(raw_lines: Iterable[str]) -> "NcpFile":
         return _parse_ncp(raw_lines)
 
+    @staticmethod
+    def iter_parse(raw_lines: Iterable[str]) -> Generator[NcpCommand]:
+        """
+        Parse the lines lazily, yielding the commands one by one instead of collecting them.
+        Only the type of the currently "open" command is kept between lines, so the memory usage does not depend
+        on the size of the input.
+        """
+        return _iter_ncp(raw_lines)
+
+    @staticmethod
+    def load_binary(source: str | os.PathLike[str]) -> "MappedNcpFile":
+        """
+        Memory-map the program from a file written by pt5_core.binary.write_binary.
+        The commands are only decoded once they are accessed.
+        """
+        # imported here, the binary module itself depends on this one
+        from pt5_core.binary import MappedNcpFile
+
+        return MappedNcpFile(source)
+
+    def records(self) -> Generator[NcpRecord]:
+        """
+        Return the commands in the flat form with the coordinates converted to integer micrometers.
+        All the position tracking is done on these, so that no rounding errors accumulate.
+        """
+        return _ncp_records(self.commands)
+
+    @property
+    def geometry(self) -> "ResolvedGeometry":
+        """
+        The program with all the positions resolved.
+        It is resolved from the commands on every access, keep it next to the program where it is needed repeatedly.
+        """
+        # imported here, the geometry module itself depends on this one
+        from pt5_core.geometry import resolve_geometry
+
+        return resolve_geometry(self.records())
+
 
 def _parse_line(raw_line: str, current_command_type: str | None) -> Generator[NcpCommand]:
     """
@@ -50,7 +116,7 @@ def _parse_line(raw_line: str, current_command_type: str | None) -> Generator[Nc
     parts = raw_line.rstrip("\n").split(" ")
     current_command: NcpCommand | None = None
 
-    # drop the line number for now, no cross-referencing support
+    # the line numbers are not kept in the commands, pt5_core.block_index looks the lines up by them instead
     if parts[0].startswith("N"):
         parts.pop(0)
 
@@ -72,9 +138,7 @@ def _parse_line(raw_line: str, current_command_type: str | None) -> Generator[Nc
         yield current_command
 
 
-def _parse_ncp(raw_lines: Iterable[str]) -> NcpFile:
-    commands: list[NcpCommand] = []
-
+def _iter_ncp(raw_lines: Iterable[str], current_command_type: str | None = None) -> Generator[NcpCommand]:
     for raw_line in raw_lines:
         if raw_line.startswith("%"):
             # for now, ignore the comments
@@ -82,13 +146,28 @@ def _parse_ncp(raw_lines: Iterable[str]) -> NcpFile:
 
         if raw_line.startswith("N"):
             # numbered command
-            commands.extend(
-                _parse_line(
-                    raw_line,
-                    current_command_type=commands[-1].type if commands else None,
-                )
-            )
+            for command in _parse_line(raw_line, current_command_type=current_command_type):
+                current_command_type = command.type
+                yield command
 
         # silently ignore unsupported line types
 
-    return NcpFile(commands=commands)
+
+def _parse_ncp(raw_lines: Iterable[str]) -> NcpFile:
+    return NcpFile(commands=list(_iter_ncp(raw_lines)))
+
+
+def _ncp_records(commands: Iterable[NcpCommand]) -> Generator[NcpRecord]:
+    for command in commands:
+        arguments = command.arguments
+        x = arguments.get("X")
+        y = arguments.get("Y")
+        i = arguments.get("I")
+        j = arguments.get("J")
+        yield (
+            command.type,
+            None if x is None else _millimeters_to_micrometers(x),
+            None if y is None else _millimeters_to_micrometers(y),
+            None if i is None else _millimeters_to_micrometers(i),
+            None if j is None else _millimeters_to_micrometers(j),
+        )
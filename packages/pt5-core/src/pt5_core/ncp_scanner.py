@@ -0,0 +1,268 @@
+"""
+Fast NCP parser working directly on bytes.
+It produces the same commands as NcpFile.parse, but it scans the whole buffer (or memory-mapped file) at once
+and stores the results straight into NcpColumns, without going through text lines and per-command objects.
+Unlike NcpFile.parse it also tolerates tabs and repeated spaces between the words.
+"""
+
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from pt5_core.columnar import NcpColumns
+from pt5_core.stats import PipelineStats
+
+# Numbered lines only, comments and other unsupported lines are skipped by the regex itself.
+# The common shape of the line (at most one command followed by the X, Y, I and J arguments in this order)
+# is tokenized by the regex directly, anything else falls back to the generic word-by-word scanning.
+_NUMBERED_LINE = re.compile(
+    rb"^(?:"
+    rb"N\S*+[ \t]++(?:([GM]\S*+)[ \t]*+)?+"
+    rb"(?:X(\S++)[ \t]*+)?+(?:Y(\S++)[ \t]*+)?+(?:I(\S++)[ \t]*+)?+(?:J(\S++)[ \t]*+)?+\r?$"
+    rb"|(N[^\n]*))",
+    re.MULTILINE,
+)
+
+_G = ord("G")
+_M = ord("M")
+_X = ord("X")
+_Y = ord("Y")
+_I = ord("I")
+_J = ord("J")
+
+
+def scan_ncp_file(path: str | os.PathLike[str], stats: PipelineStats | None = None) -> NcpColumns:
+    """
+    Parse the NCP file by memory-mapping it instead of reading it line by line.
+
+    :param path: path to the NCP file
+    :param stats: counts the lines of the file (see PipelineStats.count_lines), if given
+    :return: the parsed program
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files cannot be memory-mapped
+            return NcpColumns()
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if stats is not None:
+                stats.count_lines(buffer)
+            return scan_ncp(buffer)
+
+
+def scan_ncp_file_parallel(
+    path: str | os.PathLike[str], workers: int | None = None, chunk_size: int = 8 * 1024 * 1024
+) -> NcpColumns:
+    """
+    Parse the NCP file in a pool of processes.
+    The file is split into chunks at line boundaries, each chunk is scanned on its own and the results are merged.
+    The only state spanning the lines is the type of the currently "open" command,
+    it is fixed up during the merge, so the result is identical to the sequential parsing.
+    Small files that fit into a single chunk are parsed in the current process.
+
+    :param path: path to the NCP file
+    :param workers: number of the worker processes, defaults to the number of CPUs
+    :param chunk_size: approximate size of a single chunk in bytes
+    :return: the parsed program
+    """
+    chunks = _split_into_chunks(path, chunk_size)
+    if len(chunks) <= 1:
+        return scan_ncp_file(path)
+
+    columns = NcpColumns()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_scan_chunk, path, start, end) for start, end in chunks]
+        for future in futures:
+            current_command_type = columns.commands[-1].type if len(columns) else None
+            columns.extend(future.result(), current_command_type=current_command_type)
+
+    return columns
+
+
+def _split_into_chunks(path: str | os.PathLike[str], chunk_size: int) -> list[tuple[int, int]]:
+    chunks: list[tuple[int, int]] = []
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return chunks
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start = 0
+            while start < size:
+                # always cut right after a newline so that no line is split between two chunks
+                newline = buffer.find(b"\n", min(start + chunk_size, size) - 1)
+                end = size if newline == -1 else newline + 1
+                chunks.append((start, end))
+                start = end
+
+    return chunks
+
+
+def _scan_chunk(path: str | os.PathLike[str], start: int, end: int) -> NcpColumns:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return scan_ncp(f.read(end - start))
+
+
+def scan_ncp(data: bytes | mmap.mmap, current_command_type: str | None = None) -> NcpColumns:
+    """
+    Parse the NCP program from raw bytes.
+
+    :param data: the contents of the NCP file
+    :param current_command_type: type of the command "open" before the start of the data
+    :return: the parsed program
+    """
+    columns = NcpColumns()
+    _scan_into(columns, data, current_command_type)
+    return columns
+
+
+def _scan_into(columns: NcpColumns, data: bytes | mmap.mmap, current_command_type: str | None) -> None:
+    # bind everything used in the hot loop to locals, this is a major part of the speedup
+    append_opcode = columns.opcodes.append
+    append_x = columns.x.append
+    append_y = columns.y.append
+    append_i = columns.i.append
+    append_j = columns.j.append
+    append_mask = columns.mask.append
+    extra = columns.extra
+    type_code = columns.type_code
+
+    # cache of the command words seen so far (b"G01" -> opcode)
+    codes: dict[bytes, int] = {}
+    current_code = type_code(current_command_type)
+    row = len(columns.opcodes)
+
+    # the coordinates are converted to integer micrometers right away, the (rare) ones with more decimals are kept
+    # aside as they are too (see NcpColumns)
+    for command, raw_x, raw_y, raw_i, raw_j, generic_line in map(re.Match.groups, _NUMBERED_LINE.finditer(data)):
+        if generic_line is None:
+            if command is not None:
+                code = codes.get(command)
+                if code is None:
+                    code = codes[command] = type_code(command.decode("ascii"))
+                current_code = code
+            elif raw_x is None and raw_y is None and raw_i is None and raw_j is None:
+                # just the line number, nothing to emit
+                continue
+
+            mask = 0
+            if raw_x is None:
+                x = 0
+            else:
+                value = float(raw_x)
+                x = round(value * 1000)
+                if x / 1000 != value:
+                    extra.setdefault(row, {})["X"] = value
+                mask = 1
+            if raw_y is None:
+                y = 0
+            else:
+                value = float(raw_y)
+                y = round(value * 1000)
+                if y / 1000 != value:
+                    extra.setdefault(row, {})["Y"] = value
+                mask |= 2
+            if raw_i is None:
+                i = 0
+            else:
+                value = float(raw_i)
+                i = round(value * 1000)
+                if i / 1000 != value:
+                    extra.setdefault(row, {})["I"] = value
+                mask |= 4
+            if raw_j is None:
+                j = 0
+            else:
+                value = float(raw_j)
+                j = round(value * 1000)
+                if j / 1000 != value:
+                    extra.setdefault(row, {})["J"] = value
+                mask |= 8
+
+            append_opcode(current_code)
+            append_x(x)
+            append_y(y)
+            append_i(i)
+            append_j(j)
+            append_mask(mask)
+            row += 1
+            continue
+
+        words = generic_line.split()
+
+        is_open = False
+        code = current_code
+        x = y = i = j = 0
+        mask = 0
+
+        # the first word is the line number, skip it
+        for word in words[1:]:
+            first = word[0]
+            if first in (_G, _M):
+                # new command, end the current one first
+                if is_open:
+                    append_opcode(code)
+                    append_x(x)
+                    append_y(y)
+                    append_i(i)
+                    append_j(j)
+                    append_mask(mask)
+                    row += 1
+                    x = y = i = j = 0
+                    mask = 0
+
+                code = codes.get(word)
+                if code is None:
+                    code = codes[word] = type_code(word.decode("ascii"))
+                current_code = code
+                is_open = True
+            else:
+                # argument for an ongoing command, or a continuation of the command type from the previous line
+                is_open = True
+                value = float(word[1:])
+                if first == _X:
+                    x = round(value * 1000)
+                    if x / 1000 != value:
+                        extra.setdefault(row, {})["X"] = value
+                    elif row in extra:
+                        # repeated in the line, the last one counts
+                        extra[row].pop("X", None)
+                    mask |= 1
+                elif first == _Y:
+                    y = round(value * 1000)
+                    if y / 1000 != value:
+                        extra.setdefault(row, {})["Y"] = value
+                    elif row in extra:
+                        # repeated in the line, the last one counts
+                        extra[row].pop("Y", None)
+                    mask |= 2
+                elif first == _I:
+                    i = round(value * 1000)
+                    if i / 1000 != value:
+                        extra.setdefault(row, {})["I"] = value
+                    elif row in extra:
+                        # repeated in the line, the last one counts
+                        extra[row].pop("I", None)
+                    mask |= 4
+                elif first == _J:
+                    j = round(value * 1000)
+                    if j / 1000 != value:
+                        extra.setdefault(row, {})["J"] = value
+                    elif row in extra:
+                        # repeated in the line, the last one counts
+                        extra[row].pop("J", None)
+                    mask |= 8
+                else:
+                    extra.setdefault(row, {})[chr(first)] = value
+
+        if is_open:
+            append_opcode(code)
+            append_x(x)
+            append_y(y)
+            append_i(i)
+            append_j(j)
+            append_mask(mask)
+            row += 1
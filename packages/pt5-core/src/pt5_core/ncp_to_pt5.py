@@ -1,104 +1,257 @@
-from pt5_core.ncp_model import NcpCommandType, NcpFile
-from pt5_core.pt5_model import Pt5Command, Pt5CommandType, Pt5File
+import os
+from collections.abc import Callable, Generator, Iterable
+from typing import IO, overload
 
+from pt5_core.columnar import NcpColumns, Pt5Columns
+from pt5_core.geometry import GEOMETRY_KINDS, ResolvedGeometry
+from pt5_core.ncp_model import ConversionState, NcpCommand, NcpCommandType, NcpFile, NcpRecord, _ncp_records
+from pt5_core.optimizer import fit_arc_records, optimize_records
+from pt5_core.pt5_model import (
+    Pt5Command,
+    Pt5CommandType,
+    Pt5File,
+    Pt5Record,
+    _pt5_command_from_record,
+    _serialize_pt5,
+    _write_pt5,
+)
+from pt5_core.stats import PipelineStats
 
-def _safe_add(a: float, b: float) -> float:
-    return round(a + b, 3)
+# bump whenever the output of the conversion changes, it invalidates the cached conversions
+CONVERTER_VERSION = 1
 
 
-def _millimeters_to_micrometers(x: float) -> int:
-    return round(x * 1000)
+@overload
+def ncp_to_pt5(model: NcpFile) -> Pt5File: ...
 
 
-def ncp_to_pt5(model: NcpFile) -> Pt5File:
-    is_absolute = True
-    last_x = 0
-    last_y = 0
+@overload
+def ncp_to_pt5(model: NcpColumns) -> Pt5Columns: ...
+
+
+def ncp_to_pt5(model: NcpFile | NcpColumns) -> Pt5File | Pt5Columns:
+    if isinstance(model, NcpColumns):
+        return Pt5Columns.from_records(_convert_records(model.records()))
+
+    return Pt5File(commands=list(iter_ncp_to_pt5(model.commands)))
+
+
+def stream_ncp_to_pt5(
+    raw_lines: Iterable[str],
+    optimize: float | None = None,
+    fit_arcs: float | None = None,
+    stats: PipelineStats | None = None,
+) -> Generator[str]:
+    """
+    Convert the NCP lines to PT5 lines end-to-end without materializing either of the programs.
+    Only the modal state is kept, so the memory usage stays flat regardless of the size of the input.
+
+    :param raw_lines: the NCP lines to convert, typically an open file
+    :param optimize: tolerance of merging the collinear moves (see optimize_records), no optimization when None
+    :param fit_arcs: tolerance of replacing the moves with arcs (see fit_arc_records), no arcs are fitted when None
+    :param stats: collects the timing and the counters of the stages of the conversion, if given
+    :return: generator of the serialized PT5 lines
+    """
+    state = ConversionState()
+    if stats is None:
+        records = _convert_records(_ncp_records(NcpFile.iter_parse(raw_lines)), state)
+        return _serialize_pt5(_optimized(records, optimize, fit_arcs, state=state))
+
+    commands = NcpFile.iter_parse(stats.read_lines(raw_lines))
+    ncp_records = stats.timed("parse", _ncp_records(commands), count_commands=True)
+    records = _optimized(stats.timed("convert", _convert_records(ncp_records, state)), optimize, fit_arcs, stats, state)
+    return stats.timed("serialize", _serialize_pt5(records))
+
+
+def write_ncp_as_pt5(
+    model: NcpFile | NcpColumns,
+    target: str | os.PathLike[str] | IO[str] | IO[bytes],
+    progress: Callable[[int], None] | None = None,
+    optimize: float | None = None,
+    fit_arcs: float | None = None,
+    stats: PipelineStats | None = None,
+    geometry: ResolvedGeometry | None = None,
+) -> int:
+    """
+    Convert the NCP program and write the PT5 output straight to a file, without building the PT5 program.
+
+    :param model: the program to convert
+    :param target: path of the file to (over)write, or an open text or binary file object
+    :param progress: called with the number of the lines written so far after each batch of them,
+        it may raise an exception to abort the writing
+    :param optimize: tolerance of merging the collinear moves (see optimize_records), no optimization when None
+    :param fit_arcs: tolerance of replacing the moves with arcs (see fit_arc_records), no arcs are fitted when None
+    :param stats: collects the timing and the counters of the stages of the conversion, if given
+    :param geometry: the resolved geometry of the very same commands (e.g. the one of the preview) to take the
+        positions from, instead of resolving them again
+    :return: number of characters written
+    """
+    state = ConversionState()
+    if stats is None:
+        records = _convert_records(model.records(), state) if geometry is None else _geometry_records(geometry, state)
+        return _write_pt5(_optimized(records, optimize, fit_arcs, state=state), target, progress)
+
+    if geometry is None:
+        records = stats.timed(
+            "convert", _convert_records(stats.timed("records", model.records(), count_commands=True), state)
+        )
+    else:
+        stats.commands.update(record[0] for record in model.records())
+        records = stats.timed("convert", _geometry_records(geometry, state))
+
+    with stats.stage("serialize"):
+        written = _write_pt5(_optimized(records, optimize, fit_arcs, stats, state), target, progress)
+    stats.bytes_written += written
+    return written
+
+
+def _optimized(
+    records: Iterable[Pt5Record],
+    optimize: float | None,
+    fit_arcs: float | None,
+    stats: PipelineStats | None = None,
+    state: ConversionState | None = None,
+) -> Iterable[Pt5Record]:
+    # the arcs are fitted first, so that the curves are not merged into straight moves already,
+    # the state the records are converted with tells the arcs of which mode they are
+    if fit_arcs is not None:
+        records = fit_arc_records(records, fit_arcs, state)
+        if stats is not None:
+            records = stats.timed("fit_arcs", records)
+    if optimize is not None:
+        records = optimize_records(records, optimize)
+        if stats is not None:
+            records = stats.timed("optimize", records)
+    return records
+
+
+def iter_ncp_to_pt5(commands: Iterable[NcpCommand]) -> Generator[Pt5Command]:
+    for record in _convert_records(_ncp_records(commands)):
+        yield _pt5_command_from_record(record)
 
-    commands: list[Pt5Command] = []
 
-    for command in model.commands:
-        if command.type == NcpCommandType.MOVE:
+def _convert_records(records: Iterable[NcpRecord], state: ConversionState | None = None) -> Generator[Pt5Record]:
+    """
+    Convert the records, starting from the given modal state.
+    The mode of the state follows the records as they are converted (see fit_arc_records), the position is updated
+    once all the records are converted, so that the conversion can be resumed later on.
+    """
+    if state is None:
+        state = ConversionState()
+
+    # all the positions are in integer micrometers, so the final position is exactly the sum of the emitted deltas
+    is_absolute = state.is_absolute
+    last_x = state.last_x
+    last_y = state.last_y
+
+    for command_type, x, y, i, j in records:
+        if command_type == NcpCommandType.MOVE:
             if is_absolute:
-                new_x = command.arguments.get("X", last_x)
-                new_y = command.arguments.get("Y", last_y)
+                new_x = last_x if x is None else x
+                new_y = last_y if y is None else y
 
-                delta_x = _safe_add(new_x, -last_x)
-                delta_y = _safe_add(new_y, -last_y)
+                delta_x = new_x - last_x
+                delta_y = new_y - last_y
             else:
-                delta_x = command.arguments.get("X", 0)
-                delta_y = command.arguments.get("Y", 0)
-
-                new_x = _safe_add(last_x, delta_x)
-                new_y = _safe_add(last_y, delta_y)
+                delta_x = x or 0
+                delta_y = y or 0
 
-            arguments: dict[str, int] = {}
-            if delta_x:
-                arguments["X"] = _millimeters_to_micrometers(delta_x)
-            if delta_y:
-                arguments["Y"] = _millimeters_to_micrometers(delta_y)
+                new_x = last_x + delta_x
+                new_y = last_y + delta_y
 
-            commands.append(Pt5Command(type=Pt5CommandType.MOVE, arguments=arguments))
+            yield Pt5CommandType.MOVE, delta_x, delta_y, 0, 0
 
             last_x = new_x
             last_y = new_y
-        elif command.type == NcpCommandType.CLOCKWISE_CIRCLE or command.type == NcpCommandType.COUNTER_CLOCKWISE_CIRCLE:
+        elif command_type == NcpCommandType.CLOCKWISE_CIRCLE or command_type == NcpCommandType.COUNTER_CLOCKWISE_CIRCLE:
             if is_absolute:
-                new_x = command.arguments.get("X", last_x)
-                new_y = command.arguments.get("Y", last_y)
+                new_x = last_x if x is None else x
+                new_y = last_y if y is None else y
 
-                delta_x = _safe_add(new_x, -last_x)
-                delta_y = _safe_add(new_y, -last_y)
+                delta_x = new_x - last_x
+                delta_y = new_y - last_y
 
-                i = command.arguments.get("I", 0)
-                j = command.arguments.get("J", 0)
+                i = i or 0
+                j = j or 0
             else:
-                delta_x = command.arguments.get("X", 0)
-                delta_y = command.arguments.get("Y", 0)
-
-                new_x = _safe_add(last_x, delta_x)
-                new_y = _safe_add(last_y, delta_y)
-
-                delta_i = command.arguments.get("I", 0)
-                delta_j = command.arguments.get("J", 0)
-
-                i = _safe_add(last_x, delta_i)
-                j = _safe_add(last_y, delta_j)
-
-            arguments: dict[str, int] = {}
-            if delta_x:
-                arguments["X"] = _millimeters_to_micrometers(delta_x)
-            if delta_y:
-                arguments["Y"] = _millimeters_to_micrometers(delta_y)
-            if i:
-                arguments["I"] = _millimeters_to_micrometers(i)
-            if j:
-                arguments["J"] = _millimeters_to_micrometers(j)
-
-            commands.append(
-                Pt5Command(
-                    type=Pt5CommandType.CLOCKWISE_CIRCLE
-                    if command.type == NcpCommandType.CLOCKWISE_CIRCLE
-                    else Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
-                    arguments=arguments,
-                )
+                delta_x = x or 0
+                delta_y = y or 0
+
+                new_x = last_x + delta_x
+                new_y = last_y + delta_y
+
+                i = last_x + (i or 0)
+                j = last_y + (j or 0)
+
+            yield (
+                Pt5CommandType.CLOCKWISE_CIRCLE
+                if command_type == NcpCommandType.CLOCKWISE_CIRCLE
+                else Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+                delta_x,
+                delta_y,
+                i,
+                j,
             )
 
             last_x = new_x
             last_y = new_y
 
-        elif command.type == NcpCommandType.STOP:
-            commands.append(Pt5Command(type=Pt5CommandType.STOP))
-        elif command.type == NcpCommandType.END:
-            commands.append(Pt5Command(type=Pt5CommandType.END))
-        elif command.type == NcpCommandType.STOP_AND_REWIND:
-            commands.append(Pt5Command(type=Pt5CommandType.STOP_AND_REWIND))
-        elif command.type == NcpCommandType.SET_INCREMENTAL_MODE:
-            is_absolute = False
-        elif command.type == NcpCommandType.SET_ABSOLUTE_MODE:
-            is_absolute = True
+        elif command_type == NcpCommandType.STOP:
+            yield Pt5CommandType.STOP, 0, 0, 0, 0
+        elif command_type == NcpCommandType.END:
+            yield Pt5CommandType.END, 0, 0, 0, 0
+        elif command_type == NcpCommandType.STOP_AND_REWIND:
+            yield Pt5CommandType.STOP_AND_REWIND, 0, 0, 0, 0
+        elif command_type == NcpCommandType.SET_INCREMENTAL_MODE:
+            is_absolute = state.is_absolute = False
+        elif command_type == NcpCommandType.SET_ABSOLUTE_MODE:
+            is_absolute = state.is_absolute = True
         else:
             # TODO error handling
             pass
 
-    return Pt5File(commands=commands)
+    state.last_x = last_x
+    state.last_y = last_y
+
+
+_PT5_TYPES_BY_GEOMETRY_KIND = (
+    Pt5CommandType.MOVE,
+    Pt5CommandType.CLOCKWISE_CIRCLE,
+    Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+    Pt5CommandType.STOP,
+    Pt5CommandType.END,
+    Pt5CommandType.STOP_AND_REWIND,
+)
+_GEOMETRY_MOVE = GEOMETRY_KINDS.index(NcpCommandType.MOVE)
+_GEOMETRY_COUNTER_CLOCKWISE_CIRCLE = GEOMETRY_KINDS.index(NcpCommandType.COUNTER_CLOCKWISE_CIRCLE)
+
+
+def _geometry_records(geometry: ResolvedGeometry, state: ConversionState | None = None) -> Generator[Pt5Record]:
+    """
+    Produce the same records as _convert_records, but from the already resolved positions.
+    The mode of the state follows the records, the same as in _convert_records.
+    """
+    if state is None:
+        state = ConversionState()
+    pt5_types = _PT5_TYPES_BY_GEOMETRY_KIND
+    last_x = 0
+    last_y = 0
+
+    for kind, is_absolute, x, y, center_x, center_y in zip(
+        geometry.kinds, geometry.absolute, geometry.x, geometry.y, geometry.center_x, geometry.center_y, strict=True
+    ):
+        state.is_absolute = is_absolute
+        if kind == _GEOMETRY_MOVE:
+            yield Pt5CommandType.MOVE, x - last_x, y - last_y, 0, 0
+        elif kind <= _GEOMETRY_COUNTER_CLOCKWISE_CIRCLE:
+            # in the absolute mode, I and J are passed as they are (relative to the start),
+            # in the incremental mode they are turned into the absolute center
+            if is_absolute:
+                yield pt5_types[kind], x - last_x, y - last_y, center_x - last_x, center_y - last_y
+            else:
+                yield pt5_types[kind], x - last_x, y - last_y, center_x, center_y
+        else:
+            yield pt5_types[kind], 0, 0, 0, 0
+
+        last_x = x
+        last_y = y
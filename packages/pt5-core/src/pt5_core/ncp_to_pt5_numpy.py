@@ -0,0 +1,134 @@
+"""
+Vectorized NCP to PT5 conversion using NumPy.
+NumPy is an optional dependency, install pt5-core with the "numpy" extra to use this module.
+
+The positions are resolved for the whole program at once in integer micrometers (as stored in NcpColumns):
+the absolute coordinates act as anchors, the incremental ones are accumulated by cumulative sums from the last anchor
+and the missing coordinates are carried forward.
+"""
+
+import numpy as np
+from pt5_core.columnar import _PT5_COMMAND_TYPE_CODES, NcpColumns, Pt5Columns
+from pt5_core.ncp_model import NcpCommandType, NcpFile
+from pt5_core.pt5_model import Pt5CommandType
+
+_PT5_TYPES_BY_NCP_TYPE = {
+    NcpCommandType.MOVE: Pt5CommandType.MOVE,
+    NcpCommandType.CLOCKWISE_CIRCLE: Pt5CommandType.CLOCKWISE_CIRCLE,
+    NcpCommandType.COUNTER_CLOCKWISE_CIRCLE: Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+    NcpCommandType.STOP: Pt5CommandType.STOP,
+    NcpCommandType.END: Pt5CommandType.END,
+    NcpCommandType.STOP_AND_REWIND: Pt5CommandType.STOP_AND_REWIND,
+}
+
+_MODES_BY_NCP_TYPE = {
+    NcpCommandType.SET_ABSOLUTE_MODE: 1,
+    NcpCommandType.SET_INCREMENTAL_MODE: 0,
+}
+# mode of the rows that do not change it
+_KEEP_MODE = -1
+
+_MOTION_TYPES = (NcpCommandType.MOVE, NcpCommandType.CLOCKWISE_CIRCLE, NcpCommandType.COUNTER_CLOCKWISE_CIRCLE)
+
+
+def ncp_to_pt5_numpy(model: NcpColumns | NcpFile) -> Pt5Columns:
+    """
+    Convert the NCP program to PT5 in batch, producing the same commands as ncp_to_pt5.
+
+    :param model: the program to convert
+    :return: the converted program in the columnar form
+    """
+    columns = model if isinstance(model, NcpColumns) else NcpColumns.from_commands(model.commands)
+    command_types = columns.command_types
+    if not len(columns):
+        return Pt5Columns()
+
+    opcodes = np.frombuffer(columns.opcodes, dtype=np.uint16)
+    mask = np.frombuffer(columns.mask, dtype=np.uint8)
+
+    # lookup tables indexed by the NCP opcode
+    pt5_codes = np.array(
+        [_PT5_COMMAND_TYPE_CODES.get(_PT5_TYPES_BY_NCP_TYPE.get(t), -1) for t in command_types], dtype=np.int16
+    )
+    modes = np.array([_MODES_BY_NCP_TYPE.get(t, _KEEP_MODE) for t in command_types], dtype=np.int8)
+    is_motion_type = np.array([t in _MOTION_TYPES for t in command_types], dtype=bool)
+
+    # resolve G90/G91 for every row: forward fill the last mode change, the program starts in the absolute mode
+    row_modes = modes[opcodes]
+    last_change = np.maximum.accumulate(np.where(row_modes != _KEEP_MODE, np.arange(len(opcodes)), -1))
+    is_absolute = np.where(last_change < 0, True, row_modes[np.maximum(last_change, 0)] == 1)
+
+    # from now on, only the movements are relevant for the positions
+    motion = is_motion_type[opcodes]
+    motion_absolute = is_absolute[motion]
+    motion_mask = mask[motion]
+
+    new_x, last_x = _resolve_axis(_column(columns.x)[motion], (motion_mask & 1) != 0, motion_absolute)
+    new_y, last_y = _resolve_axis(_column(columns.y)[motion], (motion_mask & 2) != 0, motion_absolute)
+
+    # in the absolute mode, I and J are taken as they are, in the incremental mode the last point is added to them
+    i = np.where((motion_mask & 4) != 0, _column(columns.i)[motion], 0)
+    j = np.where((motion_mask & 8) != 0, _column(columns.j)[motion], 0)
+    i = np.where(motion_absolute, i, last_x + i)
+    j = np.where(motion_absolute, j, last_y + j)
+
+    row_pt5_codes = pt5_codes[opcodes]
+    emitted = row_pt5_codes >= 0
+    emitted_motion = motion[emitted]
+    is_circle = (row_pt5_codes[motion] != _PT5_COMMAND_TYPE_CODES[Pt5CommandType.MOVE]).astype(np.int64)
+
+    result_x = _scatter(new_x - last_x, emitted_motion)
+    result_y = _scatter(new_y - last_y, emitted_motion)
+    result_i = _scatter(i * is_circle, emitted_motion)
+    result_j = _scatter(j * is_circle, emitted_motion)
+    result_mask = (
+        (result_x != 0).astype(np.uint8)
+        | ((result_y != 0).astype(np.uint8) << 1)
+        | ((result_i != 0).astype(np.uint8) << 2)
+        | ((result_j != 0).astype(np.uint8) << 3)
+    )
+
+    result = Pt5Columns()
+    result.opcodes.frombytes(row_pt5_codes[emitted].astype(np.uint8).tobytes())
+    result.x.frombytes(result_x.tobytes())
+    result.y.frombytes(result_y.tobytes())
+    result.i.frombytes(result_i.tobytes())
+    result.j.frombytes(result_j.tobytes())
+    result.mask.frombytes(result_mask.tobytes())
+    return result
+
+
+def _column(micrometers) -> np.ndarray:
+    return np.frombuffer(micrometers, dtype=np.int64)
+
+
+def _resolve_axis(values: np.ndarray, is_present: np.ndarray, is_absolute: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Resolve the positions along one axis.
+
+    :param values: the argument values of the movements in micrometers
+    :param is_present: whether the movement has the argument
+    :param is_absolute: whether the movement is in the absolute mode
+    :return: the positions after and before each of the movements
+    """
+    is_anchor = is_absolute & is_present
+    increments = np.where(~is_absolute & is_present, values, 0)
+    accumulated = np.cumsum(increments)
+
+    indexes = np.arange(len(values))
+    last_anchor = np.maximum.accumulate(np.where(is_anchor, indexes, -1))
+    anchor = np.maximum(last_anchor, 0)
+    # position = value of the last absolute anchor + everything accumulated since then
+    new = np.where(last_anchor >= 0, values[anchor] + accumulated - accumulated[anchor], accumulated)
+
+    last = np.empty_like(new)
+    last[:1] = 0
+    last[1:] = new[:-1]
+    return new, last
+
+
+def _scatter(values: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Spread the per-movement values to all the emitted commands, leaving zeros for the stops."""
+    result = np.zeros(len(positions), dtype=np.int64)
+    result[positions] = values
+    return result
@@ -0,0 +1,320 @@
+"""
+Optional optimization of the converted PT5 program, run between the conversion and the serialization.
+The runs of (nearly) collinear moves are merged into single moves and the moves of zero length are dropped,
+so the output has fewer lines for the controller to process. The stops stay exactly where they were.
+The runs of short moves approximating curves can be replaced by arcs as well.
+"""
+
+import math
+from collections.abc import Generator, Iterable
+
+from pt5_core.ncp_model import ConversionState
+from pt5_core.pt5_model import Pt5CommandType, Pt5File, Pt5Record, _pt5_command_from_record, _pt5_records
+
+# default maximum distance of the dropped intermediate points from the merged move, in micrometers
+DEFAULT_TOLERANCE = 1.0
+# default maximum distance between the fitted arc and the moves it replaces, in micrometers,
+# the points of the moves are rounded to micrometers, so they rarely lie on any circle more precisely than this
+DEFAULT_ARC_TOLERANCE = 5.0
+
+# an arc has to replace at least this many moves to be worth it
+_MIN_ARC_MOVES = 3
+# the longest run of moves replaced by a single arc, it bounds the number of the moves held back
+_MAX_ARC_MOVES = 4096
+
+
+def optimize_records(records: Iterable[Pt5Record], tolerance: float = DEFAULT_TOLERANCE) -> Generator[Pt5Record]:
+    """
+    Merge the consecutive collinear moves and drop the moves of zero length.
+    The merged move goes exactly to the end of the run, so all the following positions stay the same.
+
+    :param records: the converted program
+    :param tolerance: maximum distance of the dropped intermediate points from the merged move, in micrometers
+    :return: the optimized program
+    """
+    move = Pt5CommandType.MOVE
+    atan2 = math.atan2
+    asin = math.asin
+    hypot = math.hypot
+    pi = math.pi
+    tau = math.tau
+
+    # the run of the moves merged so far, relative to its start
+    run_x = run_y = 0
+    run_length = 0.0
+    # direction of the first move of the run
+    base_angle = 0.0
+    # the directions (relative to the base one) the end of the run may still move to
+    min_angle = max_angle = 0.0
+    in_run = False
+    # whether there is any movement line the stops can be appended to
+    has_movement = False
+    # whether a null move was dropped before any other movement
+    dropped_null_move = False
+
+    for record in records:
+        command_type, x, y, _, _ = record
+        if command_type == move:
+            if not x and not y:
+                dropped_null_move = True
+                continue
+
+            if in_run:
+                end_x = run_x + x
+                end_y = run_y + y
+                end_length = hypot(end_x, end_y)
+                # the end of the run so far becomes an intermediate point, the merged move must pass close to it
+                if run_length > tolerance:
+                    run_angle = (atan2(run_y, run_x) - base_angle + pi) % tau - pi
+                    spread = asin(tolerance / run_length)
+                    new_min_angle = max(min_angle, run_angle - spread)
+                    new_max_angle = min(max_angle, run_angle + spread)
+                else:
+                    new_min_angle = min_angle
+                    new_max_angle = max_angle
+
+                end_angle = (atan2(end_y, end_x) - base_angle + pi) % tau - pi
+                # the run must keep moving away from its start, so it never turns back over itself
+                if end_length > run_length and new_min_angle <= end_angle <= new_max_angle:
+                    run_x = end_x
+                    run_y = end_y
+                    run_length = end_length
+                    min_angle = new_min_angle
+                    max_angle = new_max_angle
+                    continue
+
+                yield move, run_x, run_y, 0, 0
+
+            run_x = x
+            run_y = y
+            run_length = hypot(x, y)
+            base_angle = atan2(y, x)
+            min_angle = -pi
+            max_angle = pi
+            in_run = True
+            has_movement = True
+            continue
+
+        if in_run:
+            yield move, run_x, run_y, 0, 0
+            in_run = False
+
+        if command_type == Pt5CommandType.CLOCKWISE_CIRCLE or command_type == Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE:
+            has_movement = True
+        elif not has_movement and dropped_null_move:
+            # the stop needs a line to be appended to, so the null move is kept when there is no other movement
+            yield move, 0, 0, 0, 0
+            has_movement = True
+
+        yield record
+
+    if in_run:
+        yield move, run_x, run_y, 0, 0
+
+
+def optimize_pt5(model: Pt5File, tolerance: float = DEFAULT_TOLERANCE) -> Pt5File:
+    """
+    Return an optimized copy of the PT5 program, see optimize_records.
+
+    :param model: the program to optimize
+    :param tolerance: maximum distance of the dropped intermediate points from the merged move, in micrometers
+    :return: the optimized program
+    """
+    return Pt5File(
+        commands=[
+            _pt5_command_from_record(record) for record in optimize_records(_pt5_records(model.commands), tolerance)
+        ]
+    )
+
+
+def fit_arc_records(
+    records: Iterable[Pt5Record], tolerance: float = DEFAULT_ARC_TOLERANCE, state: ConversionState | None = None
+) -> Generator[Pt5Record]:
+    """
+    Replace the runs of moves lying on a circle with single arcs.
+    The arc goes exactly to the end of the run, so all the following positions stay the same. The I and J of the arc
+    follow the converter: relative to its start for the moves of the absolute mode, the absolute center for the moves
+    of the incremental mode.
+
+    :param records: the converted program
+    :param tolerance: maximum distance between the arc and the moves it replaces, in micrometers
+    :param state: the modal state the records are being converted with (see _convert_records), which tells the mode
+        of each of the moves, all of them are taken as the absolute ones when None
+    :return: the program with the arcs fitted
+    """
+    move = Pt5CommandType.MOVE
+    if state is None:
+        state = ConversionState()
+    # absolute position the positions of the moves held back are relative to
+    origin_x = state.last_x
+    origin_y = state.last_y
+    # positions of the moves held back, relative to the origin, all of them converted in the same mode
+    xs = [0]
+    ys = [0]
+    is_absolute = state.is_absolute
+
+    for record in records:
+        command_type, x, y, _, _ = record
+        if command_type == move and (x or y):
+            if state.is_absolute != is_absolute:
+                # the centers of the two modes differ, so no arc spans the switch
+                yield from _fit_arcs(xs, ys, tolerance, len(xs) - 1, origin_x, origin_y, is_absolute)
+                origin_x += xs[-1]
+                origin_y += ys[-1]
+                xs = [0]
+                ys = [0]
+                is_absolute = state.is_absolute
+            xs.append(xs[-1] + x)
+            ys.append(ys[-1] + y)
+            if len(xs) > 2 * _MAX_ARC_MOVES:
+                # fit the beginning of a long run, keeping enough of the moves back for the arcs starting later on
+                fitted = yield from _fit_arcs(
+                    xs, ys, tolerance, len(xs) - 1 - _MAX_ARC_MOVES, origin_x, origin_y, is_absolute
+                )
+                del xs[:fitted]
+                del ys[:fitted]
+            continue
+
+        if len(xs) > 1:
+            yield from _fit_arcs(xs, ys, tolerance, len(xs) - 1, origin_x, origin_y, is_absolute)
+        origin_x += xs[-1] + x
+        origin_y += ys[-1] + y
+        xs = [0]
+        ys = [0]
+        yield record
+
+    if len(xs) > 1:
+        yield from _fit_arcs(xs, ys, tolerance, len(xs) - 1, origin_x, origin_y, is_absolute)
+
+
+def _fit_arcs(
+    xs: list[int], ys: list[int], tolerance: float, limit: int, origin_x: int, origin_y: int, is_absolute: bool
+) -> Generator[Pt5Record, None, int]:
+    """
+    Emit the moves between the given positions, with the arcs fitted, until reaching the limit.
+
+    :return: index of the position the emitted records end at
+    """
+    start = 0
+    while start < limit:
+        arc = _longest_arc(xs, ys, start, tolerance)
+        if arc is None:
+            yield Pt5CommandType.MOVE, xs[start + 1] - xs[start], ys[start + 1] - ys[start], 0, 0
+            start += 1
+            continue
+
+        end, center_x, center_y, clockwise = arc
+        yield (
+            Pt5CommandType.CLOCKWISE_CIRCLE if clockwise else Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+            xs[end] - xs[start],
+            ys[end] - ys[start],
+            center_x - xs[start] if is_absolute else origin_x + center_x,
+            center_y - ys[start] if is_absolute else origin_y + center_y,
+        )
+        start = end
+
+    return start
+
+
+def _longest_arc(xs: list[int], ys: list[int], start: int, tolerance: float) -> tuple[int, int, int, bool] | None:
+    """
+    Find the longest arc starting at the given position.
+    The run is first doubled while it still fits, then the longest fitting one is searched for by bisection.
+
+    :return: index of the end position, the center and whether the arc is clockwise, or None if there is no arc
+    """
+    last = min(start + _MAX_ARC_MOVES, len(xs) - 1)
+    moves = _MIN_ARC_MOVES
+    if start + moves > last:
+        return None
+
+    arc = _fit_arc(xs, ys, start, start + moves, tolerance)
+    if arc is None:
+        return None
+
+    # the longest run known to fit and the shortest one known not to
+    fitting = moves
+    failing = last - start + 1
+    while (moves := min(2 * fitting, last - start)) > fitting:
+        candidate = _fit_arc(xs, ys, start, start + moves, tolerance)
+        if candidate is None:
+            failing = moves
+            break
+        fitting = moves
+        arc = candidate
+
+    while failing - fitting > 1:
+        moves = (fitting + failing) // 2
+        candidate = _fit_arc(xs, ys, start, start + moves, tolerance)
+        if candidate is None:
+            failing = moves
+        else:
+            fitting = moves
+            arc = candidate
+
+    center_x, center_y, clockwise, radius, sweep = arc
+    # a nearly straight run is better left to be merged into a single move
+    if radius * (1 - math.cos(sweep / 2)) <= tolerance:
+        return None
+
+    return start + fitting, center_x, center_y, clockwise
+
+
+def _fit_arc(
+    xs: list[int], ys: list[int], start: int, end: int, tolerance: float
+) -> tuple[int, int, bool, float, float] | None:
+    """
+    Fit an arc through the positions between start and end (inclusive).
+
+    :return: the center (rounded to micrometers), whether the arc is clockwise, its radius and sweep,
+        or None if the positions do not lie on a single arc within the tolerance
+    """
+    # the circle through the first, the middle and the last point, relative to the first one
+    start_x = xs[start]
+    start_y = ys[start]
+    middle = (start + end) // 2
+    middle_x = xs[middle] - start_x
+    middle_y = ys[middle] - start_y
+    end_x = xs[end] - start_x
+    end_y = ys[end] - start_y
+    determinant = 2 * (middle_x * end_y - middle_y * end_x)
+    if determinant == 0:
+        return None
+
+    middle_squared = middle_x * middle_x + middle_y * middle_y
+    end_squared = end_x * end_x + end_y * end_y
+    center_x = round(start_x + (end_y * middle_squared - middle_y * end_squared) / determinant)
+    center_y = round(start_y + (middle_x * end_squared - end_x * middle_squared) / determinant)
+    clockwise = determinant < 0
+
+    hypot = math.hypot
+    atan2 = math.atan2
+    radius = hypot(start_x - center_x, start_y - center_y)
+    sweep = 0.0
+    previous_x = start_x - center_x
+    previous_y = start_y - center_y
+    for x, y in zip(xs[start + 1 : end + 1], ys[start + 1 : end + 1], strict=True):
+        x -= center_x
+        y -= center_y
+        if abs(hypot(x, y) - radius) > tolerance:
+            return None
+
+        # the arc must keep turning the same way
+        angle = atan2(previous_x * y - previous_y * x, previous_x * x + previous_y * y)
+        if (angle >= 0) == clockwise:
+            return None
+        sweep += abs(angle)
+
+        # the move is a chord of the arc, the arc bulges out of it by its sagitta
+        half_chord = hypot(x - previous_x, y - previous_y) / 2
+        if radius - math.sqrt(max(radius * radius - half_chord * half_chord, 0)) > tolerance:
+            return None
+
+        previous_x = x
+        previous_y = y
+
+    # the end of a full circle is the same as its start, it could not be told apart from an empty arc
+    if sweep >= math.tau:
+        return None
+
+    return center_x, center_y, clockwise, radius, sweep
@@ -1,22 +1,16 @@
-from collections.abc import Generator
+import io
+import os
+from collections.abc import Callable, Generator, Iterable
 from dataclasses import dataclass, field
 from enum import StrEnum
+from typing import IO, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from pt5_core.binary import MappedPt5File
 
-def _serialize_argument(name: str, micrometers: int) -> str:
-    """
-    Serialize the given argument.
-    If the value is zero, nothing needs to be emitted.
-    Any non-zero value must have a sign (even positive ones).
-    :param name: the name of the argument
-    :param micrometers: the value of the argument
-    :return: serialized value
-    """
-    if micrometers == 0:
-        return ""
-
-    sign = "+" if micrometers > 0 else "-"
-    return f"{name}{sign}{abs(micrometers)}"
+# serialized lines are written in batches of this size
+_BATCH_LINES = 8192
+_BUFFER_SIZE = 1024 * 1024
 
 
 class Pt5CommandType(StrEnum):
@@ -28,6 +22,34 @@ class Pt5CommandType(StrEnum):
     STOP_AND_REWIND = "M30"
 
 
+# G code of the movements and whether their I and J arguments are serialized
+_MOVEMENTS = {
+    Pt5CommandType.MOVE: ("G01", False),
+    Pt5CommandType.CLOCKWISE_CIRCLE: ("G02", True),
+    Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE: ("G03", True),
+}
+
+# the stop commands do not get their own line, they are appended to the last movement
+_SUFFIXES = {
+    Pt5CommandType.STOP: " M00",
+    Pt5CommandType.END: " M02",
+    Pt5CommandType.STOP_AND_REWIND: " M30",
+}
+
+
+@dataclass
+class SerializerState:
+    """State of the serialization between two lines, it allows serializing a program piece by piece."""
+
+    line_number: int = 1
+    # the last movement line, still waiting for the stops that may follow it
+    last_line: str = ""
+
+
+# flat form of a command used by the serializer: type, X, Y, I and J in micrometers, with zero for the missing arguments
+type Pt5Record = tuple[Pt5CommandType, int, int, int, int]
+
+
 @dataclass
 class Pt5Command:
     type: Pt5CommandType
@@ -39,75 +61,149 @@ class Pt5File:
     commands: list[Pt5Command] = field(default_factory=list)
 
     def serialize(self) -> Generator[str]:
-        return _serialize_pt5(self)
+        return _serialize_pt5(_pt5_records(self.commands))
 
+    @staticmethod
+    def serialize_commands(commands: Iterable[Pt5Command]) -> Generator[str]:
+        """
+        Serialize the commands lazily, without the need to collect them into a Pt5File first.
+        Only the last line is held back, because the stop commands are appended to it.
+        """
+        return _serialize_pt5(_pt5_records(commands))
 
-def _serialize_pt5(model: Pt5File) -> Generator[str]:
-    line_number = 1
-    last_line = ""
+    @staticmethod
+    def load_binary(source: str | os.PathLike[str]) -> "MappedPt5File":
+        """
+        Memory-map the program from a file written by pt5_core.binary.write_binary.
+        The commands are only decoded once they are accessed.
+        """
+        # imported here, the binary module itself depends on this one
+        from pt5_core.binary import MappedPt5File
 
-    for command in model.commands:
-        if command.type == Pt5CommandType.MOVE:
-            if last_line:
-                yield last_line + "\n"
-            last_line = " ".join(
-                filter(
-                    None,
-                    [
-                        f"N{line_number}",
-                        "G01",
-                        _serialize_argument("X", command.arguments.get("X", 0)),
-                        _serialize_argument("Y", command.arguments.get("Y", 0)),
-                        # for some reason there needs to be M91 appended to the very first movement
-                        "M91" if line_number == 1 else None,
-                    ],
-                ),
-            )
-            line_number += 1
-        elif command.type == Pt5CommandType.CLOCKWISE_CIRCLE:
-            if last_line:
-                yield last_line + "\n"
-            last_line = " ".join(
-                filter(
-                    None,
-                    [
-                        f"N{line_number}",
-                        "G02",
-                        _serialize_argument("X", command.arguments.get("X", 0)),
-                        _serialize_argument("Y", command.arguments.get("Y", 0)),
-                        _serialize_argument("I", command.arguments.get("I", 0)),
-                        _serialize_argument("J", command.arguments.get("J", 0)),
-                        # for some reason there needs to be M91 appended to the very first movement
-                        "M91" if line_number == 1 else None,
-                    ],
-                ),
-            )
-            line_number += 1
-        elif command.type == Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE:
+        return MappedPt5File(source)
+
+    def write_to(self, target: str | os.PathLike[str] | IO[str] | IO[bytes]) -> int:
+        """
+        Serialize the program and write it to the given file in large batches.
+        The output is the same as writing the lines of serialize() one by one.
+
+        :param target: path of the file to (over)write, or an open text or binary file object
+        :return: number of characters written
+        """
+        return _write_pt5(_pt5_records(self.commands), target)
+
+
+def _pt5_records(commands: Iterable[Pt5Command]) -> Generator[Pt5Record]:
+    for command in commands:
+        arguments = command.arguments
+        yield command.type, arguments.get("X", 0), arguments.get("Y", 0), arguments.get("I", 0), arguments.get("J", 0)
+
+
+def _pt5_command_from_record(record: Pt5Record) -> Pt5Command:
+    command_type, x, y, i, j = record
+    arguments: dict[str, int] = {}
+    if x:
+        arguments["X"] = x
+    if y:
+        arguments["Y"] = y
+    if i:
+        arguments["I"] = i
+    if j:
+        arguments["J"] = j
+
+    return Pt5Command(type=command_type, arguments=arguments)
+
+
+def _serialize_pt5(records: Iterable[Pt5Record], state: SerializerState | None = None) -> Generator[str]:
+    """
+    Serialize the records to PT5 lines.
+    When a state is given, the serialization continues from it and the last line is not emitted at the end
+    (a stop may still be appended to it), it is left in the state instead together with the next line number.
+    """
+    line_number = 1 if state is None else state.line_number
+    last_line = "" if state is None else state.last_line
+
+    movements = _MOVEMENTS
+    suffixes = _SUFFIXES
+
+    for command_type, x, y, i, j in records:
+        movement = movements.get(command_type)
+        if movement is not None:
             if last_line:
                 yield last_line + "\n"
-            last_line = " ".join(
-                filter(
-                    None,
-                    [
-                        f"N{line_number}",
-                        "G03",
-                        _serialize_argument("X", command.arguments.get("X", 0)),
-                        _serialize_argument("Y", command.arguments.get("Y", 0)),
-                        _serialize_argument("I", command.arguments.get("I", 0)),
-                        _serialize_argument("J", command.arguments.get("J", 0)),
-                        # for some reason there needs to be M91 appended to the very first movement
-                        "M91" if line_number == 1 else None,
-                    ],
-                ),
-            )
+
+            code, has_center = movement
+            # zero arguments are not emitted at all, any non-zero value must have a sign (even positive ones)
+            last_line = f"N{line_number} {code}"
+            if x:
+                last_line += f" X{x:+d}"
+            if y:
+                last_line += f" Y{y:+d}"
+            if has_center:
+                if i:
+                    last_line += f" I{i:+d}"
+                if j:
+                    last_line += f" J{j:+d}"
+            if line_number == 1:
+                # for some reason there needs to be M91 appended to the very first movement
+                last_line += " M91"
             line_number += 1
-        elif command.type == Pt5CommandType.END:
-            last_line += " " + Pt5CommandType.END
-        elif command.type == Pt5CommandType.STOP:
-            last_line += " " + Pt5CommandType.STOP
-        elif command.type == Pt5CommandType.STOP_AND_REWIND:
-            last_line += " " + Pt5CommandType.STOP_AND_REWIND
-
-    if last_line:
+        else:
+            suffix = suffixes.get(command_type)
+            if suffix is not None:
+                last_line += suffix
+
+    if state is not None:
+        state.line_number = line_number
+        state.last_line = last_line
+    elif last_line:
         yield last_line + "\n"
+
+
+def _write_pt5(
+    records: Iterable[Pt5Record],
+    target: str | os.PathLike[str] | IO[str] | IO[bytes],
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Serialize the records and write them in large batches instead of line by line.
+
+    :param records: the records to serialize
+    :param target: path of the file to (over)write, or an open text or binary file object
+    :param progress: called with the number of the lines written so far after each batch of them
+    :return: number of characters written
+    """
+    if isinstance(target, str | os.PathLike):
+        # text mode, so that the line endings are the same as when writing the serialized lines manually
+        with open(target, "w", buffering=_BUFFER_SIZE) as f:
+            return _write_pt5(records, f, progress)
+
+    # the file wrappers (e.g. the temporary files) are not io.TextIOBase, so the mode they were opened with decides
+    if not isinstance(target, io.BufferedIOBase | io.RawIOBase) and "b" not in getattr(target, "mode", ""):
+        write = target.write
+    else:
+
+        def write(chunk: str) -> None:
+            target.write(chunk.encode("ascii"))
+
+    written = 0
+    lines = 0
+    batch: list[str] = []
+    for line in _serialize_pt5(records):
+        batch.append(line)
+        if len(batch) == _BATCH_LINES:
+            chunk = "".join(batch)
+            write(chunk)
+            written += len(chunk)
+            batch.clear()
+            if progress is not None:
+                lines += _BATCH_LINES
+                progress(lines)
+
+    chunk = "".join(batch)
+    write(chunk)
+    written += len(chunk)
+    if progress is not None:
+        progress(lines + len(batch))
+
+    return written
@@ -0,0 +1,222 @@
+"""
+Headless rendering of the toolpath into small raster images, e.g. the thumbnails of the converted programs.
+The program is fitted to the image the same as to the canvas of the GUI (see fit_scaling) and drawn as one-pixel
+wide lines into a plain greyscale framebuffer, without any GUI toolkit or display. The arcs are tessellated and
+the toolpath is simplified to the resolution of the image first, so rendering a large program costs little more
+than resolving its geometry. NumPy is used to draw the lines when it is available.
+The images are written as PNG or PPM using just the standard library.
+"""
+
+import math
+import os
+import struct
+import zlib
+from collections.abc import Sequence
+
+from pt5_core.binary import MappedNcpFile, MappedPt5File
+from pt5_core.columnar import NcpColumns, Pt5Columns
+from pt5_core.geometry import ResolvedGeometry, resolve_pt5_geometry
+from pt5_core.ncp_model import NcpFile
+from pt5_core.pt5_model import Pt5File, _pt5_records
+from pt5_core.spatial_index import Box, simplify_polyline
+
+try:
+    import numpy as np
+    from pt5_core.geometry_numpy import _positions_within
+    from pt5_core.geometry_numpy import trace_toolpath_numpy as trace_toolpath
+except ImportError:
+    np = None
+    from pt5_core.geometry import trace_toolpath
+
+# pixels left free around the toolpath
+DEFAULT_PADDING = 8
+BACKGROUND = 255
+INK = 0
+
+# segments drawn at once by NumPy, so that the pixels of a dense program do not need to fit into memory at once
+_BATCH_SEGMENTS = 65536
+
+type Model = NcpFile | NcpColumns | MappedNcpFile | Pt5File | Pt5Columns | MappedPt5File
+
+
+class Raster:
+    """Greyscale image, one byte per pixel row by row from the top left corner."""
+
+    def __init__(self, width: int, height: int, background: int = BACKGROUND):
+        if width < 1 or height < 1:
+            raise ValueError("the image must be at least one pixel wide and high")
+
+        self.width = width
+        self.height = height
+        self.pixels = bytearray([background]) * (width * height)
+
+    def to_png(self) -> bytes:
+        """Encode the image as an 8-bit greyscale PNG."""
+        width = self.width
+        rows = bytearray()
+        for offset in range(0, len(self.pixels), width):
+            # no filtering of the row
+            rows.append(0)
+            rows += self.pixels[offset : offset + width]
+
+        return b"".join(
+            (
+                b"\x89PNG\r\n\x1a\n",
+                _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, self.height, 8, 0, 0, 0, 0)),
+                _png_chunk(b"IDAT", zlib.compress(rows)),
+                _png_chunk(b"IEND", b""),
+            )
+        )
+
+    def to_ppm(self) -> bytes:
+        """Encode the image as a binary (P6) PPM."""
+        rgb = bytearray(3 * len(self.pixels))
+        rgb[0::3] = rgb[1::3] = rgb[2::3] = self.pixels
+        return b"P6\n%d %d\n255\n" % (self.width, self.height) + rgb
+
+    def save(self, target: str | os.PathLike[str]) -> None:
+        """Write the image to a file, its format is given by the extension (.png or .ppm)."""
+        extension = os.path.splitext(target)[1].lower()
+        if extension == ".png":
+            data = self.to_png()
+        elif extension == ".ppm":
+            data = self.to_ppm()
+        else:
+            raise ValueError(f"{target} is not a .png or .ppm file")
+
+        with open(target, "wb") as f:
+            f.write(data)
+
+
+def fit_scaling(bounds: Box, width: int, height: int, padding: float = DEFAULT_PADDING) -> tuple[float, float, float]:
+    """
+    Return the tuple of scaling_factor, delta_x, delta_y so that the drawing fits the area neatly:
+    (x + delta_x, y + delta_y) is the position relative to the center of the area, in the units of the bounds.
+
+    :param bounds: the bounding box of the drawing
+    :param width: width of the area, in pixels
+    :param height: height of the area, in pixels
+    :param padding: the space left free around the drawing, in pixels
+    """
+    min_x, min_y, max_x, max_y = bounds
+
+    x_length = max_x - min_x
+    y_length = max_y - min_y
+
+    # an empty extent fits at any scaling, an empty drawing has no extent at all and then any scaling works
+    scaling = min(
+        (width - 2 * padding) / x_length if x_length else math.inf,
+        (height - 2 * padding) / y_length if y_length else math.inf,
+    )
+    if scaling == math.inf:
+        scaling = min(width, height) - 2 * padding
+    delta_x = -(max_x + min_x) / 2
+    delta_y = -(max_y + min_y) / 2
+
+    return scaling, delta_x, delta_y
+
+
+def render_preview(
+    model: Model, width: int = 256, height: int | None = None, padding: float = DEFAULT_PADDING
+) -> Raster:
+    """
+    Render the toolpath of the program into an image.
+    The PT5 programs with arcs are refused, see resolve_pt5_geometry.
+
+    :param model: the NCP or PT5 program, prefer the NCP one where it is available
+    :param width: width of the image, in pixels
+    :param height: height of the image, in pixels, the same as the width when not given
+    :param padding: the space left free around the toolpath, in pixels (less in the images too small for it)
+    :return: the image
+    :raises ValueError: if the PT5 program contains an arc
+    """
+    if height is None:
+        height = width
+    padding = min(padding, (min(width, height) - 1) / 2)
+
+    geometry = _model_geometry(model)
+    scaling, delta_x, delta_y = fit_scaling(geometry.bounds, width, height, padding)
+    raster = Raster(width, height)
+
+    # a quarter of a pixel is as exact as it gets, anything closer than half a pixel is not visible anyway
+    toolpath = trace_toolpath(geometry, max(0.25 / scaling, 1.0))
+    points = simplify_polyline(toolpath.points, 0.5 / scaling)
+
+    # mapped the same as on the canvas of the GUI, with the y axis pointing up, pixel (0, 0) covers [0, 1) x [0, 1)
+    offset_x = width / 2 + delta_x * scaling
+    offset_y = height / 2 - delta_y * scaling
+    if np is None:
+        _draw_polyline(raster, points, scaling, offset_x, offset_y)
+    else:
+        _draw_polyline_numpy(raster, points, scaling, offset_x, offset_y)
+    return raster
+
+
+def _model_geometry(model: Model) -> ResolvedGeometry:
+    if isinstance(model, Pt5File):
+        records = _pt5_records(model.commands)
+    elif isinstance(model, Pt5Columns | MappedPt5File):
+        records = model.records()
+    else:
+        return model.geometry
+
+    return resolve_pt5_geometry(records)
+
+
+def _draw_polyline(raster: Raster, points: Sequence[float], scaling: float, offset_x: float, offset_y: float) -> None:
+    pixels = raster.pixels
+    width = raster.width
+    height = raster.height
+    xs = [x * scaling + offset_x for x in points[0::2]]
+    ys = [offset_y - y * scaling for y in points[1::2]]
+
+    last_x = xs[0]
+    last_y = ys[0]
+    for x, y in zip(xs, ys, strict=True):
+        delta_x = x - last_x
+        delta_y = y - last_y
+        # one point per pixel along the longer axis, including both ends
+        steps = math.ceil(max(abs(delta_x), abs(delta_y))) or 1
+        for step in range(steps + 1):
+            fraction = step / steps
+            pixel_x = math.floor(last_x + delta_x * fraction)
+            pixel_y = math.floor(last_y + delta_y * fraction)
+            if 0 <= pixel_x < width and 0 <= pixel_y < height:
+                pixels[pixel_y * width + pixel_x] = INK
+        last_x = x
+        last_y = y
+
+
+def _draw_polyline_numpy(
+    raster: Raster, points: Sequence[float], scaling: float, offset_x: float, offset_y: float
+) -> None:
+    frame = np.frombuffer(raster.pixels, dtype=np.uint8)
+    width = raster.width
+    height = raster.height
+    coordinates = np.frombuffer(points, dtype=np.float64)
+    xs = coordinates[0::2] * scaling + offset_x
+    ys = offset_y - coordinates[1::2] * scaling
+
+    for first in range(0, max(len(xs) - 1, 1), _BATCH_SEGMENTS):
+        # a single point is a segment of zero length
+        x = xs[first : first + _BATCH_SEGMENTS + 1]
+        y = ys[first : first + _BATCH_SEGMENTS + 1]
+        if len(x) == 1:
+            x = np.repeat(x, 2)
+            y = np.repeat(y, 2)
+        delta_x = np.diff(x)
+        delta_y = np.diff(y)
+
+        # one point per pixel along the longer axis, including both ends
+        steps = np.maximum(np.ceil(np.maximum(np.abs(delta_x), np.abs(delta_y))).astype(np.int64), 1)
+        segment = np.repeat(np.arange(len(steps)), steps + 1)
+        fraction = _positions_within(steps + 1) / steps[segment]
+        pixel_x = np.floor(x[:-1][segment] + delta_x[segment] * fraction).astype(np.int64)
+        pixel_y = np.floor(y[:-1][segment] + delta_y[segment] * fraction).astype(np.int64)
+
+        inside = (pixel_x >= 0) & (pixel_x < width) & (pixel_y >= 0) & (pixel_y < height)
+        frame[pixel_y[inside] * width + pixel_x[inside]] = INK
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
@@ -0,0 +1,267 @@
+"""
+Spatial index and levels of detail of a toolpath, so that drawing a view of it costs about the same
+regardless of the size of the whole program.
+The toolpath is simplified into a pyramid of progressively coarser polylines, each of them indexed by a uniform grid:
+a view picks the coarsest level that still looks exact at its zoom and only the segments in the visible cells.
+"""
+
+import math
+from array import array
+from collections.abc import Sequence
+
+from pt5_core.geometry import Toolpath
+
+# the grid has about this many items per cell on average
+_ITEMS_PER_CELL = 16
+# no coarser levels of detail are built once a level has at most this many points
+_MIN_LEVEL_POINTS = 1024
+# the cells of the grids of the segments are at least this many typical segments wide, so that the most of the segments
+# stay within a single cell, however fine the grid would be by the number of the segments alone
+_CELL_SEGMENTS = 4
+# number of the segments sampled to estimate their typical length
+_SAMPLED_SEGMENTS = 1024
+# the tolerance of each level of detail is this many times larger than of the previous one
+_LEVEL_FACTOR = 2
+
+# min_x, min_y, max_x, max_y
+type Box = tuple[float, float, float, float]
+
+
+class GridIndex:
+    """Uniform grid over items with bounding boxes, answering which of them may intersect a given area."""
+
+    def __init__(self, bounds: Box, count: int, min_cell_size: float = 0.0):
+        """
+        :param bounds: the area covered by the grid, the items outside of it end up in the edge cells
+        :param count: the expected number of the items, used to size the grid
+        :param min_cell_size: the cells are at least this wide and high (unless the whole area is smaller)
+        """
+        min_x, min_y, max_x, max_y = bounds
+        side = math.isqrt(count // _ITEMS_PER_CELL)
+        if min_cell_size > 0:
+            side = min(side, int(max(max_x - min_x, max_y - min_y) / min_cell_size))
+        self.side = max(1, side)
+        self.min_x = min_x
+        self.min_y = min_y
+        self.cell_width = (max_x - min_x) / self.side or 1.0
+        self.cell_height = (max_y - min_y) / self.side or 1.0
+        self.cells: list[list[int]] = [[] for _ in range(self.side * self.side)]
+
+    def insert(self, item: int, min_x: float, min_y: float, max_x: float, max_y: float) -> None:
+        first_column, last_column, first_row, last_row = self._cell_range(min_x, min_y, max_x, max_y)
+        cells = self.cells
+        for row in range(first_row * self.side, last_row * self.side + 1, self.side):
+            for column in range(first_column, last_column + 1):
+                cells[row + column].append(item)
+
+    def query(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list[int]:
+        """Return the sorted items whose cells intersect the area, it may include some that do not intersect it."""
+        first_column, last_column, first_row, last_row = self._cell_range(min_x, min_y, max_x, max_y)
+        cells = self.cells
+        items: set[int] = set()
+        for row in range(first_row * self.side, last_row * self.side + 1, self.side):
+            for column in range(first_column, last_column + 1):
+                items.update(cells[row + column])
+        return sorted(items)
+
+    def _cell_range(self, min_x: float, min_y: float, max_x: float, max_y: float) -> tuple[int, int, int, int]:
+        last = self.side - 1
+        return (
+            min(max(int((min_x - self.min_x) // self.cell_width), 0), last),
+            min(max(int((max_x - self.min_x) // self.cell_width), 0), last),
+            min(max(int((min_y - self.min_y) // self.cell_height), 0), last),
+            min(max(int((max_y - self.min_y) // self.cell_height), 0), last),
+        )
+
+
+class _Level:
+    __slots__ = ("tolerance", "points", "bounds", "_grid")
+
+    def __init__(self, tolerance: float, points: array, bounds: Box):
+        self.tolerance = tolerance
+        self.points = points
+        self.bounds = bounds
+        self._grid: GridIndex | None = None
+
+    def index(self) -> GridIndex:
+        # the detailed levels are only indexed once they are zoomed into
+        if self._grid is None:
+            self._grid = self._index_segments()
+        return self._grid
+
+    def _index_segments(self) -> GridIndex:
+        points = self.points
+        segments = len(points) // 2 - 1
+        grid = GridIndex(self.bounds, segments, _typical_segment_length(points) * _CELL_SEGMENTS)
+
+        # all the points are within the bounds, only the ones at the maximum need clamping to the last cell
+        side = grid.side
+        last = side - 1
+        min_x = grid.min_x
+        min_y = grid.min_y
+        cell_width = grid.cell_width
+        cell_height = grid.cell_height
+        columns = [min(int((x - min_x) / cell_width), last) for x in points[0::2]]
+        rows = [min(int((y - min_y) / cell_height), last) for y in points[1::2]]
+
+        cells = grid.cells
+        for segment in range(segments):
+            column = columns[segment]
+            last_column = columns[segment + 1]
+            row = rows[segment]
+            last_row = rows[segment + 1]
+            cells[row * side + column].append(segment)
+            if column == last_column and row == last_row:
+                # the common case of a segment within a single cell
+                continue
+
+            # walk just the cells the segment passes through, a long diagonal one would cover many more with its box:
+            # the positions along the segment (from 0 to 1) of crossing the next column and row boundary
+            start_x = (points[2 * segment] - min_x) / cell_width
+            start_y = (points[2 * segment + 1] - min_y) / cell_height
+            delta_x = (points[2 * segment + 2] - min_x) / cell_width - start_x
+            delta_y = (points[2 * segment + 3] - min_y) / cell_height - start_y
+            column_step = 1 if last_column > column else -1
+            row_step = 1 if last_row > row else -1
+            next_column_at = (column + (column_step > 0) - start_x) / delta_x if delta_x else math.inf
+            next_row_at = (row + (row_step > 0) - start_y) / delta_y if delta_y else math.inf
+            column_every = abs(1 / delta_x) if delta_x else math.inf
+            row_every = abs(1 / delta_y) if delta_y else math.inf
+
+            # exactly one boundary is crossed per step, so the walk always ends in the cell of the end point
+            for _ in range(abs(last_column - column) + abs(last_row - row)):
+                if row == last_row or (column != last_column and next_column_at < next_row_at):
+                    column += column_step
+                    next_column_at += column_every
+                else:
+                    row += row_step
+                    next_row_at += row_every
+                cells[row * side + column].append(segment)
+
+        return grid
+
+
+class ToolpathIndex:
+    """Levels of detail of a toolpath, each with a spatial index of its segments."""
+
+    def __init__(self, toolpath: Toolpath, tolerance: float):
+        """
+        :param toolpath: the toolpath to index
+        :param tolerance: the tolerance the toolpath was traced with, in micrometers
+        """
+        points = toolpath.points
+        self.bounds = (min(points[0::2]), min(points[1::2]), max(points[0::2]), max(points[1::2]))
+
+        self.levels = [_Level(tolerance, points, self.bounds)]
+        simplified = points
+        # simplifying below the typical length of the segments hardly drops any points, so skip right to it
+        step = max(tolerance, _typical_segment_length(points) / _LEVEL_FACTOR)
+        if step <= 0:
+            # without any step the levels would never get simpler, the positions are whole micrometers anyway
+            step = 1.0
+        while len(simplified) // 2 > _MIN_LEVEL_POINTS:
+            # each level is simplified from the previous one, so the errors add up
+            step *= _LEVEL_FACTOR
+            simplified = simplify_polyline(simplified, step)
+            tolerance += step
+            # a level barely simpler than the previous one is not worth keeping
+            if len(simplified) < len(points) * 3 / 4:
+                points = simplified
+                self.levels.append(_Level(tolerance, points, self.bounds))
+
+        self.centers = toolpath.centers
+        self.center_grid = GridIndex(self.bounds, len(self.centers))
+        for index, (x, y) in enumerate(self.centers):
+            self.center_grid.insert(index, x, y, x, y)
+
+    def build(self) -> None:
+        """Build the indexes of all the levels of detail right away instead of on their first use."""
+        for level in self.levels:
+            level.index()
+
+    def polylines(self, viewport: Box, tolerance: float) -> list[Sequence[float]]:
+        """
+        Return the parts of the toolpath which may be visible in the viewport.
+
+        :param viewport: the visible area in world coordinates
+        :param tolerance: how far the drawn path may deviate from the exact one, typically half a pixel
+        :return: polylines of flat x, y coordinates
+        """
+        level = self.levels[0]
+        for coarser in self.levels[1:]:
+            if coarser.tolerance > tolerance:
+                break
+            level = coarser
+
+        points = level.points
+        min_x, min_y, max_x, max_y = self.bounds
+        if viewport[0] <= min_x and viewport[1] <= min_y and max_x <= viewport[2] and max_y <= viewport[3]:
+            # everything is visible, no need for the index at all
+            return [points]
+
+        polylines: list[Sequence[float]] = []
+        segments = level.index().query(*viewport)
+        if not segments:
+            return polylines
+
+        # consecutive segments are joined into a single polyline
+        first = previous = segments[0]
+        for segment in segments[1:]:
+            if segment != previous + 1:
+                polylines.append(points[2 * first : 2 * previous + 4])
+                first = segment
+            previous = segment
+        polylines.append(points[2 * first : 2 * previous + 4])
+        return polylines
+
+    def centers_in(self, viewport: Box) -> list[tuple[int, int]]:
+        """Return the arc centers in the viewport."""
+        min_x, min_y, max_x, max_y = viewport
+        return [
+            center
+            for center in map(self.centers.__getitem__, self.center_grid.query(*viewport))
+            if min_x <= center[0] <= max_x and min_y <= center[1] <= max_y
+        ]
+
+
+def simplify_polyline(points: Sequence[float], tolerance: float) -> array:
+    """
+    Drop the points closer than the tolerance to the last kept one, keeping the first and the last point.
+
+    :param points: flat x, y coordinates
+    :param tolerance: the minimum distance between the kept points
+    :return: flat x, y coordinates of the simplified polyline
+    """
+    simplified = array("d", points[:2])
+    if len(points) <= 4:
+        simplified.extend(points[2:])
+        return simplified
+
+    squared_tolerance = tolerance * tolerance
+    append = simplified.append
+    last_x, last_y = points[0], points[1]
+    for x, y in zip(points[2:-2:2], points[3:-2:2], strict=True):
+        delta_x = x - last_x
+        delta_y = y - last_y
+        if delta_x * delta_x + delta_y * delta_y > squared_tolerance:
+            append(x)
+            append(y)
+            last_x = x
+            last_y = y
+
+    simplified.extend(points[-2:])
+    return simplified
+
+
+def _typical_segment_length(points: Sequence[float]) -> float:
+    """Return the median length of a sample of the segments of the polyline."""
+    segments = len(points) // 2 - 1
+    if segments < 1:
+        return 0.0
+
+    stride = max(segments // _SAMPLED_SEGMENTS, 1)
+    lengths = sorted(
+        math.hypot(points[2 * segment + 2] - points[2 * segment], points[2 * segment + 3] - points[2 * segment + 1])
+        for segment in range(0, segments, stride)
+    )
+    return lengths[len(lengths) // 2]
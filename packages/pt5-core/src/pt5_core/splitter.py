@@ -0,0 +1,176 @@
+"""
+Splitting of PT5 programs too large for the program memory of the controller into several smaller programs.
+Each part is a complete PT5 program, numbered from N1 and with M91 on its first movement, so running the parts
+one after another does the same as running the whole program.
+The parts are cut right after the stops (M00 and alike) wherever possible, the machine waits for the operator there
+anyway. Only a part without any stop within its budget is cut right at the budget.
+The program is split in a single pass, only the lines since the last stop are held in memory.
+"""
+
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from pt5_core.pt5_model import _SUFFIXES
+
+_STOP_WORDS = frozenset(suffix.strip() for suffix in _SUFFIXES.values())
+
+
+@dataclass
+class Pt5Part:
+    path: Path
+    lines: int
+    # size of the file, including the platform line endings
+    bytes: int
+    # whether the part ends with a stop, otherwise it was cut in the middle of a run of movements
+    ends_with_stop: bool
+
+
+def part_path(target: str | os.PathLike[str], number: int) -> Path:
+    """Return the path of the given part (numbered from one), e.g. program.2.pt5 for program.pt5."""
+    target = Path(target)
+    return target.with_name(f"{target.stem}.{number}{target.suffix}")
+
+
+def split_pt5(
+    lines: Iterable[str],
+    target: str | os.PathLike[str],
+    max_lines: int | None = None,
+    max_bytes: int | None = None,
+) -> list[Pt5Part]:
+    """
+    Split the PT5 program into parts fitting the budget, see part_path for the names of their files.
+
+    :param lines: the serialized PT5 lines, e.g. Pt5File.serialize() or an open PT5 file
+    :param target: path of the whole program, the parts are written next to it
+    :param max_lines: maximum number of the lines of a part
+    :param max_bytes: maximum size of a part in bytes
+    :return: the written parts
+    """
+    if max_lines is None and max_bytes is None:
+        raise ValueError("either the number of the lines or the size of the parts must be limited")
+    if max_lines is not None and max_lines < 1:
+        raise ValueError("the parts must have at least one line")
+
+    splitter = _Splitter(Path(target), max_lines, max_bytes)
+    for line in lines:
+        splitter.add(line)
+    splitter.finish()
+    return splitter.parts
+
+
+class _Splitter:
+    def __init__(self, target: Path, max_lines: int | None, max_bytes: int | None):
+        self.target = target
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.parts: list[Pt5Part] = []
+
+        # the lines written to the current part so far
+        self._lines = 0
+        self._bytes = 0
+        self._ends_with_stop = False
+        # the lines since the last stop (as the words of the line without the number), they are only written once
+        # it is clear whether they stay in the current part
+        self._pending: list[tuple[list[str], list[str]]] = []
+        self._pending_bytes = 0
+
+    def add(self, line: str) -> None:
+        movement, stops = _split_words(line)
+        while True:
+            size = _line_size(movement, stops, self._lines + len(self._pending) + 1)
+            if self._fits(size):
+                break
+            if not self._lines and not self._pending:
+                raise ValueError(f"the line {line.strip()!r} alone does not fit into {self.max_bytes} bytes")
+            self._cut()
+
+        self._pending.append((movement, stops))
+        self._pending_bytes += size
+        if stops:
+            # a safe point to cut the program at later on
+            self._flush()
+
+    def finish(self) -> None:
+        self._flush()
+        self._close()
+
+    def _fits(self, size: int) -> bool:
+        if self.max_lines is not None and self._lines + len(self._pending) + 1 > self.max_lines:
+            return False
+        return self.max_bytes is None or self._bytes + self._pending_bytes + size <= self.max_bytes
+
+    def _cut(self) -> None:
+        if not self._lines:
+            # there is no stop in the whole part, so it has to be cut right here
+            self._flush()
+            self._close()
+            return
+
+        # cut after the last stop and carry the lines following it over to the next part
+        pending = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        self._close()
+        for movement, stops in pending:
+            self.add(_join_words(1, movement, stops))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+
+        # the part is appended to at every stop, so no file is left open between the lines
+        first_number = self._lines + 1
+        with open(part_path(self.target, len(self.parts) + 1), "a" if self._lines else "w") as f:
+            f.writelines(
+                _join_words(number, movement, stops)
+                for number, (movement, stops) in enumerate(self._pending, start=first_number)
+            )
+        self._lines += len(self._pending)
+        self._bytes += self._pending_bytes
+        self._ends_with_stop = bool(self._pending[-1][1])
+        self._pending.clear()
+        self._pending_bytes = 0
+
+    def _close(self) -> None:
+        if not self._lines:
+            return
+
+        self.parts.append(
+            Pt5Part(
+                path=part_path(self.target, len(self.parts) + 1),
+                lines=self._lines,
+                bytes=self._bytes,
+                ends_with_stop=self._ends_with_stop,
+            )
+        )
+        self._lines = 0
+        self._bytes = 0
+
+
+def _split_words(line: str) -> tuple[list[str], list[str]]:
+    """Split the PT5 line into the words of the movement and the stops, dropping the number and M91."""
+    words = line.split()
+    if words and words[0].startswith("N"):
+        words.pop(0)
+    movement = [word for word in words if not word.startswith("M")]
+    stops = [word for word in words if word in _STOP_WORDS]
+    if not movement:
+        # the stops are appended to a movement, the same as when the program starts with a stop
+        movement = ["G01"]
+    return movement, stops
+
+
+def _join_words(number: int, movement: list[str], stops: list[str]) -> str:
+    # the same order as written by the serializer, M91 goes before any stops
+    words = [f"N{number}", *movement]
+    if number == 1:
+        words.append("M91")
+    words.extend(stops)
+    return " ".join(words) + "\n"
+
+
+def _line_size(movement: list[str], stops: list[str], number: int) -> int:
+    # the files are written in the text mode, so the newline may take more than a single byte
+    return len(_join_words(number, movement, stops)) - 1 + len(os.linesep)
@@ -0,0 +1,188 @@
+"""
+Opt-in instrumentation of the conversion pipeline.
+A PipelineStats object passed to the pipeline collects the wall and CPU time spent in each of its stages, the numbers
+of the lines read (including the ones skipped or not supported) and of the commands of each type, the number of
+the bytes written and the peak memory usage, so the regressions can be tracked across the releases.
+
+The stages are lazy generators pulling from each other, so the time is attributed to whichever stage is running
+at the moment: the time of a stage does not include the time of the stages it pulls its input from.
+To keep the overhead low, the items are pulled through the stages in batches and the clocks are read once per batch.
+"""
+
+import itertools
+import json
+import mmap
+import re
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# number of the items pulled through a timed stage at once
+_BATCH_SIZE = 4096
+
+# bytes of the program counted at once by count_lines, so that counting a large one takes little memory
+_COUNT_CHUNK_SIZE = 8 * 1024 * 1024
+
+_NUMBERED_LINE = re.compile(rb"^N", re.MULTILINE)
+_COMMENT_LINE = re.compile(rb"^%", re.MULTILINE)
+# nothing but whitespace, the same as the lines read_lines skips
+_BLANK_LINE = re.compile(rb"^[ \t\r\f\v]*$", re.MULTILINE)
+
+
+@dataclass
+class StageStats:
+    wall_seconds: float = 0.0
+    # CPU time of the thread running the stage
+    cpu_seconds: float = 0.0
+    # number of the items (lines, commands or records) the stage produced
+    items: int = 0
+
+
+@dataclass
+class PipelineStats:
+    stages: dict[str, StageStats] = field(default_factory=dict)
+    lines_read: int = 0
+    # comments and blank lines
+    skipped_lines: int = 0
+    # lines which are neither numbered commands nor comments, they are dropped by the parser
+    unsupported_lines: int = 0
+    # number of the commands of each type, including the unsupported ones
+    commands: Counter[str | None] = field(default_factory=Counter)
+    # the PT5 output is ASCII, so these are the characters written (apart from any newline translation)
+    bytes_written: int = 0
+    # peak memory of the process (or of the traced allocations when tracemalloc is tracing), None if not available
+    peak_memory_bytes: int | None = None
+
+    # the stage being timed and when its time was last measured
+    _current: str | None = field(default=None, init=False, repr=False, compare=False)
+    _wall_mark: float = field(default=0.0, init=False, repr=False, compare=False)
+    _cpu_mark: float = field(default=0.0, init=False, repr=False, compare=False)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Attribute the time spent in the block to the given stage."""
+        previous = self._switch(name)
+        try:
+            yield self.stages[name]
+        finally:
+            self._switch(previous)
+
+    def timed[T](self, name: str, items: Iterable[T], count_commands: bool = False) -> Generator[T]:
+        """
+        Attribute the time spent producing the items to the given stage.
+
+        :param name: name of the stage
+        :param items: the output of the stage, typically a generator
+        :param count_commands: whether to count the items as commands, the items must have the command type first
+        :return: the same items
+        """
+        iterator = iter(items)
+        while True:
+            with self.stage(name) as stage:
+                batch = list(itertools.islice(iterator, _BATCH_SIZE))
+            if not batch:
+                return
+
+            stage.items += len(batch)
+            if count_commands:
+                self.commands.update(item[0] for item in batch)
+            yield from batch
+
+    def read_lines(self, raw_lines: Iterable[str]) -> Generator[str]:
+        """Time the reading of the lines as the "read" stage and count them."""
+        for batch in itertools.batched(self.timed("read", raw_lines), _BATCH_SIZE):
+            self.lines_read += len(batch)
+            for line in batch:
+                if line.startswith("%") or not line.strip():
+                    self.skipped_lines += 1
+                elif not line.startswith("N"):
+                    self.unsupported_lines += 1
+            yield from batch
+
+    def count_lines(self, buffer: bytes | mmap.mmap) -> None:
+        """
+        Count the lines of the NCP program read as a whole, the same as read_lines does.
+
+        :param buffer: the program, e.g. its memory-mapped file
+        """
+        size = len(buffer)
+        start = 0
+        while start < size:
+            # the chunks end right after a newline, so that each of them starts with a whole line
+            end = buffer.find(b"\n", min(start + _COUNT_CHUNK_SIZE, size) - 1) + 1 or size
+            chunk = buffer[start:end]
+            start = end
+
+            lines = chunk.count(b"\n") + (not chunk.endswith(b"\n"))
+            numbered = len(_NUMBERED_LINE.findall(chunk))
+            # the regex matches an empty "line" after the final newline as well
+            skipped = len(_COMMENT_LINE.findall(chunk)) + len(_BLANK_LINE.findall(chunk)) - chunk.endswith(b"\n")
+            self.lines_read += lines
+            self.skipped_lines += skipped
+            self.unsupported_lines += lines - numbered - skipped
+
+    def finish(self) -> None:
+        """Record the peak memory usage, call once the pipeline is done."""
+        if tracemalloc.is_tracing():
+            self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+        elif resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # bytes on macOS, kilobytes elsewhere
+            self.peak_memory_bytes = peak if sys.platform == "darwin" else peak * 1024
+
+    def merge(self, other: "PipelineStats") -> None:
+        """Add the stats of another run, e.g. of another file."""
+        for name, other_stage in other.stages.items():
+            stage = self.stages.setdefault(name, StageStats())
+            stage.wall_seconds += other_stage.wall_seconds
+            stage.cpu_seconds += other_stage.cpu_seconds
+            stage.items += other_stage.items
+        self.lines_read += other.lines_read
+        self.skipped_lines += other.skipped_lines
+        self.unsupported_lines += other.unsupported_lines
+        self.commands.update(other.commands)
+        self.bytes_written += other.bytes_written
+        if other.peak_memory_bytes is not None:
+            self.peak_memory_bytes = max(self.peak_memory_bytes or 0, other.peak_memory_bytes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stages": {name: asdict(stage) for name, stage in self.stages.items()},
+            "lines_read": self.lines_read,
+            "skipped_lines": self.skipped_lines,
+            "unsupported_lines": self.unsupported_lines,
+            "commands": {str(command_type): count for command_type, count in sorted(self.commands.items(), key=str)},
+            "bytes_written": self.bytes_written,
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def _switch(self, name: str | None) -> str | None:
+        """Make the given stage the current one, attributing the time since the last switch to the previous one."""
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        if self._current is not None:
+            stage = self.stages[self._current]
+            stage.wall_seconds += wall - self._wall_mark
+            stage.cpu_seconds += cpu - self._cpu_mark
+        if name is not None and name not in self.stages:
+            self.stages[name] = StageStats()
+
+        previous = self._current
+        self._current = name
+        self._wall_mark = wall
+        self._cpu_mark = cpu
+        return previous
@@ -0,0 +1,217 @@
+"""
+Drip-feeding of the PT5 programs to the controller over a serial link, using asyncio.
+The lines are taken from the program lazily (e.g. from Pt5File.serialize()), so programs of any size can be sent.
+The controller throttles the sender either by the software flow control (XOFF pauses the sending, XON resumes it)
+or by acknowledging every line it has taken, in which case a window of unacknowledged lines is kept in flight.
+At M00 the machine waits for the operator, so does the streamer: it pauses once the stop is sent (and acknowledged)
+and continues once resumed.
+
+Any asyncio stream pair works as the link, e.g. the one of serial_asyncio.open_serial_connection, a pty or a socket.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass
+from enum import StrEnum
+
+from pt5_core.pt5_model import _SUFFIXES, Pt5CommandType
+
+XON = 0x11
+XOFF = 0x13
+ACK = 0x06
+NAK = 0x15
+
+DEFAULT_WINDOW = 16
+
+_STOP_WORD = _SUFFIXES[Pt5CommandType.STOP].strip()
+
+
+class FlowControl(StrEnum):
+    XON_XOFF = "xon-xoff"
+    ACK = "ack"
+
+
+@dataclass
+class StreamStats:
+    lines: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    # time spent paused at the stops (and by pause()), not counted in the throughput
+    paused_seconds: float = 0.0
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines / max(self.seconds - self.paused_seconds, 1e-9)
+
+
+class Pt5Streamer:
+    """Sends the lines of a PT5 program to the controller, honoring its flow control."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        flow_control: FlowControl = FlowControl.XON_XOFF,
+        window: int = DEFAULT_WINDOW,
+        pause_at_stops: bool = True,
+        on_stop: Callable[[int], object] | None = None,
+        progress: Callable[[StreamStats], object] | None = None,
+    ):
+        """
+        :param reader: the stream of the bytes from the controller
+        :param writer: the stream of the bytes to the controller
+        :param flow_control: how the controller throttles the sending
+        :param window: number of the lines sent ahead, unacknowledged (or not yet flushed with the XON/XOFF control)
+        :param pause_at_stops: whether to pause after every M00 until resumed
+        :param on_stop: called with the number of the line of the stop (from one) once paused at it
+        :param progress: called with the statistics every window of the lines
+        """
+        if window < 1:
+            raise ValueError("window must be positive")
+
+        self.reader = reader
+        self.writer = writer
+        self.flow_control = flow_control
+        self.window = window
+        self.pause_at_stops = pause_at_stops
+        self.on_stop = on_stop
+        self.progress = progress
+        self.stats = StreamStats()
+
+        # set while the sending is not paused by the operator, cleared by the stops and by pause()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        # set while the controller accepts more data (XON), cleared by XOFF
+        self._accepting = asyncio.Event()
+        self._accepting.set()
+        self._acknowledged = 0
+        self._acknowledgement = asyncio.Condition()
+        self._listener: asyncio.Task[None] | None = None
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def pause(self) -> None:
+        """Stop sending after the line being sent, until resumed."""
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        """Continue sending, e.g. once the operator has dealt with the stop."""
+        self._resumed.set()
+
+    async def stream(self, lines: Iterable[str]) -> StreamStats:
+        """
+        Send the program, returning once all of it is sent and (with the acknowledgements) taken by the controller.
+
+        :param lines: the serialized PT5 lines, including the newlines
+        :return: the statistics of the sending
+        :raises ConnectionError: if the controller rejects a line or closes the connection
+        """
+        stats = self.stats
+        started = time.perf_counter()
+        self._listener = asyncio.create_task(self._listen())
+        try:
+            # let the listener pick up what the controller sent before, e.g. XOFF while it is not ready yet
+            await asyncio.sleep(0)
+            acknowledged = self.flow_control == FlowControl.ACK
+            write = self.writer.write
+            window = self.window
+            in_flight = 0
+
+            for line in lines:
+                if not self._resumed.is_set():
+                    await self._paused()
+                if acknowledged:
+                    if stats.lines - self._acknowledged >= window:
+                        await self._until_acknowledged(stats.lines - window + 1)
+                elif not self._accepting.is_set():
+                    await self._until(self._accepting.wait())
+
+                data = line.encode("ascii")
+                write(data)
+                stats.lines += 1
+                stats.bytes += len(data)
+                in_flight += 1
+
+                if self.pause_at_stops and _STOP_WORD in line.split():
+                    # the machine stops here, so nothing is sent until the operator resumes
+                    await self._flush(acknowledged)
+                    in_flight = 0
+                    self.pause()
+                    if self.on_stop is not None:
+                        self.on_stop(stats.lines)
+                elif in_flight >= window:
+                    await self._until(self.writer.drain())
+                    in_flight = 0
+                    self._report(started)
+
+            await self._flush(acknowledged)
+        finally:
+            if self._listener.done() and not self._listener.cancelled():
+                # the error has been raised already, or it came too late to matter
+                self._listener.exception()
+            self._listener.cancel()
+            stats.seconds = time.perf_counter() - started
+
+        self._report(started)
+        return stats
+
+    async def _paused(self) -> None:
+        paused = time.perf_counter()
+        await self._until(self._resumed.wait())
+        self.stats.paused_seconds += time.perf_counter() - paused
+
+    async def _flush(self, acknowledged: bool) -> None:
+        await self._until(self.writer.drain())
+        if acknowledged:
+            await self._until_acknowledged(self.stats.lines)
+
+    async def _until_acknowledged(self, lines: int) -> None:
+        async def _wait() -> None:
+            async with self._acknowledgement:
+                await self._acknowledgement.wait_for(lambda: self._acknowledged >= lines)
+
+        await self._until(_wait())
+
+    async def _until[T](self, awaitable: Awaitable[T]) -> T:
+        """Wait for the awaitable, unless the connection fails in the meantime."""
+        waiter = asyncio.ensure_future(awaitable)
+        await asyncio.wait((waiter, self._listener), return_when=asyncio.FIRST_COMPLETED)
+        if waiter.done():
+            return waiter.result()
+
+        waiter.cancel()
+        # raises the error of the listener, if any
+        self._listener.result()
+        raise ConnectionError("the controller closed the connection")
+
+    async def _listen(self) -> None:
+        """Follow the flow control bytes sent by the controller."""
+        flow_control = self.flow_control
+        while data := await self.reader.read(256):
+            if flow_control == FlowControl.ACK:
+                rejected = data.find(NAK)
+                if rejected >= 0:
+                    line = self._acknowledged + data.count(ACK, 0, rejected) + 1
+                    raise ConnectionError(f"the controller rejected line {line}")
+
+                count = data.count(ACK)
+                if count:
+                    async with self._acknowledgement:
+                        self._acknowledged += count
+                        self._acknowledgement.notify_all()
+            else:
+                # only the last of the flow control bytes matters
+                last_xon = data.rfind(XON)
+                last_xoff = data.rfind(XOFF)
+                if last_xoff > last_xon:
+                    self._accepting.clear()
+                elif last_xon > last_xoff:
+                    self._accepting.set()
+
+    def _report(self, started: float) -> None:
+        if self.progress is not None:
+            self.stats.seconds = time.perf_counter() - started
+            self.progress(self.stats)
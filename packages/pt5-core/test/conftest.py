@@ -15,3 +15,13 @@ def simple_ncp():
 def switching_modes_ncp():
     with open(os.path.join(__current_dir__, "fixtures/switching_modes.ncp")) as f:
         yield f
+
+
+@pytest.fixture
+def simple_ncp_path():
+    return os.path.join(__current_dir__, "fixtures/simple.ncp")
+
+
+@pytest.fixture
+def switching_modes_ncp_path():
+    return os.path.join(__current_dir__, "fixtures/switching_modes.ncp")
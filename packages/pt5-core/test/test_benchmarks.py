@@ -0,0 +1,57 @@
+import json
+from collections import Counter
+
+import pytest
+from benchmark import main
+from ncp_generator import generate_ncp
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_scanner import scan_ncp
+
+
+def test_generate_ncp_is_seeded():
+    lines = list(generate_ncp(5000, seed=1))
+    assert len(lines) == 5000
+    assert lines == list(generate_ncp(5000, seed=1))
+    assert lines != list(generate_ncp(5000, seed=2))
+    # a longer program starts the same
+    assert list(generate_ncp(6000, seed=1))[:4000] == lines[:4000]
+
+    with pytest.raises(ValueError):
+        generate_ncp(3)
+
+
+def test_generate_ncp_is_realistic():
+    lines = list(generate_ncp(20_000, seed=3))
+    ncp = NcpFile.parse(lines)
+    assert scan_ncp("".join(lines).encode()).to_ncp_file() == ncp
+
+    types = Counter(command.type for command in ncp.commands)
+    assert {"G90", "G91", "G01", "G02", "G03", "M00", "M30"} <= set(types)
+    # mostly short moves, with a stop every few hundred lines
+    assert types["G01"] > len(lines) / 2
+    assert 10 < types["M00"] < len(lines) / 100
+    # the modal continuation lines carry no command of their own
+    assert sum(line.split()[1][0] in "XY" for line in lines if line.startswith("N")) > len(lines) / 2
+
+    # the toolpath stays within the working area
+    min_x, min_y, max_x, max_y = ncp.geometry.bounds
+    assert min_x > -100_000 and min_y > -100_000 and max_x < 500_000 and max_y < 500_000
+
+
+def test_benchmark_fails_on_regression(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    arguments = ["--sizes", "100", "--benchmarks", "parse,convert", "--repeat", "1", "--baseline", str(baseline)]
+    # only the made up regression counts, not the noise of the timing
+    arguments += ["--tolerance", "0.9"]
+    assert main([*arguments, "--update-baseline"]) == 0
+    assert set(json.loads(baseline.read_text())["results"]) == {"parse/100", "convert/100"}
+
+    data = json.loads(baseline.read_text())
+    data["results"]["convert/100"]["lines_per_second"] *= 1000
+    baseline.write_text(json.dumps(data))
+    capsys.readouterr()
+
+    assert main(arguments) == 1
+    errors = capsys.readouterr().err
+    assert "convert/100" in errors
+    assert "parse/100" not in errors
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from pt5_core.binary import write_binary
+from pt5_core.columnar import NcpColumns
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+from pt5_core.pt5_model import Pt5File
+
+
+def test_ncp_binary_round_trip(switching_modes_ncp, tmp_path):
+    ncp = NcpFile.parse(switching_modes_ncp)
+    write_binary(ncp, tmp_path / "program.bin")
+
+    with NcpFile.load_binary(tmp_path / "program.bin") as mapped:
+        assert len(mapped) == len(ncp.commands)
+        assert mapped.to_ncp_file() == ncp
+        assert list(mapped.records()) == list(ncp.records())
+        assert mapped.commands[-1] == ncp.commands[-1]
+        assert mapped.commands[1:3] == ncp.commands[1:3]
+        # the bounds are known without decoding the commands
+        assert mapped.bounds == tuple(round(bound) for bound in ncp.geometry.bounds)
+
+
+@pytest.mark.parametrize("model_type", [NcpFile, NcpColumns])
+def test_ncp_binary_keeps_other_arguments(model_type, tmp_path):
+    lines = ["N1 G01 X1.5 Y-2 F100\n", "N2 X3.00001\n", "N3 M30\n"]
+    write_binary(model_type.parse(lines), tmp_path / "program.bin")
+
+    with NcpFile.load_binary(tmp_path / "program.bin") as mapped:
+        assert mapped.to_ncp_file() == NcpFile.parse(lines)
+
+
+def test_mapped_ncp_converts_the_same(simple_ncp, tmp_path):
+    ncp = NcpFile.parse(simple_ncp)
+    write_binary(ncp, tmp_path / "program.bin")
+
+    with NcpFile.load_binary(tmp_path / "program.bin") as mapped:
+        assert list(ncp_to_pt5(mapped).serialize()) == list(ncp_to_pt5(ncp).serialize())
+
+
+def test_pt5_binary_round_trip(tmp_path):
+    pt5 = ncp_to_pt5(
+        NcpFile.parse(["N1 G91 G01 X1 Y-1\n", "N2 X2 Y1 M00\n", "N3 G90\n", "N4 G01 X-1 Y2\n", "N5 M30\n"])
+    )
+    buffer = io.BytesIO()
+    size = write_binary(pt5, buffer)
+    assert size == len(buffer.getvalue())
+    (tmp_path / "program.bin").write_bytes(buffer.getvalue())
+
+    with Pt5File.load_binary(tmp_path / "program.bin") as mapped:
+        assert mapped.to_pt5_file() == pt5
+        assert list(mapped.serialize()) == list(pt5.serialize())
+        assert mapped.commands[0] == pt5.commands[0]
+        assert mapped.bounds == (-1000, -1000, 3000, 2000)
+
+
+def test_pt5_binary_refuses_arcs(switching_modes_ncp, tmp_path):
+    # the bounds of the arcs depend on the mode of the NCP program, which PT5 does not record
+    (tmp_path / "program.bin").write_bytes(b"previous")
+    with pytest.raises(ValueError, match="arcs"):
+        write_binary(ncp_to_pt5(NcpFile.parse(switching_modes_ncp)), tmp_path / "program.bin")
+    assert (tmp_path / "program.bin").read_bytes() == b"previous"
+
+
+def test_load_binary_checks_the_file(simple_ncp, tmp_path):
+    write_binary(NcpFile.parse(simple_ncp), tmp_path / "program.bin")
+    with pytest.raises(ValueError, match="NCP"):
+        Pt5File.load_binary(tmp_path / "program.bin")
+
+    (tmp_path / "text.bin").write_text("N1 G01 X1 Y1 M91\n" * 10)
+    with pytest.raises(ValueError, match="not a binary"):
+        NcpFile.load_binary(tmp_path / "text.bin")
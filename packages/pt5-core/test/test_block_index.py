@@ -0,0 +1,138 @@
+import pytest
+from pt5_core.block_index import BlockIndex, convert_from_block, stream_from_block
+from pt5_core.cli import main
+from pt5_core.ncp_model import NcpFile, _ncp_records
+from pt5_core.ncp_to_pt5 import _convert_records
+from pt5_core.pt5_model import Pt5CommandType, _serialize_pt5
+
+
+def _program(line_count: int) -> list[str]:
+    lines = ["%1\n", "N1 G91 G01 X1 Y1\n"]
+    for n in range(2, line_count):
+        if n % 7 == 0:
+            lines.append(f"N{n} M00\n")
+        elif n % 5 == 0:
+            lines.append(f"N{n} G02 X1 Y-1 I1\n")
+        elif n % 11 == 0:
+            lines.append(f"N{n} G90 G01 X{n} Y0\n" if n % 2 else f"N{n} G91\n")
+        elif n % 13 == 0:
+            lines.append("% a comment\n")
+        else:
+            lines.append(f"N{n} X0.5 Y-0.25\n")
+    lines.append(f"N{line_count} M30\n")
+    return lines
+
+
+def _expected_tail(lines: list[str], number: int) -> list[str]:
+    """Convert the whole program and serialize just the records of the given block onward."""
+    start = next(index for index, line in enumerate(lines) if line.startswith(f"N{number} "))
+    records = list(_convert_records(_ncp_records(NcpFile.parse(lines).commands)))
+    prefix = list(_convert_records(_ncp_records(NcpFile.parse(lines[:start]).commands)))
+    tail = records[len(prefix) :]
+    if tail[0][0] not in (
+        Pt5CommandType.MOVE,
+        Pt5CommandType.CLOCKWISE_CIRCLE,
+        Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+    ):
+        # the stops need a movement to be appended to
+        tail.insert(0, (Pt5CommandType.MOVE, 0, 0, 0, 0))
+    return list(_serialize_pt5(tail))
+
+
+@pytest.mark.parametrize("number", [1, 2, 15, 16, 17, 100, 255, 300])
+def test_stream_from_block_matches_the_tail(tmp_path, number):
+    lines = _program(300)
+    (tmp_path / "program.ncp").write_text("".join(lines))
+    index = BlockIndex.build(tmp_path / "program.ncp", checkpoint_interval=16)
+
+    assert list(stream_from_block(tmp_path / "program.ncp", number, index)) == _expected_tail(lines, number)
+
+
+def test_stream_from_block_with_windows_line_endings(tmp_path):
+    lines = _program(100)
+    (tmp_path / "program.ncp").write_bytes("".join(lines).replace("\n", "\r\n").encode())
+
+    assert list(stream_from_block(tmp_path / "program.ncp", 53)) == _expected_tail(lines, 53)
+
+
+def test_stream_from_stop(tmp_path):
+    (tmp_path / "program.ncp").write_text("N1 G90 G01 X1 Y1\nN2 M00\nN3 G01 X2\nN4 M30\n")
+    assert list(stream_from_block(tmp_path / "program.ncp", 2)) == ["N1 G01 M91 M00\n", "N2 G01 X+1000 M30\n"]
+
+
+def test_block_index_save_and_load(tmp_path):
+    lines = _program(100)
+    (tmp_path / "program.ncp").write_text("".join(lines))
+    index = BlockIndex.build(tmp_path / "program.ncp", checkpoint_interval=8)
+    assert len(index) == 100 - len([line for line in lines if not line.startswith("N")]) + 1
+    assert 64 in index
+    assert 13 not in index
+    with pytest.raises(ValueError, match="N13"):
+        index.position(13)
+
+    index.save(tmp_path / "program.idx")
+    loaded = BlockIndex.load(tmp_path / "program.idx")
+    assert loaded.numbers == index.numbers
+    assert loaded.offsets == index.offsets
+    assert loaded.checkpoints == index.checkpoints
+    assert loaded.state_at(tmp_path / "program.ncp", 64) == index.state_at(tmp_path / "program.ncp", 64)
+
+    with pytest.raises(ValueError, match="not a block index"):
+        BlockIndex.load(tmp_path / "program.ncp")
+
+    (tmp_path / "program.ncp").write_text("".join(lines[:-1]))
+    with pytest.raises(ValueError, match="changed"):
+        loaded.state_at(tmp_path / "program.ncp", 64)
+
+
+def test_convert_from_block(tmp_path):
+    lines = _program(100)
+    (tmp_path / "program.ncp").write_text("".join(lines))
+
+    written = convert_from_block(tmp_path / "program.ncp", 40, tmp_path / "program.pt5", optimize=1)
+    output = (tmp_path / "program.pt5").read_text()
+    assert written == len(output)
+    assert output == "".join(stream_from_block(tmp_path / "program.ncp", 40, optimize=1))
+    assert output.startswith("N1 G02 X+500 Y-750 I+1000 M91\n")
+    assert output.endswith(f"{Pt5CommandType.STOP_AND_REWIND}\n")
+
+
+def test_cli_from_block(tmp_path):
+    lines = _program(100)
+    (tmp_path / "program.ncp").write_text("".join(lines))
+    arguments = [str(tmp_path / "program.ncp"), "--quiet", "--from-block", "40", "--cache", str(tmp_path / "cache")]
+
+    assert main(arguments) == 0
+    assert (tmp_path / "program.N40.pt5").read_text() == "".join(_expected_tail(lines, 40))
+    assert not (tmp_path / "program.pt5").exists()
+    assert len(list((tmp_path / "cache").glob("*/*.idx"))) == 1
+
+    # another block reuses the cached index
+    assert main([*arguments[:-4], "--from-block", "41", *arguments[-2:]]) == 0
+    assert (tmp_path / "program.N41.pt5").read_text() == "".join(_expected_tail(lines, 41))
+
+    assert main([*arguments[:-4], "--from-block", "13"]) == 1
+
+
+def test_stream_from_block_with_tabs_and_repeated_spaces(tmp_path, monkeypatch):
+    # small chunks, so that the lines are split between them
+    monkeypatch.setattr("pt5_core.block_index._TAIL_CHUNK_SIZE", 100)
+    lines = _program(300)
+    source = tmp_path / "program.ncp"
+    source.write_text("".join(line.replace(" ", "\t  ") for line in lines))
+
+    assert list(stream_from_block(source, 150, BlockIndex.build(source, checkpoint_interval=16))) == _expected_tail(
+        lines, 150
+    )
+
+
+def test_block_position_of_unordered_numbers(tmp_path):
+    source = tmp_path / "program.ncp"
+    source.write_text("N10 G01 X1\nN5 X2\nN10 X3\nN7 M30\n")
+    index = BlockIndex.build(source)
+
+    assert [index.position(number) for number in (10, 5, 7)] == [0, 1, 3]
+    assert 5 in index
+    assert 6 not in index
+    with pytest.raises(ValueError, match="N6"):
+        index.position(6)
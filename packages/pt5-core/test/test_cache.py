@@ -0,0 +1,92 @@
+import io
+import os
+from pathlib import Path
+
+import pytest
+from pt5_core import cache as cache_module
+from pt5_core.cache import ConversionCache, KeyingReader, convert_cached
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import write_ncp_as_pt5
+
+
+def _converter(source):
+    calls = []
+
+    def convert(target):
+        calls.append(target)
+        with open(source) as f:
+            write_ncp_as_pt5(NcpFile.parse(f), target)
+
+    return convert, calls
+
+
+def test_convert_cached_hit(simple_ncp_path, tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    convert, calls = _converter(simple_ncp_path)
+
+    assert not convert_cached(cache, simple_ncp_path, tmp_path / "first.pt5", convert)
+    assert convert_cached(cache, simple_ncp_path, tmp_path / "second.pt5", convert)
+
+    assert len(calls) == 1
+    assert (tmp_path / "first.pt5").read_bytes() == (tmp_path / "second.pt5").read_bytes()
+
+
+def test_key_depends_on_content_version_and_options(simple_ncp_path, switching_modes_ncp_path, tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / "cache")
+    key = cache.key_for(simple_ncp_path)
+
+    assert cache.key_for(simple_ncp_path) == key
+    assert cache.key_for(switching_modes_ncp_path) != key
+    assert cache.key_for(simple_ncp_path, options="optimize") != key
+
+    monkeypatch.setattr(cache_module, "CONVERTER_VERSION", -1)
+    assert cache.key_for(simple_ncp_path) != key
+
+
+def test_lru_eviction(tmp_path):
+    cache = ConversionCache(tmp_path / "cache", max_bytes=250)
+    output = tmp_path / "output.pt5"
+    output.write_bytes(b"x" * 100)
+
+    cache.store("aa", output)
+    cache.store("bb", output)
+    # use the first entry, so that the second one is the least recently used
+    os.utime(cache._entry_path("bb"), (0, 0))
+    assert cache.fetch("aa", tmp_path / "copy.pt5")
+    cache.store("cc", output)
+
+    assert cache.fetch("aa", tmp_path / "copy.pt5")
+    assert not cache.fetch("bb", tmp_path / "copy.pt5")
+    assert cache.fetch("cc", tmp_path / "copy.pt5")
+
+
+def test_fetch_keeps_the_target_on_failure(tmp_path, monkeypatch):
+    cache = ConversionCache(tmp_path / "cache")
+    output = tmp_path / "output.pt5"
+    output.write_bytes(b"new")
+    cache.store("aa", output)
+    target = tmp_path / "target.pt5"
+    target.write_bytes(b"old")
+
+    def copyfile(source, destination):
+        with open(destination, "wb") as f:
+            f.write(b"ne")
+        raise OSError("disk full")
+
+    monkeypatch.setattr("pt5_core.cache.shutil.copyfile", copyfile)
+    with pytest.raises(OSError, match="disk full"):
+        cache.fetch("aa", target)
+
+    assert target.read_bytes() == b"old"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["cache", "output.pt5", "target.pt5"]
+
+
+def test_keying_reader(simple_ncp_path, tmp_path):
+    cache = ConversionCache(tmp_path / "cache")
+    with open(simple_ncp_path, "rb") as raw:
+        reader = KeyingReader(raw, "optimize")
+        with io.TextIOWrapper(io.BufferedReader(reader), encoding="ascii") as f:
+            lines = list(f)
+
+    assert lines == Path(simple_ncp_path).read_text().splitlines(keepends=True)
+    assert reader.key() == cache.key_for(simple_ncp_path, "optimize")
@@ -0,0 +1,81 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pt5_core
+from pt5_core.cli import main
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5, stream_ncp_to_pt5
+from pt5_core.optimizer import DEFAULT_TOLERANCE
+
+
+def test_cli_converts_directory_tree(simple_ncp_path, switching_modes_ncp_path, tmp_path, capsys):
+    source_dir = tmp_path / "in"
+    (source_dir / "nested").mkdir(parents=True)
+    shutil.copy(simple_ncp_path, source_dir / "simple.ncp")
+    shutil.copy(switching_modes_ncp_path, source_dir / "nested" / "switching_modes.ncp")
+    output_dir = tmp_path / "out"
+
+    assert main([str(source_dir), "--output-dir", str(output_dir), "--workers", "2"]) == 0
+
+    for name in ("simple", "nested/switching_modes"):
+        with open(source_dir / f"{name}.ncp") as f:
+            expected = "".join(ncp_to_pt5(NcpFile.parse(f)).serialize())
+        assert (output_dir / f"{name}.pt5").read_text() == expected
+    assert "converted 2 of 2 files" in capsys.readouterr().out
+
+
+def test_cli_glob_next_to_sources(simple_ncp_path, tmp_path):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+    shutil.copy(simple_ncp_path, tmp_path / "b.ncp")
+
+    assert main([str(tmp_path / "*.ncp"), "--workers", "1", "--quiet"]) == 0
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.ncp", "a.pt5", "b.ncp", "b.pt5"]
+
+
+def test_cli_no_inputs(tmp_path):
+    assert main([str(tmp_path / "*.ncp")]) == 1
+
+
+def test_cli_cache(simple_ncp_path, tmp_path, capsys):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+    arguments = [str(tmp_path / "a.ncp"), "--workers", "1", "--cache", str(tmp_path / "cache")]
+
+    assert main(arguments) == 0
+    first = (tmp_path / "a.pt5").read_bytes()
+    (tmp_path / "a.pt5").unlink()
+    capsys.readouterr()
+
+    assert main(arguments) == 0
+    assert "cached" in capsys.readouterr().out
+    assert (tmp_path / "a.pt5").read_bytes() == first
+
+
+def test_cli_optimize(simple_ncp_path, tmp_path):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+    arguments = [str(tmp_path / "a.ncp"), "--workers", "1", "--cache", str(tmp_path / "cache")]
+
+    assert main(arguments) == 0
+    plain = (tmp_path / "a.pt5").read_text()
+
+    # the optimized output is cached separately from the plain one
+    assert main([*arguments, "--optimize"]) == 0
+    with open(simple_ncp_path) as f:
+        expected = "".join(stream_ncp_to_pt5(f, optimize=DEFAULT_TOLERANCE))
+    assert (tmp_path / "a.pt5").read_text() == expected
+    assert len(expected) <= len(plain)
+
+
+def test_cli_does_not_import_numpy():
+    # NumPy takes longer to import than all the rest of the CLI, it is only needed for the previews
+    imported = subprocess.run(
+        [sys.executable, "-c", "import sys, pt5_core.cli; print(' '.join(sys.modules))"],
+        cwd=Path(pt5_core.__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert "pt5_core.cli" in imported
+    assert "numpy" not in imported
@@ -0,0 +1,54 @@
+from pt5_core.columnar import NcpColumns, Pt5Columns
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_scanner import scan_ncp
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+
+
+def test_ncp_columns_roundtrip(switching_modes_ncp):
+    parsed = NcpFile.parse(switching_modes_ncp)
+    columns = NcpColumns.from_commands(parsed.commands)
+
+    assert len(columns) == len(parsed.commands)
+    assert columns == parsed
+    assert columns.to_ncp_file() == parsed
+    assert columns.commands[1].arguments == {"X": -1.0, "Y": 0.0, "F": 1000.0}
+    assert columns.commands[-1].type == "M30"
+
+
+def test_ncp_columns_keep_more_decimals_than_micrometers():
+    lines = [
+        "N1 G90 G01 X1.23456 Y-2.0004 F100.12345\n",
+        "N2 G02 X3 Y0 I0.99951 J0\n",
+        "N3 G01 X1.00001 X2\n",
+        "N4 M30\n",
+    ]
+    parsed = NcpFile.parse(lines)
+    columns = NcpColumns.parse(lines)
+
+    assert columns.commands[1].arguments == {"X": 1.23456, "Y": -2.0004, "F": 100.12345}
+    assert columns.commands[2].arguments == {"X": 3.0, "Y": 0.0, "I": 0.99951, "J": 0.0}
+    assert columns == parsed
+    assert scan_ncp("".join(lines).encode()) == parsed
+    assert list(columns.records()) == list(parsed.records())
+    assert list(ncp_to_pt5(columns).serialize()) == list(ncp_to_pt5(parsed).serialize())
+
+
+def test_ncp_to_pt5_on_columns(switching_modes_ncp):
+    columns = NcpColumns.parse(switching_modes_ncp)
+    switching_modes_ncp.seek(0)
+    expected = ncp_to_pt5(NcpFile.parse(switching_modes_ncp))
+
+    converted = ncp_to_pt5(columns)
+
+    assert isinstance(converted, Pt5Columns)
+    assert converted == expected
+    assert converted.to_pt5_file() == expected
+    assert list(converted.serialize()) == list(expected.serialize())
+
+
+def test_pt5_columns_from_commands_keeps_arguments(simple_ncp):
+    pt5 = ncp_to_pt5(NcpFile.parse(simple_ncp))
+    columns = Pt5Columns.from_commands(pt5.commands)
+
+    assert columns == pt5
+    assert [row.arguments for row in columns.commands] == [command.arguments for command in pt5.commands]
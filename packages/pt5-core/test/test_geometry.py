@@ -0,0 +1,76 @@
+import math
+
+import pytest
+from pt5_core.columnar import NcpColumns
+from pt5_core.geometry import arc_bounds, arc_sweep, tessellate_arc, trace_toolpath
+from pt5_core.ncp_model import NcpFile
+
+
+def _points(flat) -> list[tuple[float, float]]:
+    flat = list(flat)
+    return list(zip(flat[0::2], flat[1::2], strict=True))
+
+
+@pytest.mark.parametrize(
+    ("clockwise", "expected"),
+    [(False, math.pi / 2), (True, 3 * math.pi / 2)],
+)
+def test_arc_sweep_follows_direction(clockwise, expected):
+    assert arc_sweep((1, 0), (0, 1), (0, 0), clockwise) == pytest.approx(expected)
+
+
+def test_arc_sweep_of_closed_arc_is_full_circle():
+    assert arc_sweep((1, 0), (1, 0), (0, 0), clockwise=True) == pytest.approx(math.tau)
+
+
+def test_tessellate_arc_stays_within_tolerance():
+    radius = 10_000
+    points = _points(tessellate_arc((radius, 0), (-radius, 0), (0, 0), clockwise=False, tolerance=5))
+
+    assert points[-1] == (-radius, 0)
+    assert all(math.hypot(x, y) == pytest.approx(radius) for x, y in points)
+    assert all(y >= 0 for _, y in points)
+
+    previous = (radius, 0)
+    for point in points:
+        # the sagitta of each chord is within the tolerance
+        chord = math.dist(previous, point)
+        assert radius - math.sqrt(radius**2 - (chord / 2) ** 2) <= 5
+        previous = point
+
+
+def test_trace_toolpath(switching_modes_ncp):
+    toolpath = trace_toolpath(NcpFile.parse(switching_modes_ncp).geometry)
+    points = _points(toolpath.points)
+
+    assert points[0] == (0, 0)
+    assert points[-1] == (-1000, 0)
+    assert toolpath.centers == [(-1000, -7000), (-6000, 2000)]
+    # the arcs are tessellated, the straight moves are kept as they are
+    assert len(toolpath) > 8
+    assert (-1000, -5000) in points
+
+
+def test_arc_bounds_include_extremes():
+    # the upper half of the unit circle, going counter-clockwise from the right
+    assert arc_bounds((1, 0), (-1, 0), (0, 0), clockwise=False) == pytest.approx((-1, 0, 1, 1))
+    # the same points, but clockwise the arc goes through the lower half
+    assert arc_bounds((1, 0), (-1, 0), (0, 0), clockwise=True) == pytest.approx((-1, -1, 1, 0))
+
+
+def test_geometry_bounds(switching_modes_ncp):
+    geometry = NcpFile.parse(switching_modes_ncp).geometry
+
+    # the end points alone span x from -6 to 0 and y from -5 to 0, the arcs bulge out of that
+    min_x, min_y, max_x, max_y = geometry.bounds
+    assert (min_x, min_y, max_x, max_y) == pytest.approx((-6000, -9000, 1000, 3000))
+
+
+def test_columns_geometry_is_memoized(switching_modes_ncp):
+    columns = NcpColumns.from_commands(NcpFile.parse(switching_modes_ncp).commands)
+    geometry = columns.geometry
+    assert columns.geometry is geometry
+
+    columns.append("G01", {"X": 100})
+    assert columns.geometry is not geometry
+    assert columns.geometry.bounds[2] == 100_000
@@ -0,0 +1,134 @@
+import math
+import random
+
+import pytest
+from pt5_core.geometry import ResolvedGeometry, arc_bounds, arc_sweep, resolve_geometry, tessellate_arc, trace_toolpath
+from pt5_core.ncp_model import NcpFile
+
+np = pytest.importorskip("numpy")
+
+from pt5_core.geometry_numpy import (  # noqa: E402
+    Arcs,
+    arc_bounds_numpy,
+    arc_metrics,
+    tessellate_arcs,
+    trace_toolpath_numpy,
+)
+
+
+def _random_arcs(count: int, seed: int = 7) -> list[tuple[tuple[int, int], tuple[int, int], tuple[int, int], bool]]:
+    rng = random.Random(seed)
+    arcs = []
+    for _ in range(count):
+        center = (rng.randint(-50_000, 50_000), rng.randint(-50_000, 50_000))
+        radius = rng.choice([0, rng.uniform(1, 100), rng.uniform(100, 50_000)])
+        start_angle = rng.uniform(0, math.tau)
+        start = (round(center[0] + radius * math.cos(start_angle)), round(center[1] + radius * math.sin(start_angle)))
+        # some of the arcs are full circles
+        end_angle = start_angle + rng.choice([0, rng.uniform(-math.tau, math.tau)])
+        end = (
+            start
+            if end_angle == start_angle
+            else (
+                round(center[0] + radius * math.cos(end_angle)),
+                round(center[1] + radius * math.sin(end_angle)),
+            )
+        )
+        arcs.append((start, end, center, rng.random() < 0.5))
+    return arcs
+
+
+def _to_arrays(arcs) -> Arcs:
+    return Arcs(
+        start_x=np.array([start[0] for start, _, _, _ in arcs], dtype=float),
+        start_y=np.array([start[1] for start, _, _, _ in arcs], dtype=float),
+        end_x=np.array([end[0] for _, end, _, _ in arcs], dtype=float),
+        end_y=np.array([end[1] for _, end, _, _ in arcs], dtype=float),
+        center_x=np.array([center[0] for _, _, center, _ in arcs], dtype=float),
+        center_y=np.array([center[1] for _, _, center, _ in arcs], dtype=float),
+        clockwise=np.array([clockwise for _, _, _, clockwise in arcs], dtype=bool),
+    )
+
+
+def _random_program(count: int) -> list[str]:
+    rng = random.Random(3)
+    lines = ["N1 G90 G01 X0 Y0\n"]
+    for n in range(2, count):
+        kind = rng.random()
+        if kind < 0.05:
+            lines.append(f"N{n} {rng.choice(['G90', 'G91'])}\n")
+        elif kind < 0.1:
+            lines.append(f"N{n} M00\n")
+        elif kind < 0.6:
+            # the end does not need to lie on the circle exactly, the full circles and zero radii happen as well
+            x = rng.choice(["", f" X{rng.randint(-9999, 9999) / 1000}"])
+            i = rng.choice(["", f" I{rng.randint(-999, 999) / 100}"])
+            lines.append(f"N{n} {rng.choice(['G02', 'G03'])}{x}{i}\n")
+        else:
+            lines.append(f"N{n} G01 X{rng.randint(-9999, 9999) / 1000} Y{rng.randint(-9999, 9999) / 1000}\n")
+    lines.append(f"N{count} M30\n")
+    return lines
+
+
+def test_arc_metrics():
+    arcs = [
+        ((1000, 0), (0, 1000), (0, 0), False),
+        ((1000, 0), (0, 1000), (0, 0), True),
+        ((1000, 0), (1000, 0), (0, 0), True),
+        ((5, 5), (5, 5), (5, 5), False),
+    ]
+    metrics = arc_metrics(_to_arrays(arcs))
+
+    assert metrics.radius.tolist() == [1000, 1000, 1000, 0]
+    assert metrics.sweep.tolist() == pytest.approx([math.pi / 2, 3 * math.pi / 2, math.tau, math.tau])
+    assert metrics.extent.tolist() == pytest.approx([math.pi / 2, -3 * math.pi / 2, -math.tau, math.tau])
+    assert metrics.length.tolist() == pytest.approx([500 * math.pi, 1500 * math.pi, 2000 * math.pi, 0])
+
+
+def test_arc_metrics_match_arc_sweep():
+    arcs = _random_arcs(500)
+    metrics = arc_metrics(_to_arrays(arcs))
+    assert metrics.sweep.tolist() == pytest.approx([arc_sweep(*arc) for arc in arcs])
+
+
+def test_arc_bounds_numpy_match_arc_bounds():
+    arcs = _random_arcs(500)
+    min_x, min_y, max_x, max_y = arc_bounds_numpy(_to_arrays(arcs))
+    expected = [arc_bounds(*arc) for arc in arcs]
+
+    assert np.column_stack((min_x, min_y, max_x, max_y)) == pytest.approx(np.array(expected))
+
+
+def test_tessellate_arcs_matches_tessellate_arc():
+    arcs = _random_arcs(500)
+    points, counts = tessellate_arcs(_to_arrays(arcs), tolerance=5)
+
+    expected = [list(tessellate_arc(*arc, tolerance=5)) for arc in arcs]
+    assert counts.tolist() == [len(flat) // 2 for flat in expected]
+    assert points.ravel() == pytest.approx([value for flat in expected for value in flat])
+
+
+@pytest.mark.parametrize("tolerance", [1, 10])
+def test_trace_toolpath_numpy_matches_trace_toolpath(tolerance):
+    geometry = NcpFile.parse(_random_program(2000)).geometry
+    expected = trace_toolpath(geometry, tolerance)
+    toolpath = trace_toolpath_numpy(geometry, tolerance)
+
+    assert toolpath.points.tolist() == pytest.approx(expected.points.tolist())
+    assert toolpath.centers == expected.centers
+
+
+def test_trace_toolpath_numpy_from_start(switching_modes_ncp):
+    records = list(NcpFile.parse(switching_modes_ncp).records())
+    geometry = resolve_geometry(records[3:])
+
+    expected = trace_toolpath(geometry, start=(1000, -2000))
+    assert trace_toolpath_numpy(geometry, start=(1000, -2000)).points.tolist() == pytest.approx(
+        expected.points.tolist()
+    )
+
+
+def test_trace_toolpath_numpy_empty():
+    toolpath = trace_toolpath_numpy(ResolvedGeometry())
+    assert toolpath.points.tolist() == [0, 0]
+    assert toolpath.centers == []
@@ -0,0 +1,66 @@
+import pytest
+from pt5_core.incremental import IncrementalConversion
+from pt5_core.ncp_to_pt5 import stream_ncp_to_pt5
+
+
+def _program(line_count: int) -> list[str]:
+    lines = ["%1\n", "N1 G91 G01 X1 Y1\n"]
+    for n in range(2, line_count):
+        if n % 7 == 0:
+            lines.append(f"N{n} M00\n")
+        elif n % 5 == 0:
+            lines.append(f"N{n} G02 X1 Y-1 I1\n")
+        elif n % 11 == 0:
+            lines.append(f"N{n} G90 G01 X{n} Y0\n" if n % 2 else f"N{n} G91\n")
+        else:
+            lines.append(f"N{n} X0.5 Y-0.25\n")
+    lines.append(f"N{line_count} M30\n")
+    return lines
+
+
+def test_incremental_conversion_matches_full_conversion(switching_modes_ncp):
+    lines = list(switching_modes_ncp)
+    conversion = IncrementalConversion(checkpoint_interval=2)
+    conversion.update(lines)
+
+    assert conversion.output == list(stream_ncp_to_pt5(lines))
+
+
+@pytest.mark.parametrize("changed_line", [0, 1, 250, 698, 699, 700])
+def test_incremental_conversion_after_edit(changed_line):
+    lines = _program(700)
+    conversion = IncrementalConversion(checkpoint_interval=64)
+    conversion.update(lines)
+
+    edited = list(lines)
+    if changed_line < len(edited):
+        edited[changed_line] = f"N{changed_line} G03 X-2 Y3 J1 M00\n"
+    else:
+        edited.append("N701 G01 X5\n")
+    checkpoint = conversion.update(edited)
+
+    assert checkpoint.line_offset <= changed_line
+    assert changed_line - checkpoint.line_offset < 64
+    assert conversion.output == list(stream_ncp_to_pt5(edited))
+
+
+def test_incremental_conversion_after_removing_lines():
+    lines = _program(300)
+    conversion = IncrementalConversion(checkpoint_interval=16)
+    conversion.update(lines)
+
+    edited = lines[:100] + lines[150:]
+    conversion.update(edited)
+    assert conversion.output == list(stream_ncp_to_pt5(edited))
+
+    conversion.update(lines)
+    assert conversion.output == list(stream_ncp_to_pt5(lines))
+
+
+def test_incremental_conversion_keeps_pending_stops():
+    conversion = IncrementalConversion(checkpoint_interval=1)
+    conversion.update(["N1 G01 X1\n", "N2 G01 Y1\n"])
+    checkpoint = conversion.update(["N1 G01 X1\n", "N2 G01 Y1\n", "N3 M00\n", "N4 M30\n"])
+
+    assert checkpoint.line_offset == 2
+    assert conversion.output == ["N1 G01 X+1000 M91\n", "N2 G01 Y+1000 M00 M30\n"]
@@ -0,0 +1,47 @@
+import itertools
+
+from pt5_core.geometry import trace_toolpath
+from pt5_core.loading import NcpLoader
+from pt5_core.ncp_model import NcpFile
+
+
+def test_loader_matches_parse(switching_modes_ncp):
+    lines = list(switching_modes_ncp)
+    loader = NcpLoader(lines, block_lines=2)
+
+    blocks = list(loader.blocks())
+    assert [block.lines for block in blocks] == [2, 4, 6, 8, 9]
+    assert blocks[-1].characters == sum(map(len, lines))
+
+    ncp = loader.result()
+    expected = NcpFile.parse(lines)
+    assert ncp == expected
+
+    geometry = loader.geometry
+    expected_geometry = expected.geometry
+    assert list(geometry.x) == list(expected_geometry.x)
+    assert list(geometry.y) == list(expected_geometry.y)
+    assert list(geometry.center_x) == list(expected_geometry.center_x)
+    assert geometry.bounds == expected_geometry.bounds
+
+
+def test_loader_blocks_join_up(switching_modes_ncp):
+    lines = list(switching_modes_ncp)
+    loader = NcpLoader(lines, block_lines=3)
+
+    # the partial toolpaths of the blocks form the whole toolpath
+    points = [0.0, 0.0]
+    for block in loader.blocks():
+        partial = trace_toolpath(block.geometry, start=block.start).points
+        assert list(partial[:2]) == points[-2:]
+        points.extend(partial[2:])
+
+    assert points == list(trace_toolpath(NcpFile.parse(lines).geometry).points)
+
+
+def test_loader_result_after_partial_load(switching_modes_ncp):
+    lines = list(switching_modes_ncp)
+    loader = NcpLoader(lines, block_lines=2)
+    list(itertools.islice(loader.blocks(), 2))
+
+    assert loader.result() == NcpFile.parse(lines)
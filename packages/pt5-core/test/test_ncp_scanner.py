@@ -0,0 +1,40 @@
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_scanner import scan_ncp, scan_ncp_file, scan_ncp_file_parallel
+
+
+def test_scan_ncp_file_1(simple_ncp, simple_ncp_path):
+    scanned = scan_ncp_file(simple_ncp_path)
+    assert scanned == NcpFile.parse(simple_ncp)
+
+
+def test_scan_ncp_file_2(switching_modes_ncp, switching_modes_ncp_path):
+    scanned = scan_ncp_file(switching_modes_ncp_path)
+    assert scanned == NcpFile.parse(switching_modes_ncp)
+
+
+def test_scan_ncp_whitespace():
+    scanned = scan_ncp(b"%1\r\nN001\tG91  G01 X1\t Y2\r\nN002   X3\r\nN003\r\nN004 M30 \r\n*\r\n")
+    expected = NcpFile.parse(["%1\n", "N001 G91 G01 X1 Y2\n", "N002 X3\n", "N003\n", "N004 M30\n", "*\n"])
+    assert scanned == expected
+
+
+def test_scan_ncp_empty_file(tmp_path):
+    path = tmp_path / "empty.ncp"
+    path.write_bytes(b"")
+    assert len(scan_ncp_file(path)) == 0
+
+
+def test_scan_ncp_file_parallel(switching_modes_ncp, switching_modes_ncp_path):
+    scanned = scan_ncp_file_parallel(switching_modes_ncp_path, workers=2, chunk_size=16)
+    assert scanned == NcpFile.parse(switching_modes_ncp)
+
+
+def test_scan_ncp_file_parallel_carries_command_type(tmp_path):
+    lines = ["%1\n", "N1 G91\n", "N2 G01 X1\n", *(f"N{n} X1 Y{n}\n" for n in range(3, 200)), "N200 M30\n"]
+    path = tmp_path / "continuation.ncp"
+    path.write_text("".join(lines))
+
+    scanned = scan_ncp_file_parallel(path, workers=2, chunk_size=64)
+
+    assert scanned == NcpFile.parse(lines)
+    assert scanned.commands[100].type == "G01"
@@ -1,5 +1,11 @@
-from pt5_core.ncp_model import NcpFile
-from pt5_core.ncp_to_pt5 import ncp_to_pt5
+import io
+import itertools
+import random
+
+from pt5_core.columnar import NcpColumns
+from pt5_core.ncp_model import NcpCommand, NcpFile
+from pt5_core.ncp_to_pt5 import iter_ncp_to_pt5, ncp_to_pt5, stream_ncp_to_pt5, write_ncp_as_pt5
+from pt5_core.pt5_model import Pt5File
 
 
 def test_ncp_to_pt5_1(simple_ncp, snapshot):
@@ -12,3 +18,71 @@ def test_ncp_to_pt5_2(switching_modes_ncp, snapshot):
     ncp = NcpFile.parse(switching_modes_ncp)
     pt5 = ncp_to_pt5(ncp)
     assert pt5 == snapshot
+
+
+def test_stream_ncp_to_pt5_matches_full_conversion(switching_modes_ncp):
+    expected = list(ncp_to_pt5(NcpFile.parse(switching_modes_ncp)).serialize())
+    switching_modes_ncp.seek(0)
+    assert list(stream_ncp_to_pt5(switching_modes_ncp)) == expected
+
+
+def test_stream_ncp_to_pt5_is_lazy():
+    def endless_lines():
+        yield "N001 G91 G01 X1 Y1\n"
+        for line_number in itertools.count(2):
+            yield f"N{line_number} X1\n"
+
+    lines = itertools.islice(stream_ncp_to_pt5(endless_lines()), 3)
+    assert list(lines) == ["N1 G01 X+1000 Y+1000 M91\n", "N2 G01 X+1000\n", "N3 G01 X+1000\n"]
+
+
+def test_ncp_to_pt5_tracks_exact_micrometers():
+    lines = ["N1 G91 G01 X0.1 Y-0.007\n", *(f"N{n} X0.1 Y-0.007\n" for n in range(2, 10001)), "N10001 G90 G01 X0 Y0\n"]
+    pt5 = ncp_to_pt5(NcpFile.parse(lines))
+
+    assert sum(command.arguments.get("X", 0) for command in pt5.commands) == 0
+    assert sum(command.arguments.get("Y", 0) for command in pt5.commands) == 0
+    assert pt5.commands[-1].arguments == {"X": -1_000_000, "Y": 70_000}
+
+
+def test_ncp_to_pt5_from_geometry_matches_streaming_conversion():
+    rng = random.Random(12)
+    lines = []
+    for n in range(1, 2001):
+        words = [f"N{n}"]
+        words.extend(rng.choice([[], ["G90"], ["G91"]]))
+        command = rng.choice(["G01", "G02", "G03", "M00", ""])
+        if command:
+            words.append(command)
+        if command != "M00":
+            words.extend(f"{name}{rng.uniform(-50, 50):.3f}" for name in "XYIJ" if rng.random() < 0.6)
+        lines.append(" ".join(words) + "\n")
+
+    ncp = NcpFile.parse(lines)
+    expected = list(iter_ncp_to_pt5(ncp.commands))
+    assert ncp_to_pt5(ncp).commands == expected
+    assert ncp_to_pt5(NcpColumns.from_commands(ncp.commands)).to_pt5_file().commands == expected
+
+    # the same when the positions are taken from the resolved geometry
+    output = io.StringIO()
+    write_ncp_as_pt5(ncp, output, geometry=ncp.geometry)
+    assert output.getvalue() == "".join(stream_ncp_to_pt5(lines))
+
+
+def test_ncp_to_pt5_after_changing_the_commands(simple_ncp):
+    ncp = NcpFile.parse(simple_ncp)
+    ncp_to_pt5(ncp)
+    geometry = ncp.geometry
+
+    ncp.commands.append(NcpCommand(type="G01", arguments={"X": 10.0}))
+    ncp.commands[1].arguments["X"] = 5.0
+    expected = list(iter_ncp_to_pt5(ncp.commands))
+    assert ncp_to_pt5(ncp).commands == expected
+    output = io.StringIO()
+    write_ncp_as_pt5(ncp, output)
+    assert output.getvalue() == "".join(Pt5File(commands=expected).serialize())
+
+    # the geometry follows the commands, changed in place or replaced
+    assert ncp.geometry.bounds == NcpFile(commands=list(ncp.commands)).geometry.bounds != geometry.bounds
+    ncp.commands = ncp.commands[:2]
+    assert ncp.geometry.bounds == NcpFile(commands=ncp.commands[:2]).geometry.bounds
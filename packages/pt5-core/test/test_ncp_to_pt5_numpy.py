@@ -0,0 +1,47 @@
+import random
+
+import pytest
+from pt5_core.columnar import NcpColumns
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+
+pytest.importorskip("numpy")
+
+from pt5_core.ncp_to_pt5_numpy import ncp_to_pt5_numpy  # noqa: E402
+
+
+def test_ncp_to_pt5_numpy_1(simple_ncp):
+    ncp = NcpFile.parse(simple_ncp)
+    assert ncp_to_pt5_numpy(ncp) == ncp_to_pt5(ncp)
+
+
+def test_ncp_to_pt5_numpy_2(switching_modes_ncp):
+    ncp = NcpColumns.parse(switching_modes_ncp)
+    assert ncp_to_pt5_numpy(ncp) == ncp_to_pt5(ncp)
+
+
+def test_ncp_to_pt5_numpy_mixed_modes():
+    rng = random.Random(42)
+    lines = ["N1 G01 X0 Y0\n"]
+    for n in range(2, 2000):
+        kind = rng.random()
+        if kind < 0.05:
+            lines.append(f"N{n} {rng.choice(['G90', 'G91'])}\n")
+        elif kind < 0.1:
+            lines.append(f"N{n} M00\n")
+        elif kind < 0.3:
+            lines.append(
+                f"N{n} {rng.choice(['G02', 'G03'])} X{rng.randint(-9999, 9999) / 1000} I{rng.randint(-999, 999) / 100}\n"
+            )
+        elif kind < 0.5:
+            lines.append(f"N{n} Y{rng.randint(-9999, 9999) / 1000}\n")
+        else:
+            lines.append(f"N{n} G01 X{rng.randint(-9999, 9999) / 1000} Y{rng.randint(-9999, 9999) / 1000}\n")
+    lines.append(f"N{len(lines) + 1} M30\n")
+
+    ncp = NcpFile.parse(lines)
+    assert ncp_to_pt5_numpy(ncp) == ncp_to_pt5(ncp)
+
+
+def test_ncp_to_pt5_numpy_empty():
+    assert len(ncp_to_pt5_numpy(NcpFile())) == 0
@@ -0,0 +1,242 @@
+import math
+import random
+
+from pt5_core.geometry import resolve_geometry
+from pt5_core.ncp_model import ConversionState, NcpCommandType, NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5, stream_ncp_to_pt5
+from pt5_core.optimizer import fit_arc_records, optimize_pt5, optimize_records
+from pt5_core.pt5_model import Pt5CommandType
+
+MOVE = Pt5CommandType.MOVE
+
+
+def _positions(records):
+    x = y = 0
+    positions = []
+    for command_type, delta_x, delta_y, _, _ in records:
+        x += delta_x
+        y += delta_y
+        positions.append((command_type, x, y))
+    return positions
+
+
+def test_optimize_records_merges_collinear_moves():
+    records = [(MOVE, 1000, 0, 0, 0)] * 5 + [(MOVE, 0, 1000, 0, 0)] * 3
+    assert list(optimize_records(records)) == [(MOVE, 5000, 0, 0, 0), (MOVE, 0, 3000, 0, 0)]
+
+
+def test_optimize_records_respects_tolerance():
+    # the middle point is 2 micrometers off the line between the other two
+    records = [(MOVE, 1000, 2, 0, 0), (MOVE, 1000, -2, 0, 0)]
+    assert list(optimize_records(records, tolerance=1)) == records
+    assert list(optimize_records(records, tolerance=3)) == [(MOVE, 2000, 0, 0, 0)]
+
+
+def test_optimize_records_does_not_merge_reversals():
+    records = [(MOVE, 1000, 0, 0, 0), (MOVE, -500, 0, 0, 0)]
+    assert list(optimize_records(records)) == records
+
+
+def test_optimize_records_drops_null_moves_and_keeps_stops():
+    records = [
+        (MOVE, 0, 0, 0, 0),
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (MOVE, 0, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (Pt5CommandType.CLOCKWISE_CIRCLE, 0, 0, 500, 0),
+        (MOVE, 0, 0, 0, 0),
+        (Pt5CommandType.STOP_AND_REWIND, 0, 0, 0, 0),
+    ]
+    assert list(optimize_records(records)) == [
+        # the very first stop still needs a line to be appended to
+        (MOVE, 0, 0, 0, 0),
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        (MOVE, 2000, 0, 0, 0),
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (Pt5CommandType.CLOCKWISE_CIRCLE, 0, 0, 500, 0),
+        (Pt5CommandType.STOP_AND_REWIND, 0, 0, 0, 0),
+    ]
+
+
+def test_optimize_records_keeps_positions_within_tolerance():
+    rng = random.Random(5)
+    records = []
+    for _ in range(5000):
+        if rng.random() < 0.05:
+            records.append((rng.choice([Pt5CommandType.STOP, Pt5CommandType.CLOCKWISE_CIRCLE]), 0, 0, 100, 0))
+        else:
+            # mostly straight runs with a little noise and a few null moves
+            records.append((MOVE, rng.choice([0, 100, 100, 100]), rng.randint(-1, 1), 0, 0))
+
+    optimized = list(optimize_records(records, tolerance=2))
+    assert len(optimized) < len(records) / 4
+
+    original = _positions(records)
+    merged = _positions(optimized)
+    # the stops and arcs happen at exactly the same positions and the program ends at the same place
+    assert [p for p in original if p[0] != MOVE] == [p for p in merged if p[0] != MOVE]
+    assert original[-1][1:] == merged[-1][1:]
+
+    # every dropped point lies close to the merged move replacing it
+    start = (0, 0)
+    remaining = iter(original)
+    for command_type, x, y in merged:
+        for original_type, original_x, original_y in remaining:
+            if (original_type, original_x, original_y) == (command_type, x, y):
+                break
+            if command_type == MOVE:
+                length = math.hypot(x - start[0], y - start[1])
+                cross = (x - start[0]) * (original_y - start[1]) - (y - start[1]) * (original_x - start[0])
+                assert abs(cross) / length <= 2 + 1e-9
+        start = (x, y)
+
+
+def _arc_moves(center, radius, start_angle, end_angle, segments):
+    points = [
+        (
+            round(center[0] + radius * math.cos(start_angle + (end_angle - start_angle) * n / segments)),
+            round(center[1] + radius * math.sin(start_angle + (end_angle - start_angle) * n / segments)),
+        )
+        for n in range(segments + 1)
+    ]
+    return points[0], [(MOVE, b[0] - a[0], b[1] - a[1], 0, 0) for a, b in zip(points, points[1:])]
+
+
+def test_fit_arc_records_replaces_curves():
+    _, counter_clockwise = _arc_moves((0, 0), 10_000, 0, math.pi / 2, 100)
+    assert list(fit_arc_records(counter_clockwise)) == [
+        (Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE, -10_000, 10_000, -10_000, 0)
+    ]
+
+    _, clockwise = _arc_moves((0, 0), 10_000, math.pi, math.pi / 2, 100)
+    assert list(fit_arc_records(clockwise)) == [(Pt5CommandType.CLOCKWISE_CIRCLE, 10_000, 10_000, 10_000, 0)]
+
+
+def test_fit_arc_records_keeps_straight_moves_and_stops():
+    _, curve = _arc_moves((0, 0), 10_000, 0, math.pi / 2, 100)
+    records = [
+        (MOVE, 1000, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (MOVE, 1000, 0, 0, 0),
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        *curve[:50],
+        (Pt5CommandType.STOP, 0, 0, 0, 0),
+        *curve[50:],
+    ]
+    fitted = list(fit_arc_records(records))
+
+    assert fitted[:4] == records[:4]
+    assert [record[0] for record in fitted[4:]] == [
+        Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+        Pt5CommandType.STOP,
+        Pt5CommandType.COUNTER_CLOCKWISE_CIRCLE,
+    ]
+    assert [p for p in _positions(fitted) if p[0] == Pt5CommandType.STOP] == [
+        p for p in _positions(records) if p[0] == Pt5CommandType.STOP
+    ]
+
+
+def test_fit_arc_records_stays_within_tolerance():
+    rng = random.Random(9)
+    records = []
+    for _ in range(200):
+        center = (rng.randint(-50_000, 50_000), rng.randint(-50_000, 50_000))
+        start_angle = rng.uniform(0, math.tau)
+        sweep = rng.choice([-1, 1]) * rng.uniform(0.1, 4)
+        radius = rng.uniform(1000, 50_000)
+        # tessellated finely, the same as the CAM exports do
+        segments = math.ceil(abs(sweep) / (2 * math.acos(1 - 2 / radius)))
+        _, moves = _arc_moves(center, radius, start_angle, start_angle + sweep, segments)
+        records.extend(moves)
+        records.append((MOVE, rng.randint(-5000, 5000), rng.randint(-5000, 5000), 0, 0))
+
+    fitted = list(fit_arc_records(records, tolerance=5))
+    assert len(fitted) < len(records) / 4
+
+    original = _positions(records)
+    assert original[-1][1:] == _positions(fitted)[-1][1:]
+
+    # every replaced point lies on the circle of the arc replacing it
+    x = y = 0
+    remaining = iter(original)
+    for command_type, delta_x, delta_y, i, j in fitted:
+        center = (x + i, y + j)
+        radius = math.hypot(i, j)
+        x += delta_x
+        y += delta_y
+        for _, original_x, original_y in remaining:
+            if command_type != MOVE:
+                assert abs(math.hypot(original_x - center[0], original_y - center[1]) - radius) <= 5
+            if (original_x, original_y) == (x, y):
+                break
+
+
+def test_optimize_pt5(simple_ncp):
+    pt5 = ncp_to_pt5(NcpFile.parse(simple_ncp))
+    optimized = optimize_pt5(pt5)
+
+    assert [command.type for command in optimized.commands if command.type != MOVE] == [
+        command.type for command in pt5.commands if command.type != MOVE
+    ]
+    assert len(optimized.commands) <= len(pt5.commands)
+
+
+def test_stream_ncp_to_pt5_with_fitted_arcs():
+    lines = ["N1 G90 G01 X10 Y0\n"]
+    lines.extend(
+        f"N{n} X{10 * math.cos(n / 100 * math.pi / 2):.3f} Y{10 * math.sin(n / 100 * math.pi / 2):.3f}\n"
+        for n in range(1, 101)
+    )
+    lines.append("N101 X0 Y0 M30\n")
+    assert list(stream_ncp_to_pt5(lines, optimize=1, fit_arcs=5)) == [
+        "N1 G01 X+10000 M91\n",
+        "N2 G03 X-10000 Y+10000 I-10000\n",
+        "N3 G01 Y-10000 M30\n",
+    ]
+
+
+def test_stream_ncp_to_pt5_fits_arcs_of_incremental_mode():
+    # quarters of circles around (0, 0) and (10, 10)
+    points = [(10 * math.cos(n / 100 * math.pi / 2), 10 * math.sin(n / 100 * math.pi / 2)) for n in range(101)]
+    points.extend(
+        (10 - 10 * math.sin(n / 100 * math.pi / 2), 10 - 10 * math.cos(n / 100 * math.pi / 2)) for n in range(101)
+    )
+    lines = ["N1 G91 G01 X10 Y0\n"]
+    lines.extend(
+        f"N{n} X{round(b[0] - a[0], 3)} Y{round(b[1] - a[1], 3)}\n"
+        for n, (a, b) in enumerate(zip(points, points[1:]), 2)
+    )
+    lines.append(f"N{len(points) + 1} M30\n")
+    ncp = NcpFile.parse(lines)
+    pt5 = [line.split() for line in stream_ncp_to_pt5(lines, fit_arcs=5)]
+    assert [words[1] for words in pt5].count("G03") == 1
+    assert [words[1] for words in pt5].count("G02") == 1
+
+    # the centers of the arcs of the incremental mode are converted to the absolute ones
+    records = []
+    x = y = 0
+    for words in pt5:
+        arguments = {word[0]: int(word[1:]) for word in words[2:] if word[0] in "XYIJ"}
+        delta_x = arguments.get("X", 0)
+        delta_y = arguments.get("Y", 0)
+        i = arguments.get("I", 0) - x if words[1] != "G01" else None
+        j = arguments.get("J", 0) - y if words[1] != "G01" else None
+        records.append((NcpCommandType(words[1]), delta_x, delta_y, i, j))
+        x += delta_x
+        y += delta_y
+    fitted = resolve_geometry(records, ConversionState(is_absolute=False))
+
+    assert (fitted.x[-1], fitted.y[-1]) == (ncp.geometry.x[-1], ncp.geometry.y[-1])
+    assert all(abs(a - b) <= 5 for a, b in zip(fitted.bounds, ncp.geometry.bounds, strict=True))
+
+
+def test_stream_ncp_to_pt5_optimized():
+    lines = ["N1 G91 G01 X1 Y1\n", "N2 X1 Y1\n", "N3 X0.0001\n", "N4 X1 Y1 M00\n", "N5 G01 X1\n", "N6 X1 M30\n"]
+    assert list(stream_ncp_to_pt5(lines, optimize=1)) == [
+        "N1 G01 X+3000 Y+3000 M91 M00\n",
+        "N2 G01 X+2000 M30\n",
+    ]
@@ -0,0 +1,62 @@
+import io
+import tempfile
+from pathlib import Path
+
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+from pt5_core.pt5_model import Pt5Command, Pt5CommandType, Pt5File
+
+
+def test_serialize_1(simple_ncp, snapshot):
+    pt5 = ncp_to_pt5(NcpFile.parse(simple_ncp))
+    assert "".join(pt5.serialize()) == snapshot
+
+
+def test_serialize_2(switching_modes_ncp, snapshot):
+    pt5 = ncp_to_pt5(NcpFile.parse(switching_modes_ncp))
+    assert "".join(pt5.serialize()) == snapshot
+
+
+def test_write_to_matches_serialize(switching_modes_ncp, tmp_path):
+    pt5 = ncp_to_pt5(NcpFile.parse(switching_modes_ncp))
+    expected = "".join(pt5.serialize())
+
+    path = tmp_path / "out.pt5"
+    assert pt5.write_to(path) == len(expected)
+    assert path.read_text() == expected
+
+    binary = io.BytesIO()
+    pt5.write_to(binary)
+    assert binary.getvalue() == expected.encode("ascii")
+
+    text = io.StringIO()
+    pt5.write_to(text)
+    assert text.getvalue() == expected
+
+    with tempfile.NamedTemporaryFile("w", dir=tmp_path, delete=False) as f:
+        pt5.write_to(f)
+    assert Path(f.name).read_text() == expected
+
+    with tempfile.NamedTemporaryFile(dir=tmp_path, delete=False) as f:
+        pt5.write_to(f)
+    assert Path(f.name).read_bytes() == expected.encode("ascii")
+
+
+def test_serialize_stops_and_signs():
+    pt5 = Pt5File(
+        commands=[
+            Pt5Command(type=Pt5CommandType.STOP),
+            Pt5Command(type=Pt5CommandType.MOVE, arguments={"X": 1, "Y": -2}),
+            Pt5Command(type=Pt5CommandType.STOP),
+            Pt5Command(type=Pt5CommandType.CLOCKWISE_CIRCLE, arguments={"I": 5}),
+            Pt5Command(type=Pt5CommandType.MOVE),
+            Pt5Command(type=Pt5CommandType.END),
+        ]
+    )
+
+    assert list(pt5.serialize()) == [
+        " M00\n",
+        "N1 G01 X+1 Y-2 M91 M00\n",
+        "N2 G02 I+5\n",
+        "N3 G01 M02\n",
+    ]
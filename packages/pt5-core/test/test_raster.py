@@ -0,0 +1,117 @@
+import shutil
+import struct
+import zlib
+
+import pytest
+from pt5_core import raster
+from pt5_core.cli import main
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_scanner import scan_ncp_file
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+from pt5_core.raster import BACKGROUND, INK, Raster, fit_scaling, render_preview
+
+
+def _ink(image: Raster) -> set[tuple[int, int]]:
+    return {divmod(index, image.width)[::-1] for index, value in enumerate(image.pixels) if value == INK}
+
+
+def _decode_png(data: bytes) -> tuple[int, int, bytes]:
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = {}
+    offset = 8
+    while offset < len(data):
+        (length,) = struct.unpack_from(">I", data, offset)
+        kind = data[offset + 4 : offset + 8]
+        chunk = data[offset + 8 : offset + 8 + length]
+        assert struct.unpack_from(">I", data, offset + 8 + length)[0] == zlib.crc32(kind + chunk)
+        chunks[kind] = chunk
+        offset += 12 + length
+
+    width, height, depth, color_type = struct.unpack_from(">IIBB", chunks[b"IHDR"])
+    assert (depth, color_type) == (8, 0)
+    rows = zlib.decompress(chunks[b"IDAT"])
+    # every row starts with its filter type, none is used
+    assert rows[:: width + 1] == bytes(height)
+    return width, height, b"".join(rows[row + 1 : row + 1 + width] for row in range(0, len(rows), width + 1))
+
+
+def test_fit_scaling_matches_square_canvas():
+    # the same as the canvas of the GUI, 800 pixels with the padding of 40
+    assert fit_scaling((-1000, 0, 3000, 2000), 800, 800, 40) == (720 / 4000, -1000, -1000)
+    assert fit_scaling((0, 0, 0, 0), 800, 800, 40) == (720, 0, 0)
+    assert fit_scaling((0, -500, 0, 500), 200, 100, 10) == (80 / 1000, 0, 0)
+
+
+def test_render_line():
+    ncp = NcpFile.parse(["N1 G90 G01 X0 Y0\n", "N2 X10 Y0\n", "N3 M30\n"])
+    image = render_preview(ncp, 21, 11, padding=0.5)
+
+    assert _ink(image) == {(x, 5) for x in range(21)}
+
+
+@pytest.mark.parametrize("size", [16, 100, 257])
+def test_render_without_numpy_is_the_same(simple_ncp_path, monkeypatch, size):
+    pytest.importorskip("numpy")
+    ncp = scan_ncp_file(simple_ncp_path)
+    expected = render_preview(ncp, size)
+
+    monkeypatch.setattr(raster, "np", None)
+    assert render_preview(ncp, size).pixels == expected.pixels
+
+
+def test_render_pt5_is_the_same_as_ncp():
+    ncp = NcpFile.parse(["N1 G91 G01 X1 Y0\n", "N2 X2 Y1\n", "N3 G90 X0 Y3 M00\n", "N4 X0 Y0 M30\n"])
+
+    image = render_preview(ncp, 64)
+    assert _ink(image)
+    assert render_preview(ncp_to_pt5(ncp), 64).pixels == image.pixels
+
+
+def test_render_pt5_refuses_arcs():
+    # the arcs of the incremental mode are converted with the absolute centers, which PT5 does not tell apart from
+    # the relative ones of the absolute mode
+    ncp = NcpFile.parse(["N1 G91 G01 X10 Y0\n", "N2 G03 X10 Y0 I5 J0\n", "N3 M30\n"])
+    assert _ink(render_preview(ncp, 64))
+
+    with pytest.raises(ValueError, match="arcs"):
+        render_preview(ncp_to_pt5(ncp), 64)
+
+
+def test_render_empty_program():
+    image = render_preview(NcpFile(), 8)
+    assert _ink(image) == {(4, 4)}
+
+
+def test_png(simple_ncp_path, tmp_path):
+    image = render_preview(scan_ncp_file(simple_ncp_path), 40, 30)
+    image.save(tmp_path / "preview.png")
+
+    assert _decode_png((tmp_path / "preview.png").read_bytes()) == (40, 30, bytes(image.pixels))
+
+
+def test_ppm(simple_ncp_path, tmp_path):
+    image = render_preview(scan_ncp_file(simple_ncp_path), 40, 30)
+    image.save(tmp_path / "preview.ppm")
+
+    data = (tmp_path / "preview.ppm").read_bytes()
+    assert data.startswith(b"P6\n40 30\n255\n")
+    rgb = data[len(b"P6\n40 30\n255\n") :]
+    assert rgb[0::3] == rgb[1::3] == rgb[2::3] == bytes(image.pixels)
+
+
+def test_invalid_image(tmp_path):
+    with pytest.raises(ValueError):
+        Raster(0, 10)
+    with pytest.raises(ValueError, match="is not a .png or .ppm file"):
+        Raster(1, 1).save(tmp_path / "preview.jpg")
+
+
+def test_cli_preview(simple_ncp_path, tmp_path):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+
+    assert main([str(tmp_path / "a.ncp"), "--workers", "1", "--preview", "32"]) == 0
+
+    width, height, pixels = _decode_png((tmp_path / "a.png").read_bytes())
+    assert (width, height) == (32, 32)
+    assert pixels == bytes(render_preview(scan_ncp_file(simple_ncp_path), 32).pixels)
+    assert set(pixels) == {BACKGROUND, INK}
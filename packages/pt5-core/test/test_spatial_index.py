@@ -0,0 +1,131 @@
+import math
+import random
+from array import array
+from collections import Counter
+
+from pt5_core.geometry import Toolpath
+from pt5_core.spatial_index import GridIndex, ToolpathIndex, simplify_polyline
+
+
+def _random_walk(point_count: int) -> Toolpath:
+    rng = random.Random(7)
+    points = array("d", [0.0, 0.0])
+    x = y = 0.0
+    for _ in range(point_count - 1):
+        x += rng.uniform(-10, 10)
+        y += rng.uniform(-10, 10)
+        points.extend((x, y))
+    return Toolpath(points=points, centers=[(0, 0), (50, 50), (-1000, 1000)])
+
+
+def test_grid_index_query_finds_intersecting_items():
+    grid = GridIndex((0, 0, 100, 100), count=1000)
+    boxes = {}
+    rng = random.Random(3)
+    for item in range(1000):
+        x = rng.uniform(0, 95)
+        y = rng.uniform(0, 95)
+        boxes[item] = (x, y, x + 5, y + 5)
+        grid.insert(item, *boxes[item])
+
+    found = grid.query(20, 30, 40, 50)
+    expected = [
+        item
+        for item, (min_x, min_y, max_x, max_y) in boxes.items()
+        if min_x <= 40 and max_x >= 20 and min_y <= 50 and max_y >= 30
+    ]
+    assert set(expected) <= set(found)
+    assert len(found) < 1000
+
+
+def test_simplify_polyline_keeps_shape():
+    points = array("d")
+    for n in range(1001):
+        angle = n / 1000 * math.pi
+        points.extend((1000 * math.cos(angle), 1000 * math.sin(angle)))
+
+    simplified = simplify_polyline(points, 50)
+    assert len(simplified) < len(points) / 10
+    assert simplified[:2] == points[:2]
+    assert simplified[-2:] == points[-2:]
+
+
+def test_toolpath_index_polylines_cover_viewport():
+    toolpath = _random_walk(20_000)
+    index = ToolpathIndex(toolpath, tolerance=1)
+    viewport = (-100, -100, 100, 100)
+
+    polylines = index.polylines(viewport, tolerance=1)
+    drawn = {(polyline[n], polyline[n + 1]) for polyline in polylines for n in range(0, len(polyline), 2)}
+    points = toolpath.points
+    visible = {
+        (points[n], points[n + 1])
+        for n in range(0, len(points), 2)
+        if -100 <= points[n] <= 100 and -100 <= points[n + 1] <= 100
+    }
+    assert visible <= drawn
+    assert len(drawn) < len(toolpath)
+
+
+def test_toolpath_index_uses_coarser_levels_when_zoomed_out():
+    toolpath = _random_walk(20_000)
+    index = ToolpathIndex(toolpath, tolerance=1)
+    assert len(index.levels) > 1
+
+    fine = sum(len(polyline) for polyline in index.polylines(index.bounds, tolerance=1))
+    coarse = sum(len(polyline) for polyline in index.polylines(index.bounds, tolerance=100))
+    assert coarse < fine / 4
+
+
+def test_toolpath_index_centers_in():
+    index = ToolpathIndex(_random_walk(10), tolerance=1)
+    assert index.centers_in((-10, -10, 60, 60)) == [(0, 0), (50, 50)]
+
+
+def test_toolpath_index_long_segments_only_in_crossed_cells():
+    # a random walk of short moves, then long diagonal ones back and forth through the whole area
+    toolpath = _random_walk(20_000)
+    points = toolpath.points
+    min_x, min_y, max_x, max_y = min(points[0::2]), min(points[1::2]), max(points[0::2]), max(points[1::2])
+    rng = random.Random(5)
+    for _ in range(50):
+        points.extend((rng.uniform(min_x, max_x), min_y, rng.uniform(min_x, max_x), max_y))
+    index = ToolpathIndex(toolpath, tolerance=1)
+    grid = index.levels[0].index()
+    assert grid.side > 10
+
+    # a segment crosses at most one cell per column and per row, not all the cells of its bounding box
+    cells_of_segments = Counter(segment for cell in grid.cells for segment in cell)
+    assert max(cells_of_segments.values()) < 2 * grid.side
+
+    # a small viewport anywhere still finds every long segment crossing it
+    crossing = 0
+    for viewport in ((min_x, min_y, min_x + 50, min_y + 50), (-20, -20, 20, 20), (max_x - 30, 0, max_x, 30)):
+        polylines = index.polylines(viewport, tolerance=1)
+        drawn = {(polyline[n], polyline[n + 1]) for polyline in polylines for n in range(0, len(polyline) - 2, 2)}
+        for segment in range(len(points) // 2 - 101, len(points) // 2 - 1):
+            start = (points[2 * segment], points[2 * segment + 1])
+            end = (points[2 * segment + 2], points[2 * segment + 3])
+            if _crosses(start, end, viewport):
+                crossing += 1
+                assert start in drawn
+    assert crossing
+
+
+def _crosses(start: tuple[float, float], end: tuple[float, float], viewport: tuple[float, ...]) -> bool:
+    min_x, min_y, max_x, max_y = viewport
+    return any(
+        min_x <= start[0] + (end[0] - start[0]) * t / 200 <= max_x
+        and min_y <= start[1] + (end[1] - start[1]) * t / 200 <= max_y
+        for t in range(201)
+    )
+
+
+def test_toolpath_index_of_repeated_points():
+    # most of the segments have no length, so neither has the typical one, the levels of detail still get built
+    points = array("d")
+    for n in range(5000):
+        points.extend((n, n) * 3)
+    index = ToolpathIndex(Toolpath(points=points, centers=[]), tolerance=0)
+    assert len(index.levels) > 1
+    assert index.polylines((0, 0, 10, 10), tolerance=1)
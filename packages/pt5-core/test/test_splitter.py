@@ -0,0 +1,114 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from pt5_core.cli import main
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+from pt5_core.splitter import part_path, split_pt5
+
+PROGRAM = [
+    "N1 G01 X+1000 M91\n",
+    "N2 G01 Y+1000\n",
+    "N3 G01 X-1000 M00\n",
+    "N4 G02 X+1000 Y+1000 I+1000\n",
+    "N5 G01 Y-1000\n",
+    "N6 G01 X+500\n",
+    "N7 G01 Y+500 M00\n",
+    "N8 G01 X+1 M30\n",
+]
+
+
+def _without_numbers(lines: list[str]) -> list[str]:
+    return [line.split(" ", 1)[1].replace(" M91", "") for line in lines]
+
+
+def _read_parts(parts) -> list[list[str]]:
+    return [part.path.read_text().splitlines(keepends=True) for part in parts]
+
+
+def test_split_at_stops(tmp_path):
+    parts = split_pt5(PROGRAM, tmp_path / "program.pt5", max_lines=5)
+
+    assert _read_parts(parts) == [
+        ["N1 G01 X+1000 M91\n", "N2 G01 Y+1000\n", "N3 G01 X-1000 M00\n"],
+        [
+            "N1 G02 X+1000 Y+1000 I+1000 M91\n",
+            "N2 G01 Y-1000\n",
+            "N3 G01 X+500\n",
+            "N4 G01 Y+500 M00\n",
+            "N5 G01 X+1 M30\n",
+        ],
+    ]
+    assert [part.path.name for part in parts] == ["program.1.pt5", "program.2.pt5"]
+    assert [(part.lines, part.ends_with_stop) for part in parts] == [(3, True), (5, True)]
+
+
+def test_split_without_stops_at_the_budget(tmp_path):
+    lines = [f"N{n} G01 X+{n}{' M91' if n == 1 else ''}\n" for n in range(1, 11)]
+    parts = split_pt5(lines, tmp_path / "program.pt5", max_lines=4)
+
+    contents = _read_parts(parts)
+    assert [len(part) for part in contents] == [4, 4, 2]
+    assert [part.ends_with_stop for part in parts] == [False, False, False]
+    for part in contents:
+        assert part[0].startswith("N1 ") and part[0].endswith(" M91\n")
+        assert [line.split(" ")[0] for line in part] == [f"N{n}" for n in range(1, len(part) + 1)]
+    assert sum((_without_numbers(part) for part in contents), []) == _without_numbers(lines)
+
+
+def test_split_by_bytes(tmp_path):
+    parts = split_pt5(PROGRAM, tmp_path / "program.pt5", max_bytes=80)
+
+    for part in parts:
+        assert part.bytes == part.path.stat().st_size <= 80
+    assert sum((_without_numbers(part) for part in _read_parts(parts)), []) == _without_numbers(PROGRAM)
+
+
+@pytest.mark.parametrize("max_lines", [1, 2, 3, 7, 100])
+def test_split_keeps_the_program(tmp_path, max_lines, simple_ncp_path):
+    with open(simple_ncp_path) as f:
+        lines = list(ncp_to_pt5(NcpFile.parse(f)).serialize())
+    parts = split_pt5(lines, tmp_path / "program.pt5", max_lines=max_lines)
+
+    assert all(part.lines <= max_lines for part in parts)
+    assert sum((_without_numbers(part) for part in _read_parts(parts)), []) == _without_numbers(lines)
+
+
+def test_split_program_starting_with_stop(tmp_path):
+    parts = split_pt5([" M00\n", "N2 G01 X+1\n"], tmp_path / "program.pt5", max_lines=1)
+    assert _read_parts(parts) == [["N1 G01 M91 M00\n"], ["N1 G01 X+1 M91\n"]]
+
+
+def test_split_invalid_budget(tmp_path):
+    with pytest.raises(ValueError):
+        split_pt5(PROGRAM, tmp_path / "program.pt5")
+    with pytest.raises(ValueError):
+        split_pt5(PROGRAM, tmp_path / "program.pt5", max_lines=0)
+    with pytest.raises(ValueError, match="does not fit"):
+        split_pt5(PROGRAM, tmp_path / "program.pt5", max_bytes=10)
+
+
+def test_cli_split(simple_ncp_path, tmp_path, capsys):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+    arguments = [str(tmp_path / "a.ncp"), "--workers", "1"]
+
+    assert main([*arguments, "--split-lines", "2"]) == 0
+    whole = (tmp_path / "a.pt5").read_text().splitlines(keepends=True)
+    count = (len(whole) + 1) // 2
+    parts = [part_path(tmp_path / "a.pt5", number) for number in range(1, count + 1)]
+    assert all(path.exists() for path in parts)
+    assert not part_path(tmp_path / "a.pt5", count + 1).exists()
+    assert sum((_without_numbers(path.read_text().splitlines(keepends=True)) for path in parts), []) == (
+        _without_numbers(whole)
+    )
+    assert f"split into {count} parts" in capsys.readouterr().out
+
+    # the parts of the previous, longer split must not be left behind
+    assert main([*arguments, "--split-lines", str(len(whole))]) == 0
+    assert part_path(tmp_path / "a.pt5", 1).exists()
+    assert not part_path(tmp_path / "a.pt5", 2).exists()
+
+
+def test_part_path():
+    assert part_path("dir/program.pt5", 2) == Path("dir", "program.2.pt5")
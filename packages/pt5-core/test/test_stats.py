@@ -0,0 +1,134 @@
+import io
+import json
+import shutil
+
+import pytest
+from pt5_core.cli import main
+from pt5_core.loading import NcpLoader
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import stream_ncp_to_pt5, write_ncp_as_pt5
+from pt5_core.stats import PipelineStats
+
+LINES = [
+    "% a comment\n",
+    "N1 G91 G01 X1 Y1\n",
+    "N2 X1 Y1\n",
+    "\n",
+    "O1234\n",
+    "N3 G00 X5\n",
+    "N4 G01 X1 Y1\n",
+    "N5 X1 Y1 M30\n",
+]
+
+
+def test_stream_ncp_to_pt5_stats():
+    stats = PipelineStats()
+    output = list(stream_ncp_to_pt5(LINES, optimize=1, stats=stats))
+    assert output == list(stream_ncp_to_pt5(LINES, optimize=1))
+
+    assert set(stats.stages) == {"read", "parse", "convert", "optimize", "serialize"}
+    assert stats.stages["read"].items == len(LINES)
+    assert stats.stages["serialize"].items == len(output)
+    assert all(stage.wall_seconds >= 0 and stage.cpu_seconds >= 0 for stage in stats.stages.values())
+
+    assert stats.lines_read == 8
+    assert stats.skipped_lines == 2
+    assert stats.unsupported_lines == 1
+    assert stats.commands == {"G91": 1, "G01": 4, "G00": 1, "M30": 1}
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        LINES,
+        [],
+        ["N1 G01 X1\n", "  \t\n", " \r\n", "N2 X2\n", "\t"],
+        ["N1 G01 X1\n", "\n", "O1"],
+    ],
+)
+def test_count_lines_matches_read_lines(lines):
+    read = PipelineStats()
+    list(read.read_lines(lines))
+    counted = PipelineStats()
+    counted.count_lines("".join(lines).encode())
+
+    assert (counted.lines_read, counted.skipped_lines, counted.unsupported_lines) == (
+        read.lines_read,
+        read.skipped_lines,
+        read.unsupported_lines,
+    )
+
+
+def test_count_lines_in_chunks(monkeypatch):
+    buffer = "".join(LINES * 50).encode()
+    expected = PipelineStats()
+    expected.count_lines(buffer)
+
+    monkeypatch.setattr("pt5_core.stats._COUNT_CHUNK_SIZE", 7)
+    counted = PipelineStats()
+    counted.count_lines(buffer)
+    assert (counted.lines_read, counted.skipped_lines, counted.unsupported_lines) == (
+        expected.lines_read,
+        expected.skipped_lines,
+        expected.unsupported_lines,
+    )
+    assert counted.lines_read == 50 * len(LINES)
+
+
+def test_write_ncp_as_pt5_stats(simple_ncp):
+    ncp = NcpFile.parse(simple_ncp)
+    stats = PipelineStats()
+    written = write_ncp_as_pt5(ncp, io.StringIO(), stats=stats)
+
+    assert stats.bytes_written == written
+    assert {"records", "convert", "serialize"} <= set(stats.stages)
+    assert stats.commands.total() == len(ncp.commands)
+
+    # the same counters when the geometry is already resolved
+    resolved = PipelineStats()
+    write_ncp_as_pt5(ncp, io.StringIO(), stats=resolved, geometry=ncp.geometry)
+    assert resolved.commands == stats.commands
+    assert resolved.bytes_written == written
+
+
+def test_loader_stats():
+    stats = PipelineStats()
+    NcpLoader(LINES, block_lines=3, stats=stats).result()
+
+    assert stats.lines_read == len(LINES)
+    assert {"read", "parse", "resolve"} <= set(stats.stages)
+    assert stats.commands["G01"] == 4
+
+
+def test_merge_and_json():
+    first = PipelineStats()
+    list(stream_ncp_to_pt5(LINES, stats=first))
+    first.finish()
+    total = PipelineStats()
+    total.merge(first)
+    total.merge(first)
+
+    data = json.loads(total.to_json())
+    assert data["lines_read"] == 2 * len(LINES)
+    assert data["commands"]["G01"] == 8
+    assert data["stages"]["parse"]["items"] == 2 * first.stages["parse"].items
+
+
+def test_cli_stats(simple_ncp_path, tmp_path):
+    shutil.copy(simple_ncp_path, tmp_path / "a.ncp")
+    shutil.copy(simple_ncp_path, tmp_path / "b.ncp")
+    (tmp_path / "c.ncp").touch()
+
+    assert main([str(tmp_path / "*.ncp"), "--workers", "1", "--quiet", "--stats", str(tmp_path / "stats.json")]) == 0
+
+    data = json.loads((tmp_path / "stats.json").read_text())
+    assert [file["source"] for file in data["files"]] == [str(tmp_path / f"{name}.ncp") for name in "abc"]
+    with open(simple_ncp_path) as f:
+        read = PipelineStats()
+        list(read.read_lines(f))
+    assert data["files"][0]["lines_read"] == read.lines_read
+    assert data["files"][0]["skipped_lines"] == read.skipped_lines
+    assert (data["files"][2]["lines_read"], data["files"][2]["skipped_lines"]) == (0, 0)
+    assert data["total"]["bytes_written"] == 2 * (tmp_path / "a.pt5").stat().st_size
+    assert data["total"]["lines_read"] == 2 * data["files"][0]["lines_read"]
+    assert {"parse", "convert", "serialize"} <= set(data["total"]["stages"])
@@ -0,0 +1,173 @@
+import asyncio
+import socket
+
+import pytest
+from pt5_core.ncp_model import NcpFile
+from pt5_core.ncp_to_pt5 import ncp_to_pt5
+from pt5_core.streamer import ACK, NAK, XOFF, XON, FlowControl, Pt5Streamer
+
+PROGRAM = [f"N{n} G01 X+{n}{' M91' if n == 1 else ''}\n" for n in range(1, 101)]
+
+
+class _Controller:
+    """The other end of the link, reading the lines and sending the flow control bytes."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.lines: list[str] = []
+
+    async def read_lines(self, count: int) -> None:
+        for _ in range(count):
+            self.lines.append((await self.reader.readline()).decode())
+
+    async def send(self, *codes: int) -> None:
+        self.writer.write(bytes(codes))
+        await self.writer.drain()
+
+
+async def _link(**options) -> tuple[Pt5Streamer, _Controller]:
+    streamer_socket, controller_socket = socket.socketpair()
+    streamer = Pt5Streamer(*await asyncio.open_connection(sock=streamer_socket), **options)
+    return streamer, _Controller(*await asyncio.open_connection(sock=controller_socket))
+
+
+async def _settle() -> None:
+    # long enough for whatever is in flight to arrive
+    await asyncio.sleep(0.05)
+
+
+def test_stream_with_acknowledgements():
+    async def run():
+        streamer, controller = await _link(flow_control=FlowControl.ACK, window=8)
+        sending = asyncio.create_task(streamer.stream(iter(PROGRAM)))
+
+        in_flight = []
+        while len(controller.lines) < len(PROGRAM):
+            await _settle()
+            # nothing more than the window is sent ahead of the acknowledgements
+            available = len(controller.reader._buffer.splitlines())
+            in_flight.append(available)
+            await controller.read_lines(available)
+            await controller.send(*[ACK] * available)
+
+        stats = await sending
+        return controller.lines, in_flight, stats
+
+    lines, in_flight, stats = asyncio.run(run())
+    assert lines == PROGRAM
+    assert max(in_flight) == 8
+    assert (stats.lines, stats.bytes) == (len(PROGRAM), len("".join(PROGRAM)))
+    assert stats.lines_per_second > 0
+
+
+def test_stream_with_xon_xoff():
+    async def run():
+        streamer, controller = await _link(window=4)
+        await controller.send(XOFF)
+        await _settle()
+        sending = asyncio.create_task(streamer.stream(iter(PROGRAM)))
+
+        await _settle()
+        # held back completely until XON
+        assert not controller.reader._buffer
+        await controller.send(XON)
+        await controller.read_lines(10)
+        await controller.send(XON, XOFF)
+        await _settle()
+        held_at = len(controller.reader._buffer.splitlines())
+        await _settle()
+        assert len(controller.reader._buffer.splitlines()) == held_at
+        assert held_at < len(PROGRAM) - 10
+
+        await controller.send(XOFF, XON)
+        await controller.read_lines(len(PROGRAM) - 10)
+        await sending
+        return controller.lines
+
+    assert asyncio.run(run()) == PROGRAM
+
+
+@pytest.mark.parametrize("flow_control", list(FlowControl))
+def test_stream_pauses_at_stops(simple_ncp_path, flow_control):
+    program = [
+        "N1 G01 X+1 M91\n",
+        "N2 G01 X+2\n",
+        "N3 G01 X+3 M00\n",
+        "N4 G01 X+4\n",
+        "N5 G01 X+5 M00\n",
+        "N6 G01 X+6 M30\n",
+    ]
+
+    async def run():
+        stops = []
+        streamer, controller = await _link(flow_control=flow_control, on_stop=stops.append)
+
+        async def acknowledge():
+            while len(controller.lines) < len(program):
+                await controller.read_lines(1)
+                if flow_control == FlowControl.ACK:
+                    await controller.send(ACK)
+
+        acknowledging = asyncio.create_task(acknowledge())
+        sending = asyncio.create_task(streamer.stream(program))
+
+        await _settle()
+        assert (controller.lines, stops, streamer.paused) == (program[:3], [3], True)
+        streamer.resume()
+        await _settle()
+        assert (controller.lines, stops, streamer.paused) == (program[:5], [3, 5], True)
+        streamer.resume()
+
+        stats = await sending
+        await acknowledging
+        return controller.lines, stats
+
+    lines, stats = asyncio.run(run())
+    assert lines == program
+    assert stats.paused_seconds > 0.05
+    assert stats.paused_seconds < stats.seconds
+
+
+def test_stream_serialized_program(simple_ncp_path):
+    with open(simple_ncp_path) as f:
+        pt5 = ncp_to_pt5(NcpFile.parse(f))
+    expected = list(pt5.serialize())
+
+    async def run():
+        streamer, controller = await _link(pause_at_stops=False, window=2)
+        reading = asyncio.create_task(controller.read_lines(len(expected)))
+        await streamer.stream(pt5.serialize())
+        await reading
+        return controller.lines
+
+    assert asyncio.run(run()) == expected
+
+
+def test_stream_rejected_line():
+    async def run():
+        streamer, controller = await _link(flow_control=FlowControl.ACK, window=4)
+        sending = asyncio.create_task(streamer.stream(iter(PROGRAM)))
+        await controller.read_lines(4)
+        await controller.send(ACK, ACK, NAK)
+        with pytest.raises(ConnectionError, match="rejected line 3"):
+            await sending
+
+    asyncio.run(run())
+
+
+def test_stream_closed_connection():
+    async def run():
+        streamer, controller = await _link(flow_control=FlowControl.ACK, window=4)
+        sending = asyncio.create_task(streamer.stream(iter(PROGRAM)))
+        await controller.read_lines(4)
+        controller.writer.close()
+        with pytest.raises(ConnectionError, match="closed"):
+            await sending
+
+    asyncio.run(run())
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        Pt5Streamer(None, None, window=0)
@@ -0,0 +1,84 @@
+"""
+Benchmark of the startup of the GUI: how long importing its main module takes in a fresh interpreter, as reported
+by `python -X importtime`. The best of a few runs counts, the first one also warms up the bytecode cache.
+Besides the time budget, the run fails whenever the main module imports any of the modules which are only needed
+once a file is opened (pt5_core and NumPy), those are the ones that make the window slow to appear.
+"""
+
+import argparse
+import subprocess
+import sys
+from collections.abc import Sequence
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent / "src" / "pt5_gui"
+DEFAULT_BUDGET_MS = 100.0
+# the packages not to be imported until a file is opened
+DEFERRED = ("pt5_core", "numpy")
+
+
+def measure_import(main_dir: Path = MAIN_DIR) -> dict[str, tuple[int, int]]:
+    """
+    Import the main module of the GUI in a fresh interpreter.
+
+    :param main_dir: the directory of the main module
+    :return: the self and the cumulative import time (in microseconds) of every top-level module imported,
+        by the module name, in the order of the imports
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=main_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times: dict[str, tuple[int, int]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative, name = line.removeprefix("import time:").split("|")
+        if not self_time.strip().isdigit():
+            # the header of the columns
+            continue
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the GUI.")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="maximum time of importing the main module, in milliseconds (default: %(default)s)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="number of the runs (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="number of the slowest modules to list")
+    args = parser.parse_args(argv)
+
+    runs = [measure_import() for _ in range(max(args.repeat, 1))]
+    best = min(runs, key=lambda times: times["main"][1])
+    total_ms = best["main"][1] / 1000
+
+    print(f"importing main took {total_ms:.1f} ms (best of {len(runs)} runs), the slowest modules by their own time:")
+    for name, (self_time, cumulative) in sorted(best.items(), key=lambda item: -item[1][0])[: args.top]:
+        print(f"  {name:<40} {self_time / 1000:>8.1f} ms {cumulative / 1000:>8.1f} ms cumulative")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"importing main took {total_ms:.1f} ms, over the budget of {args.budget_ms:.1f} ms")
+    deferred = [name for name in best if name.split(".")[0] in DEFERRED]
+    if deferred:
+        failures.append(f"imported at the start instead of once a file is opened: {', '.join(deferred)}")
+
+    if failures:
+        print("STARTUP REGRESSIONS:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
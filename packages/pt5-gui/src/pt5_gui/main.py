@@ -1,17 +1,32 @@
-import gettext
-import locale
-import math
+"""
+The GUI of the converter.
+Only what is needed to show the window is imported at the start, the rest of pt5_core (and NumPy with it) is
+imported once a file is opened, on the background thread loading it, so the window appears quickly even on slow
+machines and in the PyInstaller build. Keep it that way, benchmarks/import_time.py checks it.
+"""
+
+import functools
+import io
 import os
+import queue
 import sys
+import threading
 import tkinter
-import tkinter.filedialog
-import turtle
+from collections.abc import Callable, Iterable, Sequence
+from contextlib import nullcontext
 from os import path
 from pathlib import Path
 from tkinter import ttk
+from typing import TYPE_CHECKING
 
-from pt5_core.ncp_model import NcpCommandType, NcpFile
-from pt5_core.ncp_to_pt5 import ncp_to_pt5
+if TYPE_CHECKING:
+    import gettext
+
+    from pt5_core.cache import ConversionCache
+    from pt5_core.geometry import ResolvedGeometry, Toolpath
+    from pt5_core.ncp_model import NcpFile
+    from pt5_core.spatial_index import Box, ToolpathIndex
+    from pt5_core.stats import PipelineStats
 
 
 def resource_path(relative_path):
@@ -26,39 +41,225 @@ def resource_path(relative_path):
 
 
 appname = "pt5"
-locales_dir = resource_path(path.join("locales", "bundles"))
-
-# Fun times with Windows and its locales: there the locale of locale.getlocale()
-# is the locale to use when formatting data, not the display language.
-# To make it even worse, it does not return things like cs_CZ, but stuff like Czech_Czechia
-# which is annoying to say the least.
-# Instead, we have to use the syscall to get the actual language.
-if os.name == "nt":
-    try:
-        import ctypes
 
-        windll = ctypes.windll.kernel32
-        current_locale = locale.windows_locale[windll.GetUserDefaultUILanguage()]
-    except Exception:
-        current_locale = locale.getlocale()[0]
 
-    # Separate out only the language part as we do not have culture-specific localizations.
-    if current_locale:
-        current_locale = current_locale.split("_", maxsplit=1)[0]
+@functools.cache
+def translations() -> "gettext.NullTranslations":
+    """Find the language of the user and load the translations, only once."""
+    import gettext
+    import locale
+
+    locales_dir = resource_path(path.join("locales", "bundles"))
+
+    # Fun times with Windows and its locales: there the locale of locale.getlocale()
+    # is the locale to use when formatting data, not the display language.
+    # To make it even worse, it does not return things like cs_CZ, but stuff like Czech_Czechia
+    # which is annoying to say the least.
+    # Instead, we have to use the syscall to get the actual language.
+    if os.name == "nt":
+        try:
+            import ctypes
+
+            windll = ctypes.windll.kernel32
+            current_locale = locale.windows_locale[windll.GetUserDefaultUILanguage()]
+        except Exception:
+            current_locale = locale.getlocale()[0]
+
+        # Separate out only the language part as we do not have culture-specific localizations.
+        if current_locale:
+            current_locale = current_locale.split("_", maxsplit=1)[0]
+        else:
+            current_locale = "en"
     else:
-        current_locale = "en"
-else:
-    # On other operating systems, let the built-in mechanism take over so stuff like LANG env vars works.
-    current_locale = None
+        # On other operating systems, let the built-in mechanism take over so stuff like LANG env vars works.
+        current_locale = None
+
+    return gettext.translation(
+        appname, str(locales_dir), fallback=True, languages=[current_locale] if current_locale else None
+    )
+
+
+def _(message: str) -> str:
+    return translations().gettext(message)
+
+
+@functools.cache
+def _toolpath_tracer() -> Callable[..., "Toolpath"]:
+    try:
+        # NumPy is optional, it makes tracing the arc-heavy programs several times faster
+        from pt5_core.geometry_numpy import trace_toolpath_numpy as trace_toolpath
+    except ImportError:
+        from pt5_core.geometry import trace_toolpath
+    return trace_toolpath
+
+
+# number of points drawn by a single create_line call
+_CHUNK_POINTS = 4096
+# number of points revealed by a single step of the animation and the delay between the steps
+_ANIMATION_CHUNK_POINTS = 32
+_ANIMATION_DELAY_MS = 10
+
+_CENTER_RADIUS = 1.5
+# how far in the preview can be zoomed, relative to the whole drawing fitting the canvas
+_MAX_ZOOM = 64
+_ZOOM_STEP = 1.25
+# how often the results of the background work are picked up
+_POLL_MS = 50
+# when the partial preview outgrows the view, the new view has this much room to spare on each side
+_PARTIAL_VIEW_MARGIN = 0.25
+_TAG = "preview"
+
+
+class PreviewRenderer:
+    """
+    Draws the toolpath onto a canvas using a few long polylines instead of drawing segment by segment.
+    The animation reveals the same polylines gradually, in chunks scheduled on the Tk event loop.
+    """
+
+    def __init__(self, canvas: tkinter.Canvas):
+        self.canvas = canvas
+        self._pending_animation: str | None = None
+
+    def clear(self) -> None:
+        if self._pending_animation is not None:
+            self.canvas.after_cancel(self._pending_animation)
+            self._pending_animation = None
+        self.canvas.delete(_TAG)
+
+    def draw(
+        self,
+        polylines: Iterable[Sequence[float]],
+        centers: Iterable[tuple[int, int]],
+        scaling: float,
+        offset_x: float,
+        offset_y: float,
+        animate: bool = False,
+    ) -> None:
+        """
+        Draw the polylines and the circle centers, replacing anything drawn before.
+        The world coordinates are mapped to the canvas as (x * scaling + offset_x, offset_y - y * scaling),
+        the y axis of the canvas points down.
+        """
+        self.clear()
+
+        for x, y in centers:
+            canvas_x = x * scaling + offset_x
+            canvas_y = offset_y - y * scaling
+            self.canvas.create_oval(
+                canvas_x - _CENTER_RADIUS,
+                canvas_y - _CENTER_RADIUS,
+                canvas_x + _CENTER_RADIUS,
+                canvas_y + _CENTER_RADIUS,
+                fill="black",
+                tags=_TAG,
+            )
+
+        if animate:
+            self._animate(_canvas_chunks(polylines, scaling, offset_x, offset_y, _ANIMATION_CHUNK_POINTS), 0)
+        else:
+            self.add(polylines, scaling, offset_x, offset_y)
+
+    def add(self, polylines: Iterable[Sequence[float]], scaling: float, offset_x: float, offset_y: float) -> None:
+        """Draw more polylines, keeping what was drawn before."""
+        for chunk in _canvas_chunks(polylines, scaling, offset_x, offset_y, _CHUNK_POINTS):
+            self.canvas.create_line(chunk, tags=_TAG)
+
+    def move(self, delta_x: float, delta_y: float) -> None:
+        """Shift everything drawn, without drawing it again."""
+        self.canvas.move(_TAG, delta_x, delta_y)
+
+    def _animate(self, chunks: list[list[float]], index: int) -> None:
+        self._pending_animation = None
+        if index >= len(chunks):
+            return
+
+        self.canvas.create_line(chunks[index], tags=_TAG)
+        self._pending_animation = self.canvas.after(_ANIMATION_DELAY_MS, self._animate, chunks, index + 1)
+
+
+def _canvas_chunks(
+    polylines: Iterable[Sequence[float]], scaling: float, offset_x: float, offset_y: float, chunk_points: int
+) -> list[list[float]]:
+    chunks: list[list[float]] = []
+    for points in polylines:
+        coordinates = [0.0] * len(points)
+        coordinates[0::2] = [x * scaling + offset_x for x in points[0::2]]
+        coordinates[1::2] = [offset_y - y * scaling for y in points[1::2]]
+        # the chunks overlap by one point so that they join up
+        chunks.extend(
+            coordinates[start : start + 2 * chunk_points + 2]
+            for start in range(0, len(coordinates) - 2, 2 * chunk_points)
+        )
+    return chunks
+
 
-translations = gettext.translation(
-    appname, str(locales_dir), fallback=True, languages=[current_locale] if current_locale else None
-)
-translations.install()
+class Cancelled(Exception):
+    """Raised in the background work once it is cancelled."""
 
 
-def _safe_add(a: float, b: float) -> float:
-    return round(a + b, 3)
+class BackgroundJob:
+    """
+    Work running in a background thread, so that the window stays responsive.
+    Tk may only be used from the main thread, so the work reports back by posting callbacks,
+    which are picked up on the main thread by polling via after().
+    """
+
+    def __init__(
+        self,
+        master: tkinter.Misc,
+        work: Callable[["BackgroundJob"], None],
+        on_finished: Callable[["BackgroundJob", BaseException | None], None],
+    ):
+        self.master = master
+        self._work = work
+        self._on_finished = on_finished
+        self._callbacks: queue.SimpleQueue[tuple[Callable[..., None], tuple]] = queue.SimpleQueue()
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._dropped = False
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, daemon=True).start()
+        self.master.after(_POLL_MS, self._poll)
+
+    def cancel(self) -> None:
+        """Ask the work to stop, nothing it posts from now on is run."""
+        self._cancelled.set()
+
+    def check_cancelled(self) -> None:
+        """Called by the work every now and then, it stops the work by raising Cancelled."""
+        if self._cancelled.is_set():
+            raise Cancelled
+
+    def post(self, callback: Callable[..., None], *args) -> None:
+        """Called by the work to have the callback run on the main thread."""
+        self._callbacks.put((callback, args))
+
+    def _run(self) -> None:
+        error = None
+        try:
+            self._work(self)
+        except BaseException as e:
+            error = e
+        self._callbacks.put((self._finish, (error,)))
+
+    def _finish(self, error: BaseException | None) -> None:
+        self._finished = True
+        # the work may have finished before noticing it was cancelled, but then some of its results were not used
+        if error is None and self._dropped:
+            error = Cancelled()
+        self._on_finished(self, error)
+
+    def _poll(self) -> None:
+        while not self._callbacks.empty():
+            callback, args = self._callbacks.get()
+            if callback == self._finish or not self._cancelled.is_set():
+                callback(*args)
+            else:
+                self._dropped = True
+
+        if not self._finished:
+            self.master.after(_POLL_MS, self._poll)
 
 
 class App:
@@ -73,7 +274,23 @@ class App:
         self.target_filename = tkinter.StringVar()
         self.should_animate = tkinter.BooleanVar()
         self.should_show_circle_centers = tkinter.BooleanVar()
+        self.should_save_stats = tkinter.BooleanVar()
         self.parsed: NcpFile | None = None
+        # resolved once per file, the preview and the conversion share it
+        self.geometry: ResolvedGeometry | None = None
+        # statistics of the loading of the current file, if they were collected
+        self.load_stats: PipelineStats | None = None
+        self.toolpath_index: ToolpathIndex | None = None
+        # scaling, offset_x and offset_y mapping the world coordinates to the canvas
+        self.view: tuple[float, float, float] | None = None
+        self._drag_start: tuple[int, int] | None = None
+        self.cache_key: str | None = None
+        self.job: BackgroundJob | None = None
+        self.status = tkinter.StringVar()
+        self.progress = tkinter.DoubleVar()
+        # the parts of the program loaded so far, shown while the loading is still going on
+        self.partial: list[Sequence[float]] = []
+        self.partial_bounds: Box | None = None
 
         frm = ttk.Frame(master, padding=10, width=800, height=1000)
         frm.grid()
@@ -88,206 +305,320 @@ class App:
         ttk.Checkbutton(frm, text=_("Show circle centers"), variable=self.should_show_circle_centers).grid(
             column=1, row=2
         )
+        ttk.Checkbutton(frm, text=_("Save statistics"), variable=self.should_save_stats).grid(column=2, row=2)
 
         ttk.Button(frm, text=_("Select source file"), command=self.open_ncp_file).grid(column=0, row=3)
         ttk.Button(frm, text=_("Convert"), command=self.convert).grid(column=1, row=3)
         ttk.Button(frm, text=_("Draw"), command=self.draw).grid(column=2, row=3)
         ttk.Button(frm, text=_("Quit"), command=master.destroy).grid(column=3, row=3)
 
+        ttk.Progressbar(frm, variable=self.progress, maximum=1.0).grid(column=0, row=4)
+        ttk.Label(frm, textvariable=self.status).grid(column=1, row=4, columnspan=2)
+        self.cancel_button = ttk.Button(frm, text=_("Cancel"), command=self.cancel, state=tkinter.DISABLED)
+        self.cancel_button.grid(column=3, row=4)
+
         self.canvas = tkinter.Canvas(self.master, height=self.canvas_size, width=self.canvas_size)
         self.canvas.grid(column=0, row=4, columnspan=4)
 
-        self.turtle_screen = turtle.TurtleScreen(self.canvas)
-        self.turtle = turtle.RawTurtle(self.turtle_screen, shape="blank")
+        self.renderer = PreviewRenderer(self.canvas)
+
+        # zoom with the mouse wheel (X11 reports it as buttons 4 and 5), pan by dragging
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event.x, event.y, event.delta > 0))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event.x, event.y, True))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event.x, event.y, False))
+        self.canvas.bind("<ButtonPress-1>", self.start_pan)
+        self.canvas.bind("<B1-Motion>", self.pan)
+        self.canvas.bind("<ButtonRelease-1>", self.end_pan)
+
+    @functools.cached_property
+    def cache(self) -> "ConversionCache":
+        from pt5_core.cache import ConversionCache
+
+        return ConversionCache()
 
     def open_ncp_file(self) -> None:
+        import tkinter.filedialog
+
         source_filename = tkinter.filedialog.askopenfilename(filetypes=[("NCP files", "*.ncp")])
+        if not source_filename:
+            return
+
         target_filename = str(Path(source_filename).with_suffix(".pt5"))
         self.source_filename.set(source_filename)
         self.target_filename.set(target_filename)
-        with open(self.source_filename.get()) as src:
-            self.parsed = NcpFile.parse(src)
 
-        self.draw()
+        self.parsed = None
+        self.geometry = None
+        self.load_stats = None
+        self.toolpath_index = None
+        self.view = None
+        self.partial = []
+        self.partial_bounds = None
+        self.renderer.clear()
+
+        stats = None
+        if self.should_save_stats.get():
+            from pt5_core.stats import PipelineStats
+
+            stats = PipelineStats()
+        self._start_job(lambda job: self._load(job, source_filename, stats))
 
     def convert(self) -> None:
-        converted = ncp_to_pt5(self.parsed)
-        with open(self.target_filename.get(), "w") as target:
-            target.writelines(converted.serialize())
+        if self.parsed is None:
+            return
+
+        parsed = self.parsed
+        geometry = self.geometry
+        cache_key = self.cache_key
+        target_filename = self.target_filename.get()
+        stats = None
+        if self.should_save_stats.get():
+            from pt5_core.stats import PipelineStats
+
+            # the statistics of every conversion start from the ones of the loading
+            stats = PipelineStats()
+            if self.load_stats is not None:
+                stats.merge(self.load_stats)
+        self._start_job(lambda job: self._convert(job, parsed, geometry, cache_key, target_filename, stats))
+
+    def cancel(self) -> None:
+        if self.job is not None:
+            self.job.cancel()
+
+    def _start_job(self, work: Callable[[BackgroundJob], None]) -> None:
+        # only one thing at a time, the newer request wins
+        self.cancel()
+
+        self.job = BackgroundJob(self.master, work, self._job_finished)
+        self.cancel_button.state(["!disabled"])
+        self.job.start()
+
+    def _job_finished(self, job: BackgroundJob, error: BaseException | None) -> None:
+        if job is not self.job:
+            # superseded by another job in the meantime
+            return
+
+        self.job = None
+        self.cancel_button.state(["disabled"])
+        self.progress.set(0)
+        if isinstance(error, Cancelled):
+            self.status.set(_("Cancelled"))
+        elif error is not None:
+            self.status.set(_("Failed: {error}").format(error=error))
+        else:
+            self.status.set("")
+
+    def _show_progress(self, status: str, progress: float) -> None:
+        self.status.set(f"{status}: {progress:.0%}")
+        self.progress.set(progress)
+
+    def _load(self, job: BackgroundJob, source_filename: str, stats: "PipelineStats | None") -> None:
+        """Load the file in the background, showing the toolpath as it is being loaded."""
+        # the parsing and the geometry are only needed from now on, and they are imported off the main thread
+        from pt5_core.cache import KeyingReader
+        from pt5_core.loading import NcpLoader
+        from pt5_core.spatial_index import ToolpathIndex
+
+        trace_toolpath = _toolpath_tracer()
+        size = os.path.getsize(source_filename) or 1
+        # the key is computed from the very bytes parsed, so it matches them even if the file changes in the meantime
+        with open(source_filename, "rb") as raw:
+            reader = KeyingReader(raw)
+            with io.TextIOWrapper(io.BufferedReader(reader)) as src:
+                loader = NcpLoader(src, stats=stats)
+                for block in loader.blocks():
+                    job.check_cancelled()
+                    job.post(self._show_progress, _("Loading"), min(block.characters / size, 1))
+                    job.post(self._show_partial, trace_toolpath(block.geometry, start=block.start).points)
+                parsed = loader.result()
+                geometry = loader.geometry
+        cache_key = reader.key()
+
+        job.check_cancelled()
+        job.post(self._show_progress, _("Preparing preview"), 1)
+        # the toolpath is traced and indexed only once per file, precisely enough for the maximum zoom;
+        # the chords of the arcs only need to be accurate to a fraction of a pixel (but not below a micrometer)
+        tolerance = max(0.25 / (self.get_scaling(geometry.bounds)[0] * _MAX_ZOOM), 1.0)
+        with nullcontext() if stats is None else stats.stage("preview"):
+            toolpath_index = ToolpathIndex(trace_toolpath(geometry, tolerance), tolerance)
+            toolpath_index.build()
+
+        job.check_cancelled()
+        job.post(self._loaded, parsed, geometry, cache_key, toolpath_index, stats)
+
+    def _loaded(
+        self,
+        parsed: "NcpFile",
+        geometry: "ResolvedGeometry",
+        cache_key: str,
+        toolpath_index: "ToolpathIndex",
+        stats: "PipelineStats | None",
+    ) -> None:
+        self.parsed = parsed
+        self.geometry = geometry
+        self.load_stats = stats
+        self.cache_key = cache_key
+        self.toolpath_index = toolpath_index
+        self.partial = []
+        self.partial_bounds = None
+        self.draw()
 
-    def get_scaling(self) -> tuple[float, float, float]:
+    def _show_partial(self, points: Sequence[float]) -> None:
+        from pt5_core.spatial_index import simplify_polyline
+
+        min_x, min_y, max_x, max_y = (min(points[0::2]), min(points[1::2]), max(points[0::2]), max(points[1::2]))
+        if self.partial_bounds is not None:
+            min_x = min(min_x, self.partial_bounds[0])
+            min_y = min(min_y, self.partial_bounds[1])
+            max_x = max(max_x, self.partial_bounds[2])
+            max_y = max(max_y, self.partial_bounds[3])
+        self.partial_bounds = (min_x, min_y, max_x, max_y)
+        self.partial.append(points)
+
+        if self.view is not None:
+            viewport = self._viewport()
+            if viewport[0] <= min_x and viewport[1] <= min_y and max_x <= viewport[2] and max_y <= viewport[3]:
+                # still fits, just add the new part (simplified, no need to draw more than the pixels)
+                scaling = self.view[0]
+                self.renderer.add([simplify_polyline(points, 0.5 / scaling)], *self.view)
+                return
+
+        # refit the view with some room to spare, so that this does not happen with every part
+        margin = max(max_x - min_x, max_y - min_y) * _PARTIAL_VIEW_MARGIN
+        self.view = self._fit_view((min_x - margin, min_y - margin, max_x + margin, max_y + margin))
+        scaling = self.view[0]
+        self.renderer.draw([simplify_polyline(p, 0.5 / scaling) for p in self.partial], (), *self.view)
+
+    def _convert(
+        self,
+        job: BackgroundJob,
+        parsed: "NcpFile",
+        geometry: "ResolvedGeometry",
+        cache_key: str,
+        target_filename: str,
+        stats: "PipelineStats | None",
+    ) -> None:
+        # write under a temporary name first, so that a cancelled or failed conversion does not leave a half-written
+        # file behind
+        target = Path(target_filename)
+        temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        try:
+            with nullcontext() if stats is None else stats.stage("cache"):
+                cached = self.cache.fetch(cache_key, temporary)
+            if not cached:
+                self._write(job, parsed, geometry, temporary, stats)
+                self.cache.store(cache_key, temporary)
+            os.replace(temporary, target)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        if stats is not None:
+            stats.finish()
+            target.with_suffix(".stats.json").write_text(stats.to_json())
+
+    def _write(
+        self,
+        job: BackgroundJob,
+        parsed: "NcpFile",
+        geometry: "ResolvedGeometry",
+        target: Path,
+        stats: "PipelineStats | None",
+    ) -> None:
+        from pt5_core.ncp_to_pt5 import write_ncp_as_pt5
+
+        # roughly one line per movement
+        total = max(len(geometry), 1)
+
+        def _progress(lines: int) -> None:
+            job.check_cancelled()
+            job.post(self._show_progress, _("Converting"), min(lines / total, 1))
+
+        write_ncp_as_pt5(parsed, target, _progress, stats=stats, geometry=geometry)
+
+    def get_scaling(self, bounds: "Box | None" = None) -> tuple[float, float, float]:
         """
         Return the tuple of scaling_factor, delta_x, delta_y so that the drawing fits the canvas neatly.
-        This is a simple algorithm and may not work for not-so-well-behaved drawings: this is good enough for now.
-        It works by collecting the extremes of both axes and the translating and scaling accordingly.
+        It uses the bounding box of the resolved geometry (including the extremes of the arcs) unless other bounds
+        are given, so the positions are in integer micrometers and the deltas are in micrometers too:
+        (x + delta_x, y + delta_y) is the position relative to the center of the canvas.
         """
-        max_x = 0
-        max_y = 0
-        min_x = 0
-        min_y = 0
-
-        last_x = 0
-        last_y = 0
-
-        is_absolute = True
-
-        for command in self.parsed.commands:
-            if (
-                command.type == NcpCommandType.MOVE
-                or command.type == NcpCommandType.CLOCKWISE_CIRCLE
-                or command.type == NcpCommandType.COUNTER_CLOCKWISE_CIRCLE
-            ):
-                if is_absolute:
-                    new_x = command.arguments.get("X", last_x)
-                    new_y = command.arguments.get("Y", last_y)
-                else:
-                    delta_x = command.arguments.get("X", 0)
-                    delta_y = command.arguments.get("Y", 0)
-
-                    new_x = _safe_add(last_x, delta_x)
-                    new_y = _safe_add(last_y, delta_y)
-
-                last_x = new_x
-                last_y = new_y
-
-                max_x = max(last_x, max_x)
-                max_y = max(last_y, max_y)
-                min_x = min(last_x, min_x)
-                min_y = min(last_y, min_y)
-
-            elif command.type == NcpCommandType.SET_INCREMENTAL_MODE:
-                is_absolute = False
-            elif command.type == NcpCommandType.SET_ABSOLUTE_MODE:
-                is_absolute = True
+        from pt5_core.raster import fit_scaling
 
-        x_length = max_x - min_x
-        y_length = max_y - min_y
-
-        max_length = max(x_length, y_length)
-
-        scaling = (self.canvas_size - 2 * self.padding) / max_length
-        delta_x = x_length / 2
-        delta_y = y_length / 2
-
-        return scaling, delta_x, delta_y
+        return fit_scaling(
+            self.geometry.bounds if bounds is None else bounds, self.canvas_size, self.canvas_size, self.padding
+        )
 
     def draw(self) -> None:
-        is_absolute = True
-
-        # do the scaling manually, using world coordinates makes the turtle behave super weird and unpredictable
-        scaling = self.get_scaling()
-
-        def _scale_length(val: float) -> float:
-            return val * scaling[0]
-
-        def _scale_coordinates(coords: tuple[float, float]) -> tuple[float, float]:
-            (x, y) = coords
-            return (x + scaling[1]) * scaling[0], (y + scaling[2]) * scaling[0]
-
-        def _descale_coordinates(coords: tuple[float, float]) -> tuple[float, float]:
-            (x, y) = coords
-            return x / scaling[0] - scaling[1], y / scaling[0] - scaling[2]
-
-        self.turtle.reset()
-        self.turtle.radians()
+        """Draw the whole program fitted to the canvas."""
+        if self.toolpath_index is None:
+            return
+
+        self.view = self._fit_view(self.geometry.bounds)
+        self.render(animate=self.should_animate.get())
+
+    def render(self, animate: bool = False) -> None:
+        """Draw the part of the program visible in the current view."""
+        viewport = self._viewport()
+        scaling, offset_x, offset_y = self.view
+
+        # anything smaller than half a pixel is not visible anyway
+        polylines = self.toolpath_index.polylines(viewport, tolerance=0.5 / scaling)
+        centers = self.toolpath_index.centers_in(viewport) if self.should_show_circle_centers.get() else ()
+        self.renderer.draw(polylines, centers, scaling, offset_x, offset_y, animate=animate)
+
+    def _fit_view(self, bounds: "Box") -> tuple[float, float, float]:
+        scaling, delta_x, delta_y = self.get_scaling(bounds)
+        center = self.canvas_size / 2
+        return scaling, center + delta_x * scaling, center - delta_y * scaling
+
+    def _viewport(self) -> "Box":
+        """Return the area visible in the current view, in world coordinates."""
+        scaling, offset_x, offset_y = self.view
+        return (
+            -offset_x / scaling,
+            (offset_y - self.canvas_size) / scaling,
+            (self.canvas_size - offset_x) / scaling,
+            offset_y / scaling,
+        )
 
-        if self.should_animate.get():
-            self.turtle.speed(10)
-        else:
-            self.turtle.speed(0)
-
-        # move the turtle to the scaled center first
-        (scaled_x, scaled_y) = _scale_coordinates((0, 0))
-        self.turtle.teleport(scaled_x, scaled_y)
-
-        for command in self.parsed.commands:
-            (last_x, last_y) = _descale_coordinates((self.turtle.xcor(), self.turtle.ycor()))
-
-            if command.type == NcpCommandType.MOVE:
-                if is_absolute:
-                    new_x = command.arguments.get("X", last_x)
-                    new_y = command.arguments.get("Y", last_y)
-                else:
-                    delta_x = command.arguments.get("X", 0)
-                    delta_y = command.arguments.get("Y", 0)
-
-                    new_x = _safe_add(last_x, delta_x)
-                    new_y = _safe_add(last_y, delta_y)
-
-                (scaled_x, scaled_y) = _scale_coordinates((new_x, new_y))
-                self.turtle.goto(scaled_x, scaled_y)
-            elif (
-                command.type == NcpCommandType.CLOCKWISE_CIRCLE
-                or command.type == NcpCommandType.COUNTER_CLOCKWISE_CIRCLE
-            ):
-                if is_absolute:
-                    new_x = command.arguments.get("X", last_x)
-                    new_y = command.arguments.get("Y", last_y)
-                else:
-                    delta_x = command.arguments.get("X", 0)
-                    delta_y = command.arguments.get("Y", 0)
-
-                    new_x = _safe_add(last_x, delta_x)
-                    new_y = _safe_add(last_y, delta_y)
-
-                i = command.arguments.get("I", 0)
-                j = command.arguments.get("J", 0)
-
-                center_x = last_x + i
-                center_y = last_y + j
-
-                radius = math.hypot(i, j)
-                center_to_new = math.hypot(new_x - i - last_x, new_y - j - last_y)
-                last_to_new = math.hypot(new_x - last_x, new_y - last_y)
-
-                # use the law of cosines to figure out the angle of the arc
-                alpha = math.acos((radius**2 + center_to_new**2 - last_to_new**2) / (2 * radius * center_to_new))
-
-                # figure out the heading from the turtle to the center
-                heading_to_center = math.atan2(j, i)
-
-                # turn the turtle so that it has the center to its appropriate side
-                adjusted_heading = (
-                    heading_to_center + math.pi / 2
-                    if command.type == NcpCommandType.CLOCKWISE_CIRCLE
-                    else heading_to_center - math.pi / 2
-                ) % math.tau
-
-                # set negative radius to make the turtle go clockwise if needed
-                if command.type == NcpCommandType.CLOCKWISE_CIRCLE:
-                    radius = -radius
-
-                # now decide whether to use alpha or tau - alpha
-                # figure out the angles from center to start and end points
-                angle_from_center_to_start = math.atan2(last_y - center_y, last_x - center_x) % math.tau
-                angle_from_center_to_end = math.atan2(new_y - center_y, new_x - center_x) % math.tau
-
-                if command.type == NcpCommandType.CLOCKWISE_CIRCLE:
-                    # if going the short way gets us to the target, use the short path
-                    # for clockwise circles, the angle is decreasing, hence the minus alpha
-                    if math.isclose((angle_from_center_to_start - alpha) % math.tau, angle_from_center_to_end):
-                        extent = alpha
-                    else:
-                        extent = math.tau - alpha
-                else:
-                    if math.isclose((angle_from_center_to_start + alpha) % math.tau, angle_from_center_to_end):
-                        extent = alpha
-                    else:
-                        extent = math.tau - alpha
-
-                if self.should_show_circle_centers.get():
-                    (scaled_x, scaled_y) = _scale_coordinates((center_x, center_y))
-                    self.turtle.teleport(scaled_x, scaled_y)
-                    self.turtle.dot(size=3)
-                    (scaled_x, scaled_y) = _scale_coordinates((last_x, last_y))
-                    self.turtle.teleport(scaled_x, scaled_y)
-
-                self.turtle.setheading(adjusted_heading)
-                self.turtle.circle(radius=_scale_length(radius), extent=extent)
-            elif command.type == NcpCommandType.SET_INCREMENTAL_MODE:
-                is_absolute = False
-            elif command.type == NcpCommandType.SET_ABSOLUTE_MODE:
-                is_absolute = True
+    def zoom(self, canvas_x: int, canvas_y: int, zoom_in: bool) -> None:
+        """Zoom in or out, keeping the point under the cursor in place."""
+        if self.toolpath_index is None:
+            return
+
+        scaling, offset_x, offset_y = self.view
+        fit_scaling = self.get_scaling()[0]
+        new_scaling = scaling * _ZOOM_STEP if zoom_in else scaling / _ZOOM_STEP
+        new_scaling = min(max(new_scaling, fit_scaling / _ZOOM_STEP**4), fit_scaling * _MAX_ZOOM)
+
+        factor = new_scaling / scaling
+        self.view = (
+            new_scaling,
+            canvas_x - (canvas_x - offset_x) * factor,
+            canvas_y - (canvas_y - offset_y) * factor,
+        )
+        self.render()
+
+    def start_pan(self, event: tkinter.Event) -> None:
+        self._drag_start = (event.x, event.y)
+
+    def pan(self, event: tkinter.Event) -> None:
+        if self.toolpath_index is None or self._drag_start is None:
+            return
+
+        # just shift what is drawn while dragging, the newly uncovered parts are drawn once the drag ends
+        delta_x = event.x - self._drag_start[0]
+        delta_y = event.y - self._drag_start[1]
+        scaling, offset_x, offset_y = self.view
+        self.view = (scaling, offset_x + delta_x, offset_y + delta_y)
+        self.renderer.move(delta_x, delta_y)
+        self._drag_start = (event.x, event.y)
+
+    def end_pan(self, _event: tkinter.Event) -> None:
+        if self.toolpath_index is not None and self._drag_start is not None:
+            self.render()
+        self._drag_start = None
 
 
 if __name__ == "__main__":